@@ -0,0 +1,182 @@
+"""
+Who may see which cases, and which parts of a case.
+
+A non-staff user sees a case when they are its assigned lawyer, on its
+team, its customer, or an active employee of its court. Evaluating that
+OR across four joins on every request scales with the size of the joined
+tables, so the grants are materialized in case_access (one row per user
+and visible case) and kept current from the signals in `signals`:
+`sync_cases` re-derives the grants of changed cases, `sync_user` those of
+a user whose employment changed. Listing a user's cases is then one
+indexed join, and `visible_case_ids` caches the id set per user under a
+version stamp that is bumped whenever their rows change.
+"""
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+
+from apps.core.cache import get_version, bump_version_on_commit
+from .models import Case, CaseAccess, CaseDocument
+
+VERSION_KEY = 'case-access'
+# The Case columns grant_rule depends on (besides team_members).
+GRANT_COLUMNS = ('assigned_lawyer_id', 'customer_id', 'court_id')
+CACHE_TIMEOUT = 60 * 60
+BATCH_SIZE = 2000
+
+
+def is_customer(user):
+    """Customers get a restricted view of their own cases."""
+    return not user.is_staff and hasattr(user, 'customer_profile')
+
+
+def is_employee(user):
+    """Staff, or an active employee of the firm; only they may change cases."""
+    if user.is_staff:
+        return True
+    employee = getattr(user, 'employee_profile', None)
+    return employee is not None and employee.is_active
+
+
+def visible_cases(user):
+    """Cases the user may see: staff see everything, others their own."""
+    if user.is_staff:
+        return Case.objects.all()
+    return Case.objects.filter(access_entries__user=user)
+
+
+def _version_key(user_id):
+    return f'{VERSION_KEY}:{user_id}'
+
+
+def visible_case_ids(user):
+    """frozenset of the ids of `user`'s visible cases (not for staff)."""
+    # The global version changes on a full rebuild, the user's on any sync
+    # that touched their rows.
+    key = f'case-access-ids:{user.pk}:{get_version(VERSION_KEY)}:{get_version(_version_key(user.pk))}'
+    ids = cache.get(key)
+    if ids is None:
+        ids = frozenset(CaseAccess.objects.filter(user=user).values_list('case_id', flat=True))
+        cache.set(key, ids, CACHE_TIMEOUT)
+    return ids
+
+
+def grant_rule(user):
+    """The access rule itself, as a Q over Case; `sync_*` materialize it."""
+    return (
+        Q(assigned_lawyer=user)
+        | Q(team_members=user)
+        | Q(customer__user=user)
+        | Q(court__employees__user=user, court__employees__is_active=True)
+    )
+
+
+def _granted(case_ids):
+    """{(user_id, case_id)} the rule grants for the given cases."""
+    cases = Case.objects.filter(pk__in=case_ids)
+    pairs = set()
+    for lawyer_id, customer_user_id, case_id in cases.values_list('assigned_lawyer_id', 'customer__user_id', 'id'):
+        pairs.add((lawyer_id, case_id))
+        pairs.add((customer_user_id, case_id))
+    team = Case.team_members.through.objects.filter(case_id__in=case_ids)
+    pairs.update(team.values_list('user_id', 'case_id'))
+    court_staff = cases.filter(court__employees__is_active=True)
+    pairs.update(court_staff.values_list('court__employees__user_id', 'id'))
+    return pairs
+
+
+def _write(stale, fresh):
+    """Delete `stale` and insert `fresh` (user_id, case_id) pairs; bump their users."""
+    by_user = defaultdict(list)
+    for user_id, case_id in stale:
+        by_user[user_id].append(case_id)
+    for user_id, case_ids in by_user.items():
+        CaseAccess.objects.filter(user_id=user_id, case_id__in=case_ids).delete()
+    CaseAccess.objects.bulk_create(
+        [CaseAccess(user_id=user_id, case_id=case_id) for user_id, case_id in fresh],
+        batch_size=BATCH_SIZE, ignore_conflicts=True,
+    )
+    for user_id in {user_id for user_id, _ in stale} | {user_id for user_id, _ in fresh}:
+        bump_version_on_commit(_version_key(user_id))
+
+
+def sync_cases(case_ids):
+    """Bring the grants of `case_ids` in line with the rule."""
+    case_ids = list(case_ids)
+    with transaction.atomic():
+        for start in range(0, len(case_ids), BATCH_SIZE):
+            chunk = case_ids[start:start + BATCH_SIZE]
+            granted = _granted(chunk)
+            stored = set(CaseAccess.objects.filter(case_id__in=chunk).values_list('user_id', 'case_id'))
+            _write(stored - granted, granted - stored)
+
+
+def sync_user(user_id, revoke_only=False):
+    """
+    Bring all of one user's grants in line with the rule (e.g. after a court
+    change). `revoke_only` just deletes rows the rule no longer grants.
+    """
+    with transaction.atomic():
+        granted = set(Case.objects.filter(grant_rule(user_id)).values_list('id', flat=True).distinct())
+        stored = set(CaseAccess.objects.filter(user_id=user_id).values_list('case_id', flat=True))
+        fresh = [] if revoke_only else [(user_id, pk) for pk in granted - stored]
+        _write([(user_id, pk) for pk in stored - granted], fresh)
+
+
+def case_deleted(case_id):
+    """Before a case is deleted: its rows go by CASCADE, their users' caches here."""
+    for user_id in CaseAccess.objects.filter(case_id=case_id).values_list('user_id', flat=True):
+        bump_version_on_commit(_version_key(user_id))
+
+
+def rebuild():
+    """Rewrite case_access from scratch; returns the number of rows."""
+    CaseAccess.objects.all().delete()
+    total = 0
+    ids = Case.objects.order_by('id').values_list('id', flat=True)
+    chunk = []
+    for pk in ids.iterator(chunk_size=BATCH_SIZE):
+        chunk.append(pk)
+        if len(chunk) == BATCH_SIZE:
+            total += _insert(chunk)
+            chunk = []
+    if chunk:
+        total += _insert(chunk)
+    bump_version_on_commit(VERSION_KEY)
+    return total
+
+
+def _insert(case_ids):
+    granted = _granted(case_ids)
+    CaseAccess.objects.bulk_create(
+        [CaseAccess(user_id=user_id, case_id=case_id) for user_id, case_id in granted],
+        batch_size=BATCH_SIZE,
+    )
+    return len(granted)
+
+
+def case_document_filter(user):
+    """
+    Q over CaseDocument: which documents of the cases `user` can already
+    see are shown to them. Customers only get documents shared with them
+    and never confidential ones; confidential documents are otherwise
+    limited to staff, the case's assigned lawyer and team, and whoever
+    uploaded them. Downloads, bundles, search and the timeline all go
+    through this one rule.
+    """
+    if user.is_staff:
+        return Q()
+    if is_customer(user):
+        return Q(is_visible_to_customer=True, is_confidential=False)
+    # A subquery, so that the team join cannot repeat documents.
+    insiders = Q(case__assigned_lawyer=user) | Q(case__team_members=user) | Q(uploaded_by=user)
+    return Q(is_confidential=False) | Q(pk__in=CaseDocument.objects.filter(insiders).values('id'))
+
+
+def case_update_filter(user, case):
+    """Q over CaseUpdate for a user who can already see `case`."""
+    if not user.is_staff and case.customer.user_id == user.pk:
+        return Q(is_visible_to_customer=True)
+    return Q()
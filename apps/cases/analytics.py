@@ -0,0 +1,242 @@
+"""
+Court, judge, category and monthly case analytics.
+
+A report pulls the handful of columns it needs in one `values_list`
+query, turns them into NumPy arrays and computes every group at once:
+disposal-time percentiles of closed cases, a pending-age histogram of
+open ones and the fee-collection ratio. Without NumPy the same figures
+are computed in one pass over the rows in pure Python, several times
+slower on large firms. Results are stored as AnalyticsSnapshot rows and
+served from there until they are `SNAPSHOT_TTL` old, so most report
+views are a single-row read.
+"""
+import bisect
+from datetime import date, timedelta
+
+from django.db.models import CharField, FloatField
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from apps.courts.models import Court, Judge
+from . import lookups
+from .models import AnalyticsSnapshot, Case
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional
+    np = None
+
+SNAPSHOT_TTL = timedelta(minutes=15)
+
+DIMENSIONS = ('court', 'judge', 'category', 'month')
+PERCENTILES = (25, 50, 75, 90)
+# Pending-age histogram bins in days; the last bin is open-ended.
+AGE_BINS = (0, 30, 90, 180, 365, 730, 1095)
+AGE_LABELS = tuple(
+    f'{low}-{high - 1}' for low, high in zip(AGE_BINS, AGE_BINS[1:])
+) + (f'{AGE_BINS[-1]}+',)
+
+NO_JUDGE = -1
+
+
+def _rows(queryset):
+    """
+    (court, judge, category, filed, closed, charged, paid) per case. Dates
+    and fees are cast in SQL so rows skip Django's per-value date and
+    Decimal converters: dates come back as ISO strings, fees as floats.
+    """
+    return list(
+        queryset.order_by()
+        .annotate(
+            filed=Cast('filing_date', CharField()),
+            closed=Cast('actual_closure_date', CharField()),
+            charged=Cast('fees_charged', FloatField()),
+            paid=Cast('fees_paid', FloatField()),
+        )
+        .values_list('court_id', 'judge_id', 'category_id', 'filed', 'closed', 'charged', 'paid')
+    )
+
+
+def _month(day):
+    """Months since 1970-01, as NumPy's datetime64[M] counts them."""
+    return (day.year - 1970) * 12 + day.month - 1
+
+
+def _labels(dimension, keys):
+    if dimension == 'month':
+        return {key: f'{1970 + key // 12:04d}-{key % 12 + 1:02d}' for key in keys}
+    if dimension == 'category':
+        return {key: lookups.categories.name_of(key) for key in keys}
+    model = Court if dimension == 'court' else Judge
+    names = {pk: row.name for pk, row in model.objects.in_bulk([k for k in keys if k != NO_JUDGE]).items()}
+    return {key: names.get(key, 'Unassigned' if key == NO_JUDGE else None) for key in keys}
+
+
+# -- NumPy ------------------------------------------------------------------
+
+def _columns(rows):
+    """The report columns as NumPy arrays (dates as datetime64[D], parsed in C)."""
+    court, judge, category, filed, closed, charged, paid = zip(*rows)
+    return {
+        'court': np.array(court, dtype=np.int64),
+        'judge': np.array([NO_JUDGE if pk is None else pk for pk in judge], dtype=np.int64),
+        'category': np.array(category, dtype=np.int64),
+        'filed': np.array(filed, dtype='datetime64[D]'),
+        'closed': np.array(closed, dtype='datetime64[D]'),  # None -> NaT
+        'charged': np.array(charged, dtype=np.float64),
+        'paid': np.array(paid, dtype=np.float64),
+    }
+
+
+def _group_keys(columns, dimension):
+    if dimension == 'month':
+        return columns['filed'].astype('datetime64[M]').astype(np.int64)
+    return columns[dimension]
+
+
+def _percentiles(groups, values, group_count):
+    """Per-group percentiles of `values` via one sort instead of one pass per group."""
+    result = [None] * group_count
+    if not len(values):
+        return result
+    order = np.lexsort((values, groups))
+    groups, values = groups[order], values[order]
+    starts = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]])
+    for group, chunk in zip(groups[starts], np.split(values, starts[1:])):
+        result[group] = dict(zip(
+            (f'p{p}' for p in PERCENTILES),
+            (round(float(v), 1) for v in np.percentile(chunk, PERCENTILES)),
+        ))
+        result[group]['mean'] = round(float(chunk.mean()), 1)
+    return result
+
+
+def _numpy_groups(rows, dimension, today):
+    columns = _columns(rows)
+    today = np.datetime64(today, 'D')
+    keys, groups = np.unique(_group_keys(columns, dimension), return_inverse=True)
+    group_count = len(keys)
+
+    is_closed = ~np.isnat(columns['closed'])
+    totals = np.bincount(groups, minlength=group_count)
+    closed_counts = np.bincount(groups[is_closed], minlength=group_count)
+
+    disposal_days = (columns['closed'][is_closed] - columns['filed'][is_closed]).astype(np.int64)
+    disposal = _percentiles(groups[is_closed], disposal_days, group_count)
+
+    pending_days = (today - columns['filed'][~is_closed]).astype(np.int64)
+    bins = np.digitize(pending_days, AGE_BINS[1:])
+    histogram = np.bincount(
+        groups[~is_closed] * len(AGE_LABELS) + bins, minlength=group_count * len(AGE_LABELS),
+    ).reshape(group_count, len(AGE_LABELS))
+
+    charged = np.bincount(groups, weights=columns['charged'], minlength=group_count)
+    paid = np.bincount(groups, weights=columns['paid'], minlength=group_count)
+    return [
+        (int(key), int(totals[i]), int(closed_counts[i]), disposal[i], histogram[i].tolist(),
+         float(charged[i]), float(paid[i]))
+        for i, key in enumerate(keys)
+    ]
+
+
+# -- pure Python --------------------------------------------------------------
+
+def _percentile(ordered, p):
+    """Linear interpolation between closest ranks, like numpy.percentile's default."""
+    position = (len(ordered) - 1) * p / 100
+    low = int(position)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+
+def _python_groups(rows, dimension, today):
+    groups = {}
+    for court, judge, category, filed, closed, charged, paid in rows:
+        filed = date.fromisoformat(filed)
+        if dimension == 'month':
+            key = _month(filed)
+        else:
+            key = {'court': court, 'judge': NO_JUDGE if judge is None else judge, 'category': category}[dimension]
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = {
+                'cases': 0, 'disposal': [], 'ages': [0] * len(AGE_LABELS), 'charged': 0.0, 'paid': 0.0,
+            }
+        group['cases'] += 1
+        group['charged'] += charged
+        group['paid'] += paid
+        if closed is None:
+            group['ages'][bisect.bisect_right(AGE_BINS[1:], (today - filed).days)] += 1
+        else:
+            group['disposal'].append((date.fromisoformat(closed) - filed).days)
+    result = []
+    for key in sorted(groups):
+        group = groups[key]
+        days = sorted(group['disposal'])
+        disposal = None
+        if days:
+            disposal = {f'p{p}': round(float(_percentile(days, p)), 1) for p in PERCENTILES}
+            disposal['mean'] = round(sum(days) / len(days), 1)
+        result.append((key, group['cases'], len(days), disposal, group['ages'], group['charged'], group['paid']))
+    return result
+
+
+def compute(queryset, dimension, today=None):
+    """The report rows for `queryset` grouped by `dimension`."""
+    if dimension not in DIMENSIONS:
+        raise ValueError(f"Unknown dimension '{dimension}'")
+    rows = _rows(queryset)
+    if not rows:
+        return []
+    groups = (_numpy_groups if np is not None else _python_groups)(rows, dimension, today or timezone.localdate())
+    labels = _labels(dimension, [group[0] for group in groups])
+    return [
+        {
+            'key': key,
+            'name': labels.get(key),
+            'cases': cases,
+            'closed': closed,
+            'open': cases - closed,
+            'disposal_days': disposal,
+            'pending_age': dict(zip(AGE_LABELS, histogram)),
+            'fees_charged': round(charged, 2),
+            'fees_paid': round(paid, 2),
+            'collection_ratio': round(paid / charged, 4) if charged > 0 else None,
+        }
+        for key, cases, closed, disposal, histogram, charged, paid in groups
+    ]
+
+
+def _snapshot_key(dimension, filed_from, filed_to):
+    return f'{dimension}:{filed_from or ""}:{filed_to or ""}'
+
+
+def report(dimension, filed_from=None, filed_to=None, refresh=False, ttl=SNAPSHOT_TTL):
+    """A report from its snapshot if still fresh, else recomputed and stored."""
+    key = _snapshot_key(dimension, filed_from, filed_to)
+    now = timezone.now()
+    if not refresh:
+        snapshot = AnalyticsSnapshot.objects.filter(key=key, expires_at__gt=now).first()
+        if snapshot is not None:
+            return snapshot.data
+    queryset = Case.objects.all()
+    if filed_from:
+        queryset = queryset.filter(filing_date__gte=filed_from)
+    if filed_to:
+        queryset = queryset.filter(filing_date__lte=filed_to)
+    data = {
+        'dimension': dimension,
+        'filed_from': str(filed_from) if filed_from else None,
+        'filed_to': str(filed_to) if filed_to else None,
+        'computed_at': now.isoformat(),
+        'groups': compute(queryset, dimension),
+    }
+    AnalyticsSnapshot.objects.update_or_create(
+        key=key, defaults={'data': data, 'computed_at': now, 'expires_at': now + ttl},
+    )
+    return data
+
+
+def purge_expired():
+    """Delete expired snapshots; returns how many."""
+    return AnalyticsSnapshot.objects.filter(expires_at__lte=timezone.now()).delete()[0]
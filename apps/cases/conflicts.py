@@ -0,0 +1,268 @@
+"""
+Conflict-of-interest checks over party names.
+
+Every customer (company name and the user's full name) and every case's
+opposing party and opposing lawyer is an entry in a process-local
+character-trigram index: trigram -> sorted array of entry numbers. A
+query is scored against all entries at once by concatenating the
+postings of its trigrams and counting hits per entry with np.bincount;
+the count gives the trigram Jaccard similarity, so the cost depends on
+the postings touched rather than on a string comparison per party.
+Without NumPy the postings stay Python lists and hits are counted in a
+dict, which is slower on popular trigrams but scores the same.
+
+Entries added after the last rebuild live in small Python postings that
+are scanned alongside. Each check first picks up customers and cases
+saved since the previous one (by their indexed updated_at, with an
+overlap for transactions that committed late), so saves in any process
+are seen by the next check; a changed name retires its old entry.
+Deleted rows drop out when matches are resolved and the index is rebuilt
+every REBUILD_INTERVAL or once the added entries outgrow MAX_PENDING.
+"""
+import re
+import threading
+import time
+import unicodedata
+from datetime import timedelta
+
+from django.utils import timezone
+
+from apps.customers.models import Customer
+from .models import Case
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional
+    np = None
+
+# Words that say nothing about who a party is.
+STOP_WORDS = frozenset(
+    'the and of & mr mrs ms dr adv advocate ltd limited pvt private inc llp llc co corp company'.split()
+)
+NON_WORD_RE = re.compile(r'[^\w]+')
+
+SIMILARITY_THRESHOLD = 0.45
+SYNC_OVERLAP = timedelta(seconds=60)
+REBUILD_INTERVAL = 6 * 60 * 60
+MAX_PENDING = 20000
+CHUNK_SIZE = 5000
+
+# Entry kinds: which side of which record a name came from.
+CUSTOMER_COMPANY = 'customer_company'
+CUSTOMER_NAME = 'customer_name'
+OPPOSING_PARTY = 'opposing_party'
+OPPOSING_LAWYER = 'opposing_lawyer'
+CUSTOMER_KINDS = (CUSTOMER_COMPANY, CUSTOMER_NAME)
+CASE_KINDS = (OPPOSING_PARTY, OPPOSING_LAWYER)
+
+
+def normalize(name):
+    """Lower-case, accent-free words of a name without legal filler."""
+    name = unicodedata.normalize('NFKD', name or '')
+    name = ''.join(ch for ch in name if not unicodedata.combining(ch)).casefold()
+    return ' '.join(word for word in NON_WORD_RE.sub(' ', name).split() if word not in STOP_WORDS)
+
+
+def trigrams(normalized):
+    """pg_trgm-style trigrams: each word padded with two leading and one trailing space."""
+    grams = set()
+    for word in normalized.split():
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def _customer_entries(row):
+    pk, company, first, last = row
+    yield CUSTOMER_COMPANY, pk, company
+    yield CUSTOMER_NAME, pk, f'{first} {last}'
+
+
+def _case_entries(row):
+    pk, party, lawyer = row
+    yield OPPOSING_PARTY, pk, party
+    yield OPPOSING_LAWYER, pk, lawyer
+
+
+CUSTOMER_COLUMNS = ('id', 'company_name', 'user__first_name', 'user__last_name')
+CASE_COLUMNS = ('id', 'opposing_party', 'opposing_lawyer')
+
+
+def _scored(query_size, postings, sizes, offset, threshold):
+    """(score, entry) at or above `threshold`, counting hits over lists of entry numbers."""
+    counts = {}
+    for posting in postings:
+        for entry in posting:
+            counts[entry] = counts.get(entry, 0) + 1
+    for entry, count in counts.items():
+        score = count / (query_size + sizes[entry - offset] - count)
+        if score >= threshold:
+            yield score, entry
+
+
+class TrigramIndex:
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.built_at = None
+        self.synced_at = None
+        self._reset()
+
+    def _reset(self):
+        self.names = []           # entry number -> original name
+        self.kinds = []           # entry number -> kind
+        self.refs = []            # entry number -> customer or case id
+        self.current = {}         # (kind, ref) -> (entry number, normalized name)
+        self.retired = set()      # entry numbers replaced by a newer name
+        self.postings = {}        # trigram -> np.int32 array or list (entries < base_size)
+        self.sizes = np.zeros(0, dtype=np.int32) if np is not None else []
+        self.base_size = 0
+        self.pending = {}         # trigram -> [entry numbers >= base_size]
+        self.pending_sizes = []
+
+    # -- building ---------------------------------------------------------
+
+    def _add(self, kind, ref, name, postings, sizes):
+        normalized = normalize(name)
+        key = (kind, ref)
+        previous = self.current.get(key)
+        if previous is not None:
+            if previous[1] == normalized:
+                return
+            self.retired.add(previous[0])
+            del self.current[key]
+        grams = trigrams(normalized)
+        if not grams:
+            return
+        entry = len(self.names)
+        self.names.append(name)
+        self.kinds.append(kind)
+        self.refs.append(ref)
+        self.current[key] = (entry, normalized)
+        for gram in grams:
+            postings.setdefault(gram, []).append(entry)
+        sizes.append(len(grams))
+
+    def _rows(self, since=None):
+        customers = Customer.objects.order_by()
+        cases = Case.objects.order_by()
+        if since is not None:
+            customers = customers.filter(updated_at__gte=since)
+            cases = cases.filter(updated_at__gte=since)
+        for row in customers.values_list(*CUSTOMER_COLUMNS).iterator(chunk_size=CHUNK_SIZE):
+            yield from _customer_entries(row)
+        for row in cases.values_list(*CASE_COLUMNS).iterator(chunk_size=CHUNK_SIZE):
+            yield from _case_entries(row)
+
+    def rebuild(self):
+        started = timezone.now()
+        with self.lock:
+            self._reset()
+            postings, sizes = {}, []
+            for kind, ref, name in self._rows():
+                self._add(kind, ref, name, postings, sizes)
+            if np is not None:
+                postings = {gram: np.array(entries, dtype=np.int32) for gram, entries in postings.items()}
+                sizes = np.array(sizes, dtype=np.int32)
+            self.postings, self.sizes = postings, sizes
+            self.base_size = len(self.names)
+            self.built_at = time.monotonic()
+            self.synced_at = started - SYNC_OVERLAP
+
+    def sync(self):
+        """Pick up customers and cases saved since the last sync; rebuild when due."""
+        with self.lock:
+            if (
+                self.built_at is None
+                or time.monotonic() - self.built_at > REBUILD_INTERVAL
+                or len(self.names) - self.base_size > MAX_PENDING
+            ):
+                self.rebuild()
+                return
+            started = timezone.now()
+            for kind, ref, name in self._rows(since=self.synced_at):
+                self._add(kind, ref, name, self.pending, self.pending_sizes)
+            self.synced_at = started - SYNC_OVERLAP
+
+    # -- querying ---------------------------------------------------------
+
+    def match(self, name, kinds=None, threshold=SIMILARITY_THRESHOLD, limit=20):
+        """[(score, kind, ref, name)] of entries similar to `name`, best first."""
+        grams = trigrams(normalize(name))
+        if not grams:
+            return []
+        with self.lock:
+            hits = [self.postings[gram] for gram in grams if gram in self.postings]
+            scored = []
+            if hits and np is not None:
+                counts = np.bincount(np.concatenate(hits), minlength=self.base_size)
+                scores = counts / (len(grams) + self.sizes - counts)
+                candidates = np.flatnonzero(scores >= threshold)
+                scored.extend(zip(scores[candidates].tolist(), candidates.tolist()))
+            elif hits:
+                scored.extend(_scored(len(grams), hits, self.sizes, 0, threshold))
+            if self.pending:
+                pending = [self.pending[gram] for gram in grams if gram in self.pending]
+                scored.extend(_scored(len(grams), pending, self.pending_sizes, self.base_size, threshold))
+            scored.sort(reverse=True)
+            results = []
+            for score, entry in scored:
+                kind = self.kinds[entry]
+                if entry in self.retired or (kinds is not None and kind not in kinds):
+                    continue
+                results.append((round(score, 3), kind, self.refs[entry], self.names[entry]))
+                if len(results) >= limit:
+                    break
+            return results
+
+
+index = TrigramIndex()
+
+
+def check(opposing_party='', opposing_lawyer='', customer=None, exclude_case=None,
+          threshold=SIMILARITY_THRESHOLD, limit=20):
+    """
+    Possible conflicts for a (prospective) case, best first:
+
+    - its opposing party or lawyer resembles one of our customers, or a
+      party we have acted against before;
+    - its customer resembles a party we have acted against before.
+
+    Matches on rows that no longer exist and on `exclude_case` are dropped.
+    """
+    index.sync()
+    found = []
+    for field, value in (('opposing_party', opposing_party), ('opposing_lawyer', opposing_lawyer)):
+        if value:
+            found.extend((field, value, match) for match in index.match(value, threshold=threshold, limit=limit * 2))
+    if customer is not None:
+        for value in (customer.company_name, customer.user.get_full_name()):
+            matches = index.match(value, kinds=CASE_KINDS, threshold=threshold, limit=limit * 2)
+            found.extend(('customer', value, match) for match in matches)
+
+    customer_ids = {ref for _, _, (_, kind, ref, _) in found if kind in CUSTOMER_KINDS}
+    case_ids = {ref for _, _, (_, kind, ref, _) in found if kind in CASE_KINDS}
+    live_customers = set(Customer.objects.filter(pk__in=customer_ids).values_list('id', flat=True))
+    live_cases = dict(Case.objects.filter(pk__in=case_ids).values_list('id', 'case_number'))
+
+    results, seen = [], set()
+    for field, value, (score, kind, ref, name) in sorted(found, key=lambda item: -item[2][0]):
+        if kind in CUSTOMER_KINDS:
+            if ref not in live_customers or (customer is not None and ref == customer.pk):
+                continue
+        elif ref not in live_cases or ref == exclude_case:
+            continue
+        if (field, kind, ref) in seen:
+            continue
+        seen.add((field, kind, ref))
+        results.append({
+            'field': field,
+            'query': value,
+            'kind': kind,
+            'customer' if kind in CUSTOMER_KINDS else 'case': ref,
+            **({'case_number': live_cases[ref]} if kind in CASE_KINDS else {}),
+            'name': name,
+            'score': score,
+        })
+        if len(results) >= limit:
+            break
+    return results
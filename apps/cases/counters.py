@@ -0,0 +1,208 @@
+"""
+Dashboard counters: case counts and fee totals per status, priority,
+category, court and assigned lawyer, plus a firm-wide 'all' bucket.
+
+Every Case write adds its contribution to the buckets it lands in and
+subtracts the one it leaves, as `UPDATE ... SET n = n + delta` in the
+writer's transaction, so a dashboard read is one small query over
+case_counters. The bucket left is taken from the row as stored, read
+under select_for_update() just before the write: the instance being saved
+may have been loaded before someone else's save moved the case. Writes
+that bypass signals (queryset.update(), raw SQL) are caught by
+`reconcile_case_counters`.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum, Value
+from django.db.models.functions import Coalesce
+
+from apps.courts.models import Court
+from . import lookups
+from .models import Case, CaseCounter
+
+DIMENSIONS = ('status', 'priority', 'category', 'court', 'assigned_lawyer')
+COLUMNS = tuple(f'{d}_id' for d in DIMENSIONS) + ('actual_closure_date', 'fees_charged', 'fees_paid')
+# Read by lock_case: the counters' columns plus what `access` and
+# `workload` diff against the stored row.
+STORED_COLUMNS = COLUMNS + ('customer_id',)
+
+ZERO = Decimal('0')
+
+NAMED = {
+    'status': lookups.statuses,
+    'priority': lookups.priorities,
+    'category': lookups.categories,
+}
+
+
+def _contribution(values, sign=1):
+    """{(dimension, key): [cases, open, charged, paid]} for one case's column values."""
+    delta = (
+        sign,
+        sign if values['actual_closure_date'] is None else 0,
+        sign * Decimal(values['fees_charged'] or 0),
+        sign * Decimal(values['fees_paid'] or 0),
+    )
+    buckets = {('all', 0): delta}
+    for dimension in DIMENSIONS:
+        buckets[(dimension, values[f'{dimension}_id'])] = delta
+    return buckets
+
+
+def _merge(target, buckets):
+    for bucket, delta in buckets.items():
+        current = target[bucket]
+        for i, value in enumerate(delta):
+            current[i] += value
+
+
+def _values(case):
+    return {column: getattr(case, column) for column in COLUMNS}
+
+
+def apply(deltas):
+    """Add per-bucket deltas with F() expressions, creating missing buckets."""
+    for (dimension, key), (cases, open_, charged, paid) in deltas.items():
+        if not (cases or open_ or charged or paid):
+            continue
+        changes = {
+            'case_count': F('case_count') + cases,
+            'open_count': F('open_count') + open_,
+            'fees_charged': F('fees_charged') + charged,
+            'fees_paid': F('fees_paid') + paid,
+        }
+        if CaseCounter.objects.filter(dimension=dimension, key=key).update(**changes):
+            continue
+        try:
+            with transaction.atomic():
+                CaseCounter.objects.create(
+                    dimension=dimension, key=key,
+                    case_count=cases, open_count=open_, fees_charged=charged, fees_paid=paid,
+                )
+        except IntegrityError:
+            # Another writer created the bucket first; add to theirs.
+            CaseCounter.objects.filter(dimension=dimension, key=key).update(**changes)
+
+
+def _new_deltas():
+    return defaultdict(lambda: [0, 0, ZERO, ZERO])
+
+
+def lock_case(case):
+    """
+    Before `case` is written or deleted (in the same transaction): lock its
+    row and keep its stored STORED_COLUMNS for `stored_values()`.
+    """
+    stored = None
+    if case.pk is not None:
+        stored = Case.objects.select_for_update().filter(pk=case.pk).values(*STORED_COLUMNS).first()
+    case._stored_values = stored
+
+
+def stored_values(case):
+    """
+    The case's row as it was stored just before the current save or
+    delete (None for a new case), for the post_save and post_delete
+    receivers that must diff against it rather than against the values
+    the instance was loaded with.
+    """
+    return case.__dict__.get('_stored_values')
+
+
+def case_saved(case, created):
+    deltas = _new_deltas()
+    old = stored_values(case)
+    if not created and old is not None:
+        _merge(deltas, _contribution(old, sign=-1))
+    _merge(deltas, _contribution(_values(case)))
+    apply(deltas)
+
+
+def case_deleted(case):
+    deltas = _new_deltas()
+    _merge(deltas, _contribution(stored_values(case) or _values(case), sign=-1))
+    apply(deltas)
+
+
+def cases_created(case_ids):
+    deltas = _new_deltas()
+    for values in Case.objects.filter(pk__in=case_ids).values(*COLUMNS).iterator(chunk_size=2000):
+        _merge(deltas, _contribution(values))
+    apply(deltas)
+
+
+def _labels(dimension, keys):
+    if dimension in NAMED:
+        table = NAMED[dimension]
+        return {key: table.name_of(key) for key in keys}
+    if dimension == 'court':
+        return {pk: court.name for pk, court in Court.objects.in_bulk(keys).items()}
+    users = get_user_model().objects.in_bulk(keys)
+    return {pk: user.get_full_name().strip() or user.email for pk, user in users.items()}
+
+
+def dashboard(dimensions=DIMENSIONS):
+    """Totals plus one list of non-empty buckets per dimension, read from case_counters."""
+    rows = CaseCounter.objects.filter(dimension__in=('all', *dimensions), case_count__gt=0)
+    grouped = defaultdict(list)
+    for row in rows.values('dimension', 'key', 'case_count', 'open_count', 'fees_charged', 'fees_paid'):
+        grouped[row.pop('dimension')].append(row)
+    totals = grouped.pop('all', [{'case_count': 0, 'open_count': 0, 'fees_charged': ZERO, 'fees_paid': ZERO}])[0]
+    totals.pop('key', None)
+    result = {'totals': totals}
+    for dimension in dimensions:
+        buckets = sorted(grouped.get(dimension, []), key=lambda row: -row['case_count'])
+        labels = _labels(dimension, [row['key'] for row in buckets])
+        result[dimension] = [
+            {'id': row['key'], 'name': labels.get(row['key']), **{k: v for k, v in row.items() if k != 'key'}}
+            for row in buckets
+        ]
+    return result
+
+
+def compute():
+    """Counters recomputed from the cases table, one GROUP BY per dimension."""
+    aggregates = {
+        'case_count': Count('id'),
+        'open_count': Count('id', filter=Q(actual_closure_date__isnull=True)),
+        'fees_charged': Coalesce(Sum('fees_charged'), Value(ZERO)),
+        'fees_paid': Coalesce(Sum('fees_paid'), Value(ZERO)),
+    }
+    rows = {('all', 0): Case.objects.aggregate(**aggregates)}
+    for dimension in DIMENSIONS:
+        column = f'{dimension}_id'
+        for row in Case.objects.order_by().values(column).annotate(**aggregates):
+            rows[(dimension, row.pop(column))] = row
+    return rows
+
+
+def reconcile(fix=True):
+    """
+    Compare case_counters with a fresh computation and return the drift as
+    [(dimension, key, stored, expected)]. With `fix`, rewrite the table.
+    """
+    expected = compute()
+    stored = {
+        (row['dimension'], row['key']): row
+        for row in CaseCounter.objects.values('dimension', 'key', 'case_count', 'open_count', 'fees_charged', 'fees_paid')
+    }
+    fields = ('case_count', 'open_count', 'fees_charged', 'fees_paid')
+    empty = dict.fromkeys(fields, 0)
+    drift = []
+    for bucket in sorted(expected.keys() | stored.keys(), key=str):
+        want = {f: expected.get(bucket, empty)[f] for f in fields}
+        have = {f: stored[bucket][f] for f in fields} if bucket in stored else empty
+        if any(Decimal(want[f]) != Decimal(have[f]) for f in fields):
+            drift.append((*bucket, have, want))
+    if fix:
+        with transaction.atomic():
+            CaseCounter.objects.all().delete()
+            CaseCounter.objects.bulk_create([
+                CaseCounter(dimension=dimension, key=key, **{f: values[f] for f in fields})
+                for (dimension, key), values in expected.items()
+                if values['case_count']
+            ])
+    return drift
@@ -0,0 +1,198 @@
+"""
+Hearing calendar: agenda views, range queries and double-booking checks.
+
+Agendas and range queries are single ORM queries. Slot checks go through an
+`IntervalIndex` per (resource, month) cached in-process and dropped when
+the "calendar" version stamp is bumped by a Hearing or Case write.
+"""
+import bisect
+import threading
+from collections import OrderedDict
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+
+from apps.core.cache import get_version
+from .models import Hearing
+
+VERSION_KEY = 'calendar'
+
+# How each kind of calendar owner is reached from a Hearing.
+RESOURCE_FIELDS = {
+    'lawyer': 'case__assigned_lawyer_id',
+    'judge': 'judge_id',
+    'court': 'case__court_id',
+}
+# Only these can clash; completed, postponed and cancelled hearings cannot.
+ACTIVE_STATUSES = ('scheduled', 'in_progress')
+MAX_DURATION = timedelta(minutes=Hearing.MAX_DURATION_MINUTES)
+VIEWS = ('day', 'week', 'month')
+
+MAX_CACHED_INDEXES = 1024
+
+
+class IntervalIndex:
+    """
+    Intervals sorted by start, with the longest span tracked so an overlap
+    search only has to look back that far: O(log n + k) per lookup or
+    insert, where k is the number of hearings in the window.
+    """
+
+    def __init__(self):
+        self._starts = []
+        self._entries = []
+        self._max_span = timedelta(0)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def overlapping(self, start, end):
+        lo = bisect.bisect_left(self._starts, start - self._max_span)
+        hi = bisect.bisect_left(self._starts, end)
+        return [entry for entry in self._entries[lo:hi] if entry[1] > start]
+
+    def add(self, start, end, key):
+        """Insert an interval and return the entries it overlaps."""
+        conflicts = self.overlapping(start, end)
+        pos = bisect.bisect_right(self._starts, start)
+        self._starts.insert(pos, start)
+        self._entries.insert(pos, (start, end, key))
+        self._max_span = max(self._max_span, end - start)
+        return conflicts
+
+
+def _window(row):
+    pk, start, minutes = row
+    return start, start + timedelta(minutes=minutes), pk
+
+
+def _active_for(kind, resource_ids):
+    if kind not in RESOURCE_FIELDS:
+        raise ValueError(f"Unknown calendar resource '{kind}'")
+    return Hearing.objects.filter(
+        **{f'{RESOURCE_FIELDS[kind]}__in': list(resource_ids)},
+        status__in=ACTIVE_STATUSES,
+    )
+
+
+def _month_start(moment):
+    local = timezone.localtime(moment)
+    return timezone.make_aware(datetime(local.year, local.month, 1))
+
+
+def _next_month(month_start):
+    return _month_start(month_start + timedelta(days=32))
+
+
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def month_index(kind, resource_id, month_start):
+    """Interval index of active hearings starting in one calendar month."""
+    version = get_version(VERSION_KEY)
+    key = (kind, resource_id, month_start)
+    with _indexes_lock:
+        cached = _indexes.get(key)
+        if cached is not None and cached[0] == version:
+            _indexes.move_to_end(key)
+            return cached[1]
+
+    index = IntervalIndex()
+    rows = (
+        _active_for(kind, [resource_id])
+        .filter(hearing_date__gte=month_start, hearing_date__lt=_next_month(month_start))
+        .order_by('hearing_date')
+        .values_list('id', 'hearing_date', 'duration_minutes')
+    )
+    for row in rows:
+        index.add(*_window(row))
+
+    with _indexes_lock:
+        _indexes[key] = (version, index)
+        _indexes.move_to_end(key)
+        while len(_indexes) > MAX_CACHED_INDEXES:
+            _indexes.popitem(last=False)
+    return index
+
+
+def check_slot(kind, resource_id, start, end, exclude=None):
+    """
+    Active hearings of one lawyer/judge/court overlapping [start, end),
+    as (start, end, hearing_id) tuples. `exclude` skips a hearing id, so a
+    hearing being rescheduled does not clash with itself.
+    """
+    month = _month_start(start - MAX_DURATION)
+    clashes = []
+    while month < end:
+        clashes.extend(
+            entry for entry in month_index(kind, resource_id, month).overlapping(start, end)
+            if entry[2] != exclude
+        )
+        month = _next_month(month)
+    return clashes
+
+
+def hearing_conflicts(hearing):
+    """Clashes for a (possibly unsaved) hearing, keyed by 'lawyer' and 'judge'."""
+    start, end = hearing.hearing_date, hearing.ends_at
+    result = {}
+    owners = {'lawyer': hearing.case.assigned_lawyer_id, 'judge': hearing.judge_id}
+    for kind, resource_id in owners.items():
+        if resource_id is not None:
+            result[kind] = check_slot(kind, resource_id, start, end, exclude=hearing.pk)
+    return result
+
+
+def range_query(kind, resource_ids, start, end, queryset=None):
+    """Hearings of several lawyers/judges/courts in [start, end), one query."""
+    queryset = queryset if queryset is not None else Hearing.objects.all()
+    field = RESOURCE_FIELDS[kind]
+    return (
+        queryset.filter(**{f'{field}__in': list(resource_ids)}, hearing_date__gte=start, hearing_date__lt=end)
+        .select_related('case', 'judge')
+        .order_by('hearing_date', 'id')
+    )
+
+
+def find_conflicts(kind, resource_id, start, end):
+    """All overlapping pairs of active hearings of one resource in a range."""
+    rows = (
+        _active_for(kind, [resource_id])
+        .filter(hearing_date__gte=start - MAX_DURATION, hearing_date__lt=end)
+        .order_by('hearing_date')
+        .values_list('id', 'hearing_date', 'duration_minutes')
+    )
+    index = IntervalIndex()
+    pairs = []
+    for row in rows:
+        hearing_start, hearing_end, pk = _window(row)
+        for other in index.add(hearing_start, hearing_end, pk):
+            if hearing_end > start:
+                pairs.append((other[2], pk))
+    return pairs
+
+
+def view_bounds(view, day):
+    """[start, end) of the day, ISO week or month containing `day`."""
+    if view not in VIEWS:
+        raise ValueError(f"Unknown agenda view '{view}'")
+    if view == 'week':
+        day = day - timedelta(days=day.weekday())
+    elif view == 'month':
+        day = day.replace(day=1)
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    if view == 'day':
+        return start, start + timedelta(days=1)
+    if view == 'week':
+        return start, start + timedelta(days=7)
+    return start, _next_month(start)
+
+
+def agenda(kind, resource_id, view, day, queryset=None):
+    """Hearings for a day/week/month grouped by local date, in one query."""
+    start, end = view_bounds(view, day)
+    grouped = OrderedDict()
+    for hearing in range_query(kind, [resource_id], start, end, queryset=queryset):
+        grouped.setdefault(timezone.localtime(hearing.hearing_date).date(), []).append(hearing)
+    return start, end, grouped
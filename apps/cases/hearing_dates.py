@@ -0,0 +1,68 @@
+"""
+Case.hearing_date and Case.next_hearing_date, derived from Hearing.
+
+next_hearing_date is the day of the earliest scheduled or in-progress
+hearing from today on; hearing_date the day of the latest hearing before
+today that was not cancelled or postponed. Days are in the local time zone.
+
+Saving or deleting a hearing refreshes its case with one UPDATE whose two
+correlated subqueries read the (case, hearing_date, id) index. Because
+"today" moves, `recompute()` re-derives every case in one set-based
+UPDATE restricted to the rows that changed; run it nightly
+(`manage.py recompute_hearing_dates`). Cases without any hearing keep
+whatever dates they were created or imported with.
+"""
+import datetime
+
+from django.db.models import Exists, F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from .hearing_calendar import ACTIVE_STATUSES
+from .models import Case, Hearing
+
+NOT_HELD = ('cancelled', 'postponed')
+
+# Stand-in for NULL when comparing stored and derived dates.
+NO_DATE = datetime.date(1, 1, 1)
+
+
+def today_start():
+    return timezone.make_aware(datetime.datetime.combine(timezone.localdate(), datetime.time.min))
+
+
+def _day(queryset):
+    return Subquery(queryset.annotate(day=TruncDate('hearing_date')).values('day')[:1])
+
+
+def derived(since=None):
+    """{'next_hearing_date': ..., 'hearing_date': ...} as subqueries over OuterRef('pk')."""
+    since = since or today_start()
+    hearings = Hearing.objects.filter(case=OuterRef('pk'))
+    return {
+        'next_hearing_date': _day(
+            hearings.filter(status__in=ACTIVE_STATUSES, hearing_date__gte=since).order_by('hearing_date', 'id')
+        ),
+        'hearing_date': _day(
+            hearings.filter(hearing_date__lt=since).exclude(status__in=NOT_HELD).order_by('-hearing_date', '-id')
+        ),
+    }
+
+
+def refresh(case_ids):
+    """Re-derive the hearing dates of the given cases with one UPDATE."""
+    return Case.objects.filter(pk__in=case_ids).update(**derived())
+
+
+def recompute():
+    """Re-derive every case whose stored dates are stale; returns the number fixed."""
+    expressions = derived()
+    stale = Case.objects.filter(Exists(Hearing.objects.filter(case=OuterRef('pk')))).alias(
+        next_key=Coalesce('next_hearing_date', Value(NO_DATE)),
+        last_key=Coalesce('hearing_date', Value(NO_DATE)),
+        derived_next_key=Coalesce(expressions['next_hearing_date'], Value(NO_DATE)),
+        derived_last_key=Coalesce(expressions['hearing_date'], Value(NO_DATE)),
+    ).exclude(
+        Q(next_key=F('derived_next_key')) & Q(last_key=F('derived_last_key')),
+    )
+    return Case.objects.filter(pk__in=stale.values('pk')).update(**expressions)
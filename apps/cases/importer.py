@@ -0,0 +1,264 @@
+"""
+Streaming bulk import of cases from CSV or JSON Lines.
+
+Rows are read one at a time, foreign keys are resolved through in-memory
+name -> id maps (the small lookup tables are preloaded, larger ones are
+fetched once per chunk for the keys that chunk needs), and each chunk is
+written with one bulk_create inside its own transaction. A bad row is
+reported and skipped; it never aborts its chunk or the import.
+"""
+import csv
+import io
+import json
+import time
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.db.models.functions import Lower
+
+from apps.courts.models import Court, Judge
+from apps.customers.models import Customer
+from apps.users.models import User
+from .models import Case, CaseCategory, CaseStatus, CasePriority
+from .signals import cases_created
+
+TEXT_FIELDS = ('case_number', 'title', 'description', 'opposing_party', 'opposing_lawyer', 'internal_notes')
+DATE_FIELDS = ('filing_date', 'hearing_date', 'next_hearing_date', 'expected_closure_date', 'actual_closure_date')
+MONEY_FIELDS = ('estimated_value', 'fees_charged', 'fees_paid')
+FK_FIELDS = ('category', 'status', 'priority', 'customer', 'court', 'judge', 'assigned_lawyer')
+OPTIONAL_FKS = ('judge',)
+
+MAX_REPORTED_ERRORS = 1000
+
+
+class Resolver:
+    """Maps a human key (name, email, customer id, ...) to a primary key."""
+
+    def __init__(self, queryset, *key_fields):
+        self.queryset = queryset
+        self.key_fields = key_fields
+        self.ids = {}
+        self.ambiguous = set()
+        self.missing = set()
+
+    @staticmethod
+    def normalize(value):
+        # lower(), not casefold(): prefetch() matches keys with SQL LOWER().
+        return str(value).strip().lower()
+
+    def _load(self, rows):
+        for row in rows:
+            pk, keys = row[0], row[1:]
+            for key in keys:
+                if key in (None, ''):
+                    continue
+                key = self.normalize(key)
+                if key in self.ids and self.ids[key] != pk:
+                    self.ambiguous.add(key)
+                self.ids[key] = pk
+
+    def preload(self):
+        self._load(self.queryset.values_list('id', *self.key_fields))
+        return self
+
+    def prefetch(self, values):
+        """Fetch, in one query, the keys of a chunk not seen before."""
+        wanted = {}
+        for value in values:
+            if value in (None, ''):
+                continue
+            key = self.normalize(value)
+            if key not in self.ids and key not in self.missing:
+                wanted[key] = str(value).strip()
+        if not wanted:
+            return
+        field = self.key_fields[0]
+        # Keys are matched the way resolve() looks them up, case-insensitively,
+        # through an index on LOWER(field). The exact spellings are matched too,
+        # for databases whose LOWER() leaves non-ASCII letters alone.
+        rows = (
+            self.queryset.annotate(import_key=Lower(field))
+            .filter(Q(import_key__in=list(wanted)) | Q(**{f'{field}__in': list(wanted.values())}))
+            .order_by()
+            .values_list('id', *self.key_fields)
+        )
+        self._load(rows)
+        self.missing |= wanted.keys() - self.ids.keys()
+
+    def resolve(self, value):
+        key = self.normalize(value)
+        if key in self.ambiguous:
+            raise ValidationError(f"'{value}' matches more than one record")
+        try:
+            return self.ids[key]
+        except KeyError:
+            raise ValidationError(f"'{value}' not found")
+
+
+def build_resolvers():
+    return {
+        'category': Resolver(CaseCategory.objects.all(), 'name').preload(),
+        'status': Resolver(CaseStatus.objects.all(), 'name').preload(),
+        'priority': Resolver(CasePriority.objects.all(), 'name', 'level').preload(),
+        'court': Resolver(Court.objects.all(), 'name').preload(),
+        # Potentially large tables: only the keys each chunk uses are fetched.
+        'judge': Resolver(Judge.objects.all(), 'bar_id'),
+        'customer': Resolver(Customer.objects.all(), 'customer_id'),
+        'assigned_lawyer': Resolver(User.objects.all(), 'email'),
+    }
+
+
+def read_rows(stream, fmt):
+    """Yield (line_number, dict) from a text stream of CSV or JSON Lines."""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    elif fmt == 'jsonl':
+        for line_number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError as exc:
+                yield line_number, exc
+                continue
+            yield line_number, row if isinstance(row, dict) else ValueError("expected a JSON object")
+    else:
+        raise ValueError(f"Unsupported import format '{fmt}'")
+
+
+def text_stream(binary, encoding='utf-8'):
+    return io.TextIOWrapper(binary, encoding=encoding, newline='')
+
+
+class ImportReport:
+    def __init__(self):
+        self.rows = 0
+        self.created = 0
+        self.failed = 0
+        self.errors = []
+        self.started = time.perf_counter()
+
+    def error(self, line, errors):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line, 'errors': errors})
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    def as_dict(self):
+        return {
+            'rows': self.rows,
+            'created': self.created,
+            'failed': self.failed,
+            'errors': self.errors,
+            'errors_truncated': self.failed > len(self.errors),
+            'seconds': round(self.elapsed, 3),
+            'rows_per_second': round(self.rows_per_second, 1),
+        }
+
+
+class CaseImporter:
+    def __init__(self, created_by=None, chunk_size=1000, progress=None):
+        self.created_by = created_by
+        self.chunk_size = chunk_size
+        self.progress = progress
+        self.resolvers = build_resolvers()
+        self.report = ImportReport()
+
+    def run(self, stream, fmt):
+        chunk = []
+        for line, row in read_rows(stream, fmt):
+            self.report.rows += 1
+            if isinstance(row, Exception):
+                self.report.error(line, {'row': [str(row)]})
+                continue
+            chunk.append((line, row))
+            if len(chunk) >= self.chunk_size:
+                self._flush(chunk)
+                chunk = []
+        if chunk:
+            self._flush(chunk)
+        return self.report
+
+    def _build(self, row):
+        errors = {}
+        values = {}
+        for name in TEXT_FIELDS + DATE_FIELDS + MONEY_FIELDS:
+            value = row.get(name)
+            if value not in (None, ''):
+                values[name] = value.strip() if isinstance(value, str) else value
+        for name in FK_FIELDS:
+            value = row.get(name)
+            if value in (None, ''):
+                if name not in OPTIONAL_FKS:
+                    errors[name] = ["This field is required."]
+                continue
+            try:
+                values[f'{name}_id'] = self.resolvers[name].resolve(value)
+            except ValidationError as exc:
+                errors[name] = exc.messages
+        case = Case(created_by=self.created_by, **values)
+        try:
+            # FK columns are already resolved; clean_fields() would re-query them.
+            case.clean_fields(exclude=FK_FIELDS + ('created_by', 'team_members'))
+        except ValidationError as exc:
+            errors.update(exc.message_dict)
+        return case, errors
+
+    def _flush(self, chunk):
+        for name in ('judge', 'customer', 'assigned_lawyer'):
+            self.resolvers[name].prefetch(row.get(name) for _, row in chunk)
+
+        numbers = [str(row.get('case_number', '')).strip() for _, row in chunk]
+        existing = set(Case.objects.filter(case_number__in=numbers).values_list('case_number', flat=True))
+        seen = set()
+        pending = []
+        for (line, row), number in zip(chunk, numbers):
+            case, errors = self._build(row)
+            if number in existing or number in seen:
+                errors.setdefault('case_number', []).append(f"case '{number}' already exists")
+            if errors:
+                self.report.error(line, errors)
+                continue
+            seen.add(number)
+            pending.append((line, case))
+
+        created = self._write(pending)
+        self.report.created += len(created)
+        if self.progress:
+            self.progress(self.report)
+
+    @staticmethod
+    def _insert(cases):
+        # cases_created goes out inside the transaction so derived stores
+        # commit or roll back together with the rows.
+        with transaction.atomic():
+            created = Case.objects.bulk_create(cases)
+            cases_created.send(sender=Case, case_ids=[case.pk for case in created])
+        return created
+
+    def _write(self, pending):
+        try:
+            return self._insert([case for _, case in pending])
+        except IntegrityError:
+            pass
+        # A concurrent writer took one of the case numbers: fall back to
+        # row-by-row inserts so only the offending rows are rejected. Still
+        # bulk_create, so post_save stays silent and cases_created is the
+        # single notification for every imported row.
+        created = []
+        for line, case in pending:
+            try:
+                created.extend(self._insert([case]))
+            except IntegrityError as exc:
+                self.report.error(line, {'row': [str(exc)]})
+        return created
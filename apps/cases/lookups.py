@@ -0,0 +1,92 @@
+"""
+Process-local copies of the small case lookup tables.
+
+Categories, statuses, priorities and tags are read on every case row and
+filter but change a few times a year. Each table is loaded once per
+process and served from dicts. Committed writes bump a shared version
+stamp, which other workers notice within `check_interval` seconds; the
+writing process drops its copy as soon as the write commits.
+"""
+import threading
+import time
+
+from django.db import transaction
+
+from apps.core.cache import get_version, bump_version_on_commit
+from .models import CaseCategory, CaseStatus, CasePriority, CaseTag
+
+
+class LookupTable:
+    check_interval = 1.0
+
+    def __init__(self, model, name_field='name'):
+        self.model = model
+        self.name_field = name_field
+        self.version_key = f'lookups:{model._meta.label_lower}'
+        self._data = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    def __deepcopy__(self, memo):
+        # Shared per process; serializer fields deep-copy their arguments.
+        return self
+
+    def _snapshot(self):
+        data = self._data
+        now = time.monotonic()
+        if data is not None and now - self._checked < self.check_interval:
+            return data
+        version = get_version(self.version_key)
+        if data is None or data[0] != version:
+            with self._lock:
+                rows = list(self.model._default_manager.all())
+                data = (
+                    version,
+                    rows,
+                    {row.pk: row for row in rows},
+                    {getattr(row, self.name_field).casefold(): row for row in rows},
+                )
+                self._data = data
+        self._checked = now
+        return data
+
+    def all(self):
+        return list(self._snapshot()[1])
+
+    def get_by_id(self, pk):
+        return self._snapshot()[2].get(pk)
+
+    def get_by_name(self, name):
+        return self._snapshot()[3].get(str(name).strip().casefold())
+
+    def resolve(self, value):
+        """Row for an id (int or numeric string) or a name, else None."""
+        if isinstance(value, int) or (isinstance(value, str) and value.strip().isdigit()):
+            row = self.get_by_id(int(value))
+            if row is not None:
+                return row
+        return self.get_by_name(value)
+
+    def name_of(self, pk):
+        row = self.get_by_id(pk)
+        return getattr(row, self.name_field) if row is not None else None
+
+    def invalidate(self):
+        transaction.on_commit(self._drop)
+        bump_version_on_commit(self.version_key)
+
+    def _drop(self):
+        self._data = None
+
+
+categories = LookupTable(CaseCategory)
+statuses = LookupTable(CaseStatus)
+priorities = LookupTable(CasePriority)
+tags = LookupTable(CaseTag)
+
+TABLES = {
+    CaseCategory: categories,
+    CaseStatus: statuses,
+    CasePriority: priorities,
+    CaseTag: tags,
+}
@@ -0,0 +1,132 @@
+"""
+Synthetic data shared by the benchmark commands.
+
+Benchmarks seed their rows inside a transaction that is rolled back when
+they finish, so running one against a real database leaves it untouched.
+"""
+import random
+import statistics
+import time
+import uuid
+from datetime import date, timedelta
+
+from apps.courts.models import Court, Judge
+from apps.customers.models import Customer
+from apps.users.models import User
+from apps.cases.models import Case, CaseCategory, CaseStatus, CasePriority
+
+WORDS = (
+    'agreement appeal arbitration bail breach claim compensation contract '
+    'custody damages decree deed defamation divorce easement eviction fraud '
+    'guarantee injunction insurance land lease licence maintenance merger '
+    'negligence notice partition patent possession probate property recovery '
+    'rent review salary settlement shares tax tenancy title trademark trust '
+    'violation warranty will writ'
+).split()
+
+
+# ~1700 pronounceable surnames so party names are selective, unlike WORDS.
+SYLLABLES = 'ka ri to ne sa mu la pe vi do ra ge'.split()
+NAMES = [a + b + c for a in SYLLABLES for b in SYLLABLES for c in SYLLABLES]
+
+
+def sentence(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+
+def party(rng):
+    return f'{rng.choice(NAMES)} {rng.choice(NAMES)}'.title()
+
+
+def seed_lookups(prefix, lawyers=5, customers=20, courts=3, judges=6):
+    """Create the rows every Case points at and return them grouped by kind."""
+    categories = [
+        CaseCategory.objects.create(name=f'{prefix}-{name}')
+        for name in ('civil', 'criminal', 'family', 'corporate', 'tax')
+    ]
+    statuses = [
+        CaseStatus.objects.create(name=f'{prefix}-{name}', order=i)
+        for i, name in enumerate(('filed', 'pending', 'hearing', 'closed'))
+    ]
+    priorities = [
+        CasePriority.objects.get_or_create(level=level, defaults={'name': f'{prefix}-p{level}'})[0]
+        for level in (1, 2, 3, 4)
+    ]
+    court_rows = [
+        Court.objects.create(name=f'{prefix} court {i}', court_type='district', address='-')
+        for i in range(courts)
+    ]
+    judge_rows = [
+        Judge.objects.create(name=f'{prefix} judge {i}', bar_id=f'{prefix}-J{i}', court=court_rows[i % courts])
+        for i in range(judges)
+    ]
+    lawyer_rows = [
+        User.objects.create_user(email=f'{prefix}-lawyer{i}@bench.invalid', is_staff=True)
+        for i in range(lawyers)
+    ]
+    customer_rows = [
+        Customer.objects.create(
+            user=User.objects.create_user(email=f'{prefix}-client{i}@bench.invalid'),
+            customer_id=f'{prefix}-C{i}',
+            company_name=f'{prefix} client {i}',
+        )
+        for i in range(customers)
+    ]
+    return {
+        'categories': categories,
+        'statuses': statuses,
+        'priorities': priorities,
+        'courts': court_rows,
+        'judges': judge_rows,
+        'lawyers': lawyer_rows,
+        'customers': customer_rows,
+    }
+
+
+def seed_cases(count, batch_size=5000, seed=0, stdout=None, **lookup_kwargs):
+    """Bulk-insert `count` cases with random text, dates and fees."""
+    rng = random.Random(seed)
+    prefix = f'bench-{uuid.uuid4().hex[:8]}'
+    lookups = seed_lookups(prefix, **lookup_kwargs)
+    today = date.today()
+    for start in range(0, count, batch_size):
+        batch = []
+        for i in range(start, min(count, start + batch_size)):
+            filing = today - timedelta(days=rng.randint(0, 3650))
+            closed = rng.random() < 0.3
+            fees = rng.randint(0, 500000)
+            batch.append(Case(
+                case_number=f'{prefix}-{i:08d}',
+                title=sentence(rng, 6),
+                description=sentence(rng, 30),
+                category=rng.choice(lookups['categories']),
+                status=rng.choice(lookups['statuses']),
+                priority=rng.choice(lookups['priorities']),
+                customer=rng.choice(lookups['customers']),
+                opposing_party=party(rng),
+                opposing_lawyer=party(rng),
+                court=rng.choice(lookups['courts']),
+                judge=rng.choice(lookups['judges']),
+                assigned_lawyer=rng.choice(lookups['lawyers']),
+                filing_date=filing,
+                expected_closure_date=filing + timedelta(days=rng.randint(30, 1500)),
+                actual_closure_date=filing + timedelta(days=rng.randint(30, 1500)) if closed else None,
+                fees_charged=fees,
+                fees_paid=rng.randint(0, fees),
+                internal_notes=sentence(rng, 10),
+            ))
+        Case.objects.bulk_create(batch)
+        if stdout is not None:
+            stdout.write(f'  seeded {min(count, start + batch_size)}/{count} cases')
+    lookups['prefix'] = prefix
+    return lookups
+
+
+def measure(fn, repeat=5):
+    """Median wall time of `fn()` in milliseconds."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
@@ -0,0 +1,49 @@
+import statistics
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from apps.cases import analytics
+from apps.cases.models import Case
+from ._synthetic import seed_cases, measure
+
+
+class Command(BaseCommand):
+    help = "Compare the column-wise court report (NumPy if installed) with a per-case Python loop over model instances"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cases', type=int, default=200_000)
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            lookups = seed_cases(options['cases'], batch_size=10000, stdout=self.stdout, courts=20)
+            queryset = Case.objects.filter(case_number__startswith=lookups['prefix'])
+            today = timezone.localdate()
+
+            def loop():
+                disposal, charged, paid = defaultdict(list), defaultdict(float), defaultdict(float)
+                for case in queryset.all():
+                    if case.actual_closure_date is not None:
+                        disposal[case.court_id].append((case.actual_closure_date - case.filing_date).days)
+                    charged[case.court_id] += float(case.fees_charged)
+                    paid[case.court_id] += float(case.fees_paid)
+                return {
+                    court: (statistics.median(days) if days else None, paid[court] / charged[court])
+                    for court, days in disposal.items()
+                }
+
+            def vectorized():
+                return analytics.compute(queryset, 'court', today=today)
+
+            expected = loop()
+            for group in vectorized():
+                median, ratio = expected[group['key']]
+                assert abs(group['disposal_days']['p50'] - median) <= 0.5, "medians disagree"
+                assert abs(group['collection_ratio'] - ratio) < 1e-4, "collection ratios disagree"
+            self.stdout.write(f"{queryset.count()} cases, {len(expected)} courts")
+            self.stdout.write(f"python loop over instances: {measure(loop, options['repeat']):9.1f} ms")
+            self.stdout.write(f"analytics.compute:          {measure(vectorized, options['repeat']):9.1f} ms")
+            transaction.set_rollback(True)
@@ -0,0 +1,60 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.cases import access
+from apps.cases.models import Case
+from apps.employees.models import Employee
+from apps.users.models import User
+from ._synthetic import seed_cases, measure
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare listing a user's visible cases through case_access with the OR-of-joins rule, "
+        "for a user with a few cases and one with a whole court's"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cases', type=int, default=100_000)
+        parser.add_argument('--small', type=int, default=10, help="Cases of the small user (team membership)")
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            # One court so its clerk sees every seeded case.
+            lookups = seed_cases(options['cases'], batch_size=10000, stdout=self.stdout, courts=1)
+            prefix = lookups['prefix']
+            court = lookups['courts'][0]
+            clerk = User.objects.create_user(email=f'{prefix}-clerk@bench.invalid')
+            Employee.objects.create(
+                user=clerk, court=court, employee_id=f'{prefix}-E1', designation='clerk',
+                date_of_joining=date.today(),
+            )
+            associate = User.objects.create_user(email=f'{prefix}-associate@bench.invalid')
+            for case in Case.objects.filter(case_number__startswith=prefix)[:options['small']]:
+                case.team_members.add(associate)
+            rows = access.rebuild()
+            self.stdout.write(f"case_access rows: {rows}")
+
+            for label, user in (('small', associate), ('large', clerk)):
+                def rule(user=user):
+                    queryset = Case.objects.filter(access.grant_rule(user)).distinct().order_by('-created_at', '-id')
+                    return list(queryset.values_list('id', flat=True)[:20]), queryset.count()
+
+                def materialized(user=user):
+                    queryset = access.visible_cases(user).order_by('-created_at', '-id')
+                    return list(queryset.values_list('id', flat=True)[:20]), queryset.count()
+
+                def id_set(user=user):
+                    return len(access.visible_case_ids(user))
+
+                assert rule() == materialized(), "access rule and case_access disagree"
+                count = materialized()[1]
+                repeat = options['repeat']
+                self.stdout.write(f"{label} user ({count} cases), first page + count:")
+                self.stdout.write(f"  OR of joins:     {measure(rule, repeat):9.2f} ms")
+                self.stdout.write(f"  case_access:     {measure(materialized, repeat):9.2f} ms")
+                self.stdout.write(f"  cached id set:   {measure(id_set, repeat):9.2f} ms")
+            transaction.set_rollback(True)
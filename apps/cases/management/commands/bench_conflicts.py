@@ -0,0 +1,68 @@
+import random
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.cases import conflicts
+from apps.cases.models import Case
+from apps.customers.models import Customer
+from ._synthetic import seed_cases, measure, party
+
+# Low enough that random names still share a few matches.
+THRESHOLD = 0.3
+
+
+class Command(BaseCommand):
+    help = "Compare the trigram conflict index with a scan scoring every party name"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cases', type=int, default=250_000, help='Two parties per case')
+        parser.add_argument('--queries', type=int, default=20)
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            seed_cases(options['cases'], batch_size=10000, stdout=self.stdout)
+            rng = random.Random(1)
+            queries = [party(rng) for _ in range(options['queries'])]
+            index = conflicts.TrigramIndex()
+
+            def scan():
+                rows = [
+                    name
+                    for company, first, last in Customer.objects.values_list(
+                        'company_name', 'user__first_name', 'user__last_name',
+                    )
+                    for name in (company, f'{first} {last}')
+                ]
+                rows.extend(
+                    name for pair in Case.objects.values_list('opposing_party', 'opposing_lawyer') for name in pair
+                )
+                grams = [conflicts.trigrams(conflicts.normalize(name)) for name in rows]
+                results = []
+                for query in queries:
+                    wanted = conflicts.trigrams(conflicts.normalize(query))
+                    results.append(sorted(
+                        (
+                            score for score in (
+                                round(len(wanted & have) / len(wanted | have), 3) for have in grams if have
+                            ) if score >= THRESHOLD
+                        ),
+                        reverse=True,
+                    ))
+                return rows, results
+
+            def indexed():
+                return [[score for score, *_ in index.match(query, threshold=THRESHOLD, limit=10)] for query in queries]
+
+            rows, expected = scan()
+            build = measure(index.rebuild, 1)
+            for query, found, wanted in zip(queries, indexed(), expected):
+                assert found == wanted[:10], f"index and scan disagree for {query!r}"
+
+            per_query = len(queries)
+            self.stdout.write(f"{len(rows)} party names, {per_query} queries")
+            self.stdout.write(f"index build:             {build:9.1f} ms")
+            self.stdout.write(f"scan (load + score):     {measure(scan, options['repeat']) / per_query:9.1f} ms/query")
+            self.stdout.write(f"trigram index:           {measure(indexed, options['repeat']) / per_query:9.2f} ms/query")
+            transaction.set_rollback(True)
@@ -0,0 +1,60 @@
+from urllib.parse import parse_qs, urlparse
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from apps.cases.models import Case
+from apps.cases.pagination import CasePagination
+from ._synthetic import seed_cases, measure
+
+
+class Command(BaseCommand):
+    help = "Compare page 1 and page N latency of PageNumberPagination and CasePagination on synthetic cases"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page', type=int, default=5000, help="Deep page to measure")
+        parser.add_argument('--page-size', type=int, default=20)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        page, size, repeat = options['page'], options['page_size'], options['repeat']
+        factory = APIRequestFactory()
+
+        def request(**params):
+            return Request(factory.get('/api/cases/cases/', params))
+
+        with transaction.atomic():
+            seed_cases(page * size, stdout=self.stdout)
+            queryset = Case.objects.all()
+
+            def page_number(n):
+                paginator = PageNumberPagination()
+                paginator.page_size = size
+                return lambda: paginator.paginate_queryset(queryset, request(page=n))
+
+            def keyset(cursor):
+                paginator = CasePagination()
+                paginator.page_size = size
+                params = {'cursor': cursor} if cursor else {}
+                return lambda: paginator.paginate_queryset(queryset, request(**params))
+
+            # Cursor pointing at the last row of page N-1, i.e. what a client
+            # would hold after scrolling that far.
+            locator = CasePagination()
+            locator.paginate_queryset(queryset, request())
+            boundary = queryset.order_by(*locator.ordering)[(page - 1) * size - 1]
+            url = locator.encode_cursor(locator.position_of(boundary))
+            deep_cursor = parse_qs(urlparse(url).query)['cursor'][0]
+
+            rows = [
+                ('page-number', measure(page_number(1), repeat), measure(page_number(page), repeat)),
+                ('keyset', measure(keyset(None), repeat), measure(keyset(deep_cursor), repeat)),
+            ]
+            transaction.set_rollback(True)
+
+        self.stdout.write(f"{'paginator':<12} {'page 1':>12} {f'page {page}':>12}")
+        for name, first, deep in rows:
+            self.stdout.write(f"{name:<12} {first:>9.2f} ms {deep:>9.2f} ms")
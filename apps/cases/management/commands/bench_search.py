@@ -0,0 +1,55 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from apps.cases import search
+from apps.cases.models import Case
+from ._synthetic import seed_cases, measure
+
+QUERIES = ('karito', 'karito breach', 'mula', 'injunction property fraud')
+
+
+class Command(BaseCommand):
+    help = "Benchmark case search (FTS5, Python inverted index, icontains) on a synthetic corpus"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cases', type=int, default=1_000_000)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument(
+            '--no-fallback', action='store_true',
+            help="Skip the in-memory inverted index (it needs several GB for 1M cases)",
+        )
+
+    def handle(self, *args, **options):
+        repeat = options['repeat']
+        with transaction.atomic():
+            seed_cases(options['cases'], batch_size=10000, stdout=self.stdout)
+
+            backends = []
+            if search.fts5_available():
+                fts = search.FTS5Backend()
+                started = time.perf_counter()
+                fts.rebuild()
+                self.stdout.write(f"FTS5 rebuild: {time.perf_counter() - started:.1f}s")
+                backends.append(('fts5', fts))
+            if not options['no_fallback']:
+                index = search.InvertedIndex()
+                started = time.perf_counter()
+                index.rebuild()
+                self.stdout.write(f"inverted index build: {time.perf_counter() - started:.1f}s")
+                backends.append(('python', index))
+
+            def icontains(query):
+                condition = Q()
+                for term in search.tokenize(query):
+                    condition &= Q(*[Q(**{f'{f}__icontains': term}) for f in search.FIELDS], _connector=Q.OR)
+                return lambda: list(Case.objects.filter(condition).values_list('id', flat=True)[:20])
+
+            self.stdout.write(f"{'query':<28}" + ''.join(f"{name:>12}" for name, _ in backends) + f"{'icontains':>12}")
+            for query in QUERIES:
+                timings = [measure(lambda b=backend: b.search(query, limit=20), repeat) for _, backend in backends]
+                timings.append(measure(icontains(query), repeat))
+                self.stdout.write(f"{query:<28}" + ''.join(f"{t:>9.2f} ms" for t in timings))
+            transaction.set_rollback(True)
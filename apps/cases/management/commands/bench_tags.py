@@ -0,0 +1,63 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.cases.models import Case, CaseTag, CaseTagRelation
+from apps.cases.tag_index import TagIndex
+from ._synthetic import seed_cases, measure
+
+# Fraction of cases carrying each synthetic tag.
+DENSITIES = (0.5, 0.3, 0.2, 0.1, 0.05, 0.01)
+
+
+class Command(BaseCommand):
+    help = "Compare boolean tag queries on the in-memory tag bitmaps with the equivalent ORM query"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cases', type=int, default=200_000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        with transaction.atomic():
+            lookups = seed_cases(options['cases'], batch_size=10000, stdout=self.stdout)
+            prefix = lookups['prefix']
+            tags = [CaseTag.objects.create(name=f'{prefix}-t{i}') for i in range(len(DENSITIES))]
+            case_ids = list(Case.objects.filter(case_number__startswith=prefix).values_list('id', flat=True))
+            batch = []
+            for tag, density in zip(tags, DENSITIES):
+                for case_id in case_ids:
+                    if rng.random() < density:
+                        batch.append(CaseTagRelation(case_id=case_id, tag=tag))
+                    if len(batch) >= 10000:
+                        CaseTagRelation.objects.bulk_create(batch)
+                        batch = []
+            CaseTagRelation.objects.bulk_create(batch)
+
+            index = TagIndex()
+            started = time.perf_counter()
+            index.rebuild()
+            self.stdout.write(f"index rebuild: {(time.perf_counter() - started) * 1000:.0f} ms")
+
+            a, b, c = tags[0], tags[1], tags[3]
+            expression = f'{a.name} AND {b.name} AND NOT {c.name}'
+
+            def orm():
+                queryset = (
+                    Case.objects.filter(tag_relations__tag=a)
+                    .filter(tag_relations__tag=b)
+                    .exclude(tag_relations__tag=c)
+                    .order_by('-id')
+                )
+                return queryset.count(), list(queryset.values_list('id', flat=True)[:20])
+
+            def bitmaps():
+                return index.query(expression, limit=20)
+
+            assert orm() == bitmaps(), "ORM and tag index disagree"
+            self.stdout.write(f"{expression}: {bitmaps()[0]} matches")
+            self.stdout.write(f"orm (count + first page):       {measure(orm, options['repeat']):9.2f} ms")
+            self.stdout.write(f"tag bitmaps (count + first page): {measure(bitmaps, options['repeat']):7.2f} ms")
+            transaction.set_rollback(True)
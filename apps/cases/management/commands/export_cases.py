@@ -0,0 +1,58 @@
+import argparse
+
+from django.core.management.base import BaseCommand
+from django.utils.dateparse import parse_date
+
+from apps.cases import exporter
+from apps.cases.models import Case
+
+
+def date_argument(value):
+    # parse_date returns None for text that isn't a date at all, which
+    # would quietly drop the filter.
+    try:
+        parsed = parse_date(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise argparse.ArgumentTypeError(f"{value!r} is not a YYYY-MM-DD date")
+    return parsed
+
+
+class Command(BaseCommand):
+    help = "Stream cases with their category, status, priority, court, judge and customer as CSV or JSON Lines"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=sorted(exporter.FORMATS), default='csv')
+        parser.add_argument('--output', default='-', help="File to write, or - for stdout")
+        parser.add_argument('--court', help="Court name")
+        parser.add_argument('--category', help="Category name")
+        parser.add_argument('--status', help="Status name")
+        parser.add_argument('--filed-from', type=date_argument, help="YYYY-MM-DD")
+        parser.add_argument('--filed-to', type=date_argument, help="YYYY-MM-DD")
+        parser.add_argument('--include-internal', action='store_true', help="Add internal notes")
+        parser.add_argument('--chunk-size', type=int, default=exporter.CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        queryset = exporter.filter_cases(
+            Case.objects.all(),
+            court=options['court'],
+            category=options['category'],
+            status=options['status'],
+            filed_from=options['filed_from'],
+            filed_to=options['filed_to'],
+        )
+        chunks = exporter.export(
+            queryset,
+            options['format'],
+            include_internal=options['include_internal'],
+            chunk_size=options['chunk_size'],
+        )
+        if options['output'] == '-':
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
+            return
+        with open(options['output'], 'w', encoding='utf-8', newline='') as out:
+            for chunk in chunks:
+                out.write(chunk)
+        self.stderr.write(self.style.SUCCESS(f"Wrote {options['output']}"))
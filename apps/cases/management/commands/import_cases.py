@@ -0,0 +1,52 @@
+import os
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.cases.importer import CaseImporter
+from apps.users.models import User
+
+
+class Command(BaseCommand):
+    help = "Stream cases from a CSV or JSON Lines file into the database"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import, or - for stdin")
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help="Defaults to the file extension")
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--user', help="Email recorded as created_by")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or os.path.splitext(path)[1].lstrip('.').lower()
+        if fmt not in ('csv', 'jsonl'):
+            raise CommandError("Cannot infer the format; pass --format csv or --format jsonl")
+
+        created_by = None
+        if options['user']:
+            try:
+                created_by = User.objects.get(email=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"No user with email {options['user']}")
+
+        def progress(report):
+            self.stdout.write(
+                f"  {report.rows} rows, {report.created} created, {report.failed} failed "
+                f"({report.rows_per_second:.0f} rows/s)"
+            )
+
+        importer = CaseImporter(created_by=created_by, chunk_size=options['chunk_size'], progress=progress)
+        if path == '-':
+            report = importer.run(sys.stdin, fmt)
+        else:
+            with open(path, encoding='utf-8', newline='') as stream:
+                report = importer.run(stream, fmt)
+
+        for error in report.errors:
+            self.stderr.write(f"line {error['line']}: {error['errors']}")
+        if report.failed > len(report.errors):
+            self.stderr.write(f"... {report.failed - len(report.errors)} more errors not shown")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {report.created} of {report.rows} rows in {report.elapsed:.1f}s "
+            f"({report.rows_per_second:.0f} rows/s)"
+        ))
@@ -0,0 +1,18 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.cases import access
+
+
+class Command(BaseCommand):
+    help = "Rebuild the per-user case visibility table (case_access) from the access rule"
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        with transaction.atomic():
+            rows = access.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt case access with {rows} rows in {time.perf_counter() - started:.1f}s"
+        ))
@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.cases import search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the case full-text search index from the cases table"
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        with transaction.atomic():
+            search.rebuild()
+        backend = type(search.get_backend()).__name__
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt case search index ({backend}) in {time.perf_counter() - started:.1f}s"
+        ))
@@ -0,0 +1,16 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.cases import workload
+
+
+class Command(BaseCommand):
+    help = "Recompute lawyer workload counters from cases and hearings (run nightly)"
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        lawyers = workload.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt workload of {lawyers} lawyer(s) in {time.perf_counter() - started:.1f}s"
+        ))
@@ -0,0 +1,18 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.cases import hearing_dates
+
+
+class Command(BaseCommand):
+    help = "Re-derive Case.hearing_date and next_hearing_date from hearings (run nightly)"
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        with transaction.atomic():
+            fixed = hearing_dates.recompute()
+        self.stdout.write(self.style.SUCCESS(
+            f"Updated hearing dates of {fixed} case(s) in {time.perf_counter() - started:.1f}s"
+        ))
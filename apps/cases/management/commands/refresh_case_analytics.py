@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.cases import analytics
+
+
+class Command(BaseCommand):
+    help = "Recompute the unfiltered analytics snapshots and drop expired ones"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--by', choices=analytics.DIMENSIONS, action='append',
+                            help="Dimension to refresh (repeatable; default all)")
+
+    def handle(self, *args, **options):
+        for dimension in options['by'] or analytics.DIMENSIONS:
+            started = time.perf_counter()
+            data = analytics.report(dimension, refresh=True)
+            self.stdout.write(
+                f"{dimension}: {len(data['groups'])} groups in {(time.perf_counter() - started) * 1000:.0f} ms"
+            )
+        purged = analytics.purge_expired()
+        self.stdout.write(self.style.SUCCESS(f"Dropped {purged} expired snapshot(s)"))
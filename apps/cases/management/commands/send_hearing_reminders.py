@@ -0,0 +1,31 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from apps.cases import reminders
+
+
+class Command(BaseCommand):
+    help = "Send hearing reminder notifications for hearings starting within the lead time"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lead-hours', type=float, default=reminders.DEFAULT_LEAD.total_seconds() / 3600)
+        parser.add_argument('--batch-size', type=int, default=reminders.BATCH_SIZE)
+        parser.add_argument('--loop', action='store_true', help="Keep running, polling every --interval seconds")
+        parser.add_argument('--interval', type=float, default=60)
+
+    def handle(self, *args, **options):
+        lead = timedelta(hours=options['lead_hours'])
+        while True:
+            run = reminders.send_due(lead=lead, batch_size=options['batch_size'])
+            stats = run.as_dict()
+            if run.hearings or not options['loop']:
+                self.stdout.write(
+                    f"reminded {stats['hearings']} hearings ({stats['notifications']} notifications) "
+                    f"in {stats['seconds']}s, {stats['hearings_per_second']} hearings/s, "
+                    f"lag max {stats['max_lag_seconds']}s avg {stats['avg_lag_seconds']}s"
+                )
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,36 @@
+from django.db import migrations
+
+
+def create_fts_table(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('pragma compile_options')
+        if not any(row[0] == 'ENABLE_FTS5' for row in cursor.fetchall()):
+            return
+        cursor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS cases_fts USING fts5("
+            "title, description, opposing_party, opposing_lawyer, internal_notes, "
+            "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+        )
+        cursor.execute(
+            'INSERT INTO cases_fts (rowid, title, description, opposing_party, opposing_lawyer, internal_notes) '
+            'SELECT id, title, description, opposing_party, opposing_lawyer, internal_notes FROM cases'
+        )
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS cases_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cases', '0003_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
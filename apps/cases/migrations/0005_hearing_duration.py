@@ -0,0 +1,26 @@
+# Generated by Django 5.2.7 on 2026-10-18 06:04
+
+import django.core.validators
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cases', '0004_case_search_fts'),
+        ('courts', '0002_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='hearing',
+            name='duration_minutes',
+            field=models.PositiveIntegerField(default=60, help_text='Expected length, used for conflict detection', validators=[django.core.validators.MaxValueValidator(1440)]),
+        ),
+        migrations.AddIndex(
+            model_name='hearing',
+            index=models.Index(fields=['judge', 'hearing_date'], name='hearings_judge_i_9141f7_idx'),
+        ),
+    ]
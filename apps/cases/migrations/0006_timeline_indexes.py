@@ -0,0 +1,28 @@
+# Generated by Django 5.2.7 on 2026-10-18 06:10
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cases', '0005_hearing_duration'),
+        ('courts', '0002_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='casedocument',
+            index=models.Index(fields=['case', '-uploaded_at', '-id'], name='case_docume_case_id_a41c7a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='caseupdate',
+            index=models.Index(fields=['case', '-created_at', '-id'], name='case_update_case_id_3b9bdf_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='hearing',
+            index=models.Index(fields=['case', 'hearing_date', 'id'], name='hearings_case_id_2a55c6_idx'),
+        ),
+    ]
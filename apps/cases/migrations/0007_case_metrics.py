@@ -0,0 +1,21 @@
+# Generated by Django 5.2.7 on 2026-10-18 06:11
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cases', '0006_timeline_indexes'),
+        ('courts', '0002_initial'),
+        ('customers', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='case',
+            index=models.Index(condition=models.Q(('actual_closure_date__isnull', True)), fields=['expected_closure_date'], name='cases_open_expected_idx'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.7 on 2026-10-18 06:14
+
+from django.db import migrations, models
+
+
+def populate_counters(apps, schema_editor):
+    # Same numbers as apps.cases.counters.compute(), as one INSERT ... SELECT
+    # per dimension so existing tables are counted without loading rows.
+    buckets = [("'all'", '0')] + [
+        (f"'{dimension}'", f'{dimension}_id')
+        for dimension in ('status', 'priority', 'category', 'court', 'assigned_lawyer')
+    ]
+    for dimension, key in buckets:
+        group_by = f' GROUP BY {key}' if key != '0' else ''
+        schema_editor.execute(
+            'INSERT INTO case_counters (dimension, "key", case_count, open_count, fees_charged, fees_paid) '
+            f'SELECT {dimension}, {key}, COUNT(*), '
+            'SUM(CASE WHEN actual_closure_date IS NULL THEN 1 ELSE 0 END), '
+            'COALESCE(SUM(fees_charged), 0), COALESCE(SUM(fees_paid), 0) '
+            f'FROM cases{group_by} HAVING COUNT(*) > 0'
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cases', '0007_case_metrics'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CaseCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dimension', models.CharField(choices=[('all', 'All Cases'), ('status', 'Status'), ('priority', 'Priority'), ('category', 'Category'), ('court', 'Court'), ('assigned_lawyer', 'Assigned Lawyer')], max_length=20)),
+                ('key', models.BigIntegerField(help_text="Id of the status/priority/... row; 0 for 'all'")),
+                ('case_count', models.IntegerField(default=0)),
+                ('open_count', models.IntegerField(default=0)),
+                ('fees_charged', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('fees_paid', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+            ],
+            options={
+                'db_table': 'case_counters',
+                'unique_together': {('dimension', 'key')},
+            },
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.7 on 2026-10-18 06:16
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def populate_access(apps, schema_editor):
+    # The rule in apps.cases.access.grant_rule(), as one INSERT ... SELECT.
+    schema_editor.execute(
+        'INSERT INTO case_access (user_id, case_id) '
+        'SELECT assigned_lawyer_id, id FROM cases '
+        'UNION SELECT user_id, case_id FROM cases_team_members '
+        'UNION SELECT customers.user_id, cases.id FROM cases '
+        'JOIN customers ON customers.id = cases.customer_id '
+        'UNION SELECT employees.user_id, cases.id FROM cases '
+        'JOIN employees ON employees.court_id = cases.court_id AND employees.is_active'
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cases', '0008_case_counters'),
+        ('customers', '0001_initial'),
+        ('employees', '0002_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CaseAccess',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('case', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='access_entries', to='cases.case')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='case_access', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'case_access',
+                'unique_together': {('user', 'case')},
+            },
+        ),
+        migrations.RunPython(populate_access, migrations.RunPython.noop),
+    ]
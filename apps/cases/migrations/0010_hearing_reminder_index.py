@@ -0,0 +1,20 @@
+# Generated by Django 5.2.7 on 2026-10-18 06:19
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cases', '0009_case_access'),
+        ('courts', '0002_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='hearing',
+            index=models.Index(condition=models.Q(('reminder_sent', False)), fields=['hearing_date', 'id'], name='hearings_reminder_due_idx'),
+        ),
+    ]
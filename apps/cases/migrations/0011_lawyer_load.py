@@ -0,0 +1,68 @@
+# Generated by Django 5.2.7 on 2026-10-18 06:22
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def populate_loads(apps, schema_editor):
+    # Same numbers as apps.cases.workload.compute(), on the historical models.
+    Case = apps.get_model('cases', 'Case')
+    Hearing = apps.get_model('cases', 'Hearing')
+    LawyerLoad = apps.get_model('cases', 'LawyerLoad')
+    LawyerExperience = apps.get_model('cases', 'LawyerExperience')
+    loads = {}
+    open_cases = Case.objects.filter(actual_closure_date__isnull=True).order_by()
+    for row in open_cases.values('assigned_lawyer_id').annotate(n=models.Count('id'), load=models.Sum('priority__level')):
+        loads[row['assigned_lawyer_id']] = LawyerLoad(
+            lawyer_id=row['assigned_lawyer_id'], open_cases=row['n'], priority_load=row['load'],
+        )
+    today = timezone.make_aware(timezone.datetime.combine(timezone.localdate(), timezone.datetime.min.time()))
+    upcoming = Hearing.objects.filter(status__in=('scheduled', 'in_progress'), hearing_date__gte=today).order_by()
+    for row in upcoming.values('case__assigned_lawyer_id').annotate(n=models.Count('id')):
+        lawyer = row['case__assigned_lawyer_id']
+        loads.setdefault(lawyer, LawyerLoad(lawyer_id=lawyer)).upcoming_hearings = row['n']
+    LawyerLoad.objects.bulk_create(loads.values())
+    LawyerExperience.objects.bulk_create([
+        LawyerExperience(lawyer_id=row['assigned_lawyer_id'], category_id=row['category_id'], case_count=row['n'])
+        for row in Case.objects.order_by().values('assigned_lawyer_id', 'category_id').annotate(n=models.Count('id'))
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cases', '0010_hearing_reminder_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LawyerLoad',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('open_cases', models.IntegerField(default=0)),
+                ('priority_load', models.IntegerField(default=0, help_text='Sum of CasePriority.level over open cases')),
+                ('upcoming_hearings', models.IntegerField(default=0)),
+                ('lawyer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='case_load', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'lawyer_loads',
+            },
+        ),
+        migrations.CreateModel(
+            name='LawyerExperience',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('case_count', models.IntegerField(default=0)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lawyer_experience', to='cases.casecategory')),
+                ('lawyer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='case_experience', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'lawyer_experience',
+                'unique_together': {('category', 'lawyer')},
+            },
+        ),
+        migrations.RunPython(populate_loads, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.7 on 2026-10-18 06:30
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cases', '0012_analytics_snapshots'),
+        ('courts', '0002_initial'),
+        ('customers', '0002_customer_updated_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='case',
+            index=models.Index(fields=['updated_at'], name='cases_updated_395104_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-18 06:39
+
+import apps.documents.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cases', '0013_case_updated_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='casedocument',
+            name='file',
+            field=models.FileField(storage=apps.documents.storage.document_storage, upload_to='case_documents/%Y/%m/'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.7 on 2026-10-18 07:28
+
+import django.db.models.expressions
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cases', '0015_cache_table'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lawyerload',
+            name='weighted_load',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.expressions.CombinedExpression(models.F('priority_load'), '+', django.db.models.expressions.CombinedExpression(models.Value(2), '*', models.F('upcoming_hearings'))), output_field=models.IntegerField()),
+        ),
+        migrations.AddIndex(
+            model_name='lawyerload',
+            index=models.Index(fields=['weighted_load', 'lawyer'], name='lawyer_loads_weighted_idx'),
+        ),
+    ]
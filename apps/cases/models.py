@@ -1,8 +1,11 @@
-from django.db import models
+from django.core.validators import MaxValueValidator
+from django.db import models, transaction
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 from apps.users.models import User
 from apps.courts.models import Court, Judge
 from apps.customers.models import Customer
+from apps.documents.storage import document_storage
 
 
 class CaseCategory(models.Model):
@@ -54,6 +57,44 @@ class CasePriority(models.Model):
         return f"{self.name} (Level {self.level})"
 
 
+class CaseQuerySet(models.QuerySet):
+    """SQL versions of Case.is_overdue, days_pending and outstanding_fees."""
+
+    def open(self):
+        return self.filter(actual_closure_date__isnull=True)
+
+    def overdue(self, today=None):
+        today = today or timezone.now().date()
+        return self.filter(actual_closure_date__isnull=True, expected_closure_date__lt=today)
+
+    def with_metrics(self, today=None):
+        """
+        Annotate `overdue` (bool), `pending_for` (timedelta since filing,
+        up to closure) and `fees_outstanding` so they can be filtered and
+        ordered on in the database.
+        """
+        today = today or timezone.now().date()
+        return self.annotate(
+            overdue=models.Case(
+                models.When(
+                    models.Q(actual_closure_date__isnull=True, expected_closure_date__lt=today),
+                    then=models.Value(True),
+                ),
+                default=models.Value(False),
+                output_field=models.BooleanField(),
+            ),
+            pending_for=models.ExpressionWrapper(
+                Coalesce('actual_closure_date', models.Value(today, output_field=models.DateField()))
+                - models.F('filing_date'),
+                output_field=models.DurationField(),
+            ),
+            fees_outstanding=models.ExpressionWrapper(
+                models.F('fees_charged') - models.F('fees_paid'),
+                output_field=models.DecimalField(max_digits=13, decimal_places=2),
+            ),
+        )
+
+
 class Case(models.Model):
     """Main Case model - represents a legal case"""
     # Basic Information
@@ -110,6 +151,8 @@ class Case(models.Model):
     
     # Notes
     internal_notes = models.TextField(blank=True, help_text="Internal notes - not visible to customer")
+
+    objects = CaseQuerySet.as_manager()
     
     class Meta:
         db_table = 'cases'
@@ -119,10 +162,44 @@ class Case(models.Model):
             models.Index(fields=['status', 'priority']),
             models.Index(fields=['next_hearing_date']),
             models.Index(fields=['customer', 'is_active']),
+            models.Index(fields=['-created_at', '-id']),
+            # Open cases by expected closure: the overdue list is a range
+            # scan of this partial index instead of a table scan.
+            models.Index(
+                fields=['expected_closure_date'],
+                condition=models.Q(actual_closure_date__isnull=True),
+                name='cases_open_expected_idx',
+            ),
+            # Recently saved cases, for the conflict index to catch up on.
+            models.Index(fields=['updated_at']),
         ]
     
     def __str__(self):
         return f"{self.case_number} - {self.title}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Column values as loaded, so save() handlers can diff old vs new
+        # without re-reading the row.
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def save(self, *args, **kwargs):
+        # One transaction from pre_save to post_save, so the counters can
+        # lock the row before the write and diff against what was stored.
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+        # post_save handlers have seen the old values; the saved ones are
+        # what the next save() must be compared against.
+        self._loaded_values = {field.attname: getattr(self, field.attname) for field in self._meta.concrete_fields}
+
+    def changed_fields(self, *attnames):
+        """Which of `attnames` differ from the loaded row (all of them if unknown)."""
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None:
+            return set(attnames)
+        return {name for name in attnames if name not in loaded or loaded[name] != getattr(self, name)}
     
     @property
     def is_overdue(self):
@@ -170,6 +247,9 @@ class CaseUpdate(models.Model):
     class Meta:
         db_table = 'case_updates'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['case', '-created_at', '-id']),
+        ]
     
     def __str__(self):
         return f"{self.case.case_number} - {self.title}"
@@ -177,8 +257,15 @@ class CaseUpdate(models.Model):
 
 class Hearing(models.Model):
     """Scheduled hearings for cases"""
+    MAX_DURATION_MINUTES = 24 * 60
+
     case = models.ForeignKey(Case, on_delete=models.CASCADE, related_name='hearings')
     hearing_date = models.DateTimeField()
+    duration_minutes = models.PositiveIntegerField(
+        default=60,
+        validators=[MaxValueValidator(MAX_DURATION_MINUTES)],
+        help_text="Expected length, used for conflict detection"
+    )
     hearing_type = models.CharField(
         max_length=100,
         choices=[
@@ -226,11 +313,35 @@ class Hearing(models.Model):
         ordering = ['hearing_date']
         indexes = [
             models.Index(fields=['hearing_date', 'status']),
+            models.Index(fields=['judge', 'hearing_date']),
+            models.Index(fields=['case', 'hearing_date', 'id']),
+            # Only unsent reminders; matches reminders.due() exactly.
+            models.Index(
+                fields=['hearing_date', 'id'],
+                condition=models.Q(reminder_sent=False),
+                name='hearings_reminder_due_idx',
+            ),
         ]
     
     def __str__(self):
         return f"{self.case.case_number} - {self.hearing_date.strftime('%Y-%m-%d %H:%M')}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # As on Case: the loaded row, e.g. so moving a hearing to another
+        # case can refresh both.
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._loaded_values = {field.attname: getattr(self, field.attname) for field in self._meta.concrete_fields}
+
+    @property
+    def ends_at(self):
+        return self.hearing_date + timezone.timedelta(minutes=self.duration_minutes)
+
 
 class CaseDocument(models.Model):
     """Documents related to cases"""
@@ -251,7 +362,7 @@ class CaseDocument(models.Model):
         default='misc'
     )
     
-    file = models.FileField(upload_to='case_documents/%Y/%m/')
+    file = models.FileField(upload_to='case_documents/%Y/%m/', storage=document_storage)
     file_size = models.BigIntegerField(default=0)
     file_type = models.CharField(max_length=50, blank=True)
     
@@ -269,6 +380,9 @@ class CaseDocument(models.Model):
     class Meta:
         db_table = 'case_documents'
         ordering = ['-uploaded_at']
+        indexes = [
+            models.Index(fields=['case', '-uploaded_at', '-id']),
+        ]
     
     def __str__(self):
         return f"{self.case.case_number} - {self.title}"
@@ -296,4 +410,98 @@ class CaseTagRelation(models.Model):
     
     class Meta:
         db_table = 'case_tag_relations'
-        unique_together = ['case', 'tag']
\ No newline at end of file
+        unique_together = ['case', 'tag']
+
+
+class CaseCounter(models.Model):
+    """Running case counts and fee totals per dashboard bucket (see apps.cases.counters)"""
+    DIMENSIONS = [
+        ('all', 'All Cases'),
+        ('status', 'Status'),
+        ('priority', 'Priority'),
+        ('category', 'Category'),
+        ('court', 'Court'),
+        ('assigned_lawyer', 'Assigned Lawyer'),
+    ]
+
+    dimension = models.CharField(max_length=20, choices=DIMENSIONS)
+    key = models.BigIntegerField(help_text="Id of the status/priority/... row; 0 for 'all'")
+    case_count = models.IntegerField(default=0)
+    open_count = models.IntegerField(default=0)
+    fees_charged = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    fees_paid = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+
+    class Meta:
+        db_table = 'case_counters'
+        unique_together = ['dimension', 'key']
+
+    def __str__(self):
+        return f"{self.dimension}:{self.key} = {self.case_count}"
+
+
+class CaseAccess(models.Model):
+    """One row per (non-staff user, case they may see), maintained by apps.cases.access"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='case_access')
+    case = models.ForeignKey(Case, on_delete=models.CASCADE, related_name='access_entries')
+
+    class Meta:
+        db_table = 'case_access'
+        unique_together = ['user', 'case']
+
+    def __str__(self):
+        return f"{self.user_id} -> {self.case_id}"
+
+
+# One upcoming hearing weighs as much as an open case of this level.
+HEARING_WEIGHT = 2
+
+
+class LawyerLoad(models.Model):
+    """Running workload of one lawyer (see apps.cases.workload)"""
+    lawyer = models.OneToOneField(User, on_delete=models.CASCADE, related_name='case_load')
+    open_cases = models.IntegerField(default=0)
+    priority_load = models.IntegerField(default=0, help_text="Sum of CasePriority.level over open cases")
+    upcoming_hearings = models.IntegerField(default=0)
+    weighted_load = models.GeneratedField(
+        expression=models.F('priority_load') + HEARING_WEIGHT * models.F('upcoming_hearings'),
+        output_field=models.IntegerField(),
+        db_persist=True,
+    )
+
+    class Meta:
+        db_table = 'lawyer_loads'
+        indexes = [
+            # Least loaded lawyers first, for the assignment recommender.
+            models.Index(fields=['weighted_load', 'lawyer'], name='lawyer_loads_weighted_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.lawyer_id}: {self.open_cases} open, load {self.priority_load}"
+
+
+class LawyerExperience(models.Model):
+    """How many cases of a category a lawyer has been assigned, open or closed"""
+    lawyer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='case_experience')
+    category = models.ForeignKey(CaseCategory, on_delete=models.CASCADE, related_name='lawyer_experience')
+    case_count = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'lawyer_experience'
+        unique_together = ['category', 'lawyer']
+
+    def __str__(self):
+        return f"{self.lawyer_id} / {self.category_id}: {self.case_count}"
+
+
+class AnalyticsSnapshot(models.Model):
+    """A computed analytics report, reused until it expires (see apps.cases.analytics)"""
+    key = models.CharField(max_length=200, unique=True, help_text="Report dimension and filters")
+    data = models.JSONField()
+    computed_at = models.DateTimeField()
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        db_table = 'analytics_snapshots'
+
+    def __str__(self):
+        return f"{self.key} @ {self.computed_at:%Y-%m-%d %H:%M}"
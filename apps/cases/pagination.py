@@ -0,0 +1,9 @@
+from apps.core.pagination import KeysetPagination
+
+
+class CasePagination(KeysetPagination):
+    ordering = ('-created_at', '-id')
+
+
+class HearingPagination(KeysetPagination):
+    ordering = ('hearing_date', 'id')
@@ -0,0 +1,19 @@
+from rest_framework import permissions
+
+from .access import is_employee
+
+
+class IsEmployee(permissions.BasePermission):
+    """Staff and active employees; customers and self-registered users are refused."""
+
+    def has_permission(self, request, view):
+        return bool(request.user and request.user.is_authenticated and is_employee(request.user))
+
+
+class IsEmployeeOrReadOnly(IsEmployee):
+    """Anyone signed in may read (within get_queryset); only employees may write."""
+
+    def has_permission(self, request, view):
+        if request.method in permissions.SAFE_METHODS:
+            return bool(request.user and request.user.is_authenticated)
+        return super().has_permission(request, view)
@@ -0,0 +1,156 @@
+"""
+Hearing reminders, sent in batches.
+
+A hearing is due for a reminder once it is less than `lead` away and still
+active. Workers repeatedly claim a batch of due hearings through the
+hearing_date index over unsent reminders, write one Notification per recipient
+(assigned lawyer, team members, customer) with bulk_create, and flip
+reminder_sent for the whole batch with one UPDATE, all in one
+transaction. The claim uses SELECT ... FOR UPDATE SKIP LOCKED where the
+database has it, so concurrent workers take disjoint batches; SQLite
+serializes writers instead. Either way a hearing is reminded once.
+
+Each run's numbers (throughput, how late reminders went out) are kept in
+the cache for `metrics()`, next to the live backlog.
+"""
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from apps.notifications.models import Notification
+from .hearing_calendar import ACTIVE_STATUSES
+from .models import Case, Hearing
+
+DEFAULT_LEAD = timedelta(hours=24)
+BATCH_SIZE = 500
+METRICS_KEY = 'hearing-reminders:last-run'
+
+
+class ReminderRun:
+    def __init__(self):
+        self.batches = 0
+        self.hearings = 0
+        self.notifications = 0
+        self.max_lag = timedelta(0)
+        self.total_lag = timedelta(0)
+        self.started = time.perf_counter()
+        self.finished_at = None
+
+    def record(self, due_times, notifications, now):
+        self.batches += 1
+        self.hearings += len(due_times)
+        self.notifications += notifications
+        for due in due_times:
+            lag = max(now - due, timedelta(0))
+            self.total_lag += lag
+            self.max_lag = max(self.max_lag, lag)
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def as_dict(self):
+        elapsed = self.elapsed
+        return {
+            'batches': self.batches,
+            'hearings': self.hearings,
+            'notifications': self.notifications,
+            'seconds': round(elapsed, 3),
+            'hearings_per_second': round(self.hearings / elapsed, 1) if elapsed else 0.0,
+            'notifications_per_second': round(self.notifications / elapsed, 1) if elapsed else 0.0,
+            'max_lag_seconds': round(self.max_lag.total_seconds(), 1),
+            'avg_lag_seconds': round(self.total_lag.total_seconds() / self.hearings, 1) if self.hearings else 0.0,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+
+def due(now=None, lead=DEFAULT_LEAD):
+    """Active, upcoming hearings that still need a reminder, soonest first."""
+    now = now or timezone.now()
+    return Hearing.objects.filter(
+        reminder_sent=False,
+        hearing_date__gte=now,
+        hearing_date__lte=now + lead,
+        status__in=ACTIVE_STATUSES,
+    ).order_by('hearing_date', 'id')
+
+
+def _notifications(hearings):
+    case_ids = {hearing['case_id'] for hearing in hearings}
+    team = defaultdict(set)
+    through = Case.team_members.through.objects.filter(case_id__in=case_ids)
+    for case_id, user_id in through.values_list('case_id', 'user_id'):
+        team[case_id].add(user_id)
+
+    notifications = []
+    for hearing in hearings:
+        recipients = {hearing['case__assigned_lawyer_id'], hearing['case__customer__user_id']}
+        recipients |= team[hearing['case_id']]
+        when = timezone.localtime(hearing['hearing_date']).strftime('%d %b %Y, %H:%M')
+        where = f" at {hearing['location']}" if hearing['location'] else ''
+        for user_id in recipients:
+            notifications.append(Notification(
+                user_id=user_id,
+                notification_type='hearing_reminder',
+                title=f"Hearing reminder: {hearing['case__case_number']}",
+                message=f"{hearing['case__title']} is listed for hearing on {when}{where}.",
+                related_object_type='hearing',
+                related_object_id=hearing['id'],
+            ))
+    return notifications
+
+
+def send_batch(run, now=None, lead=DEFAULT_LEAD, batch_size=BATCH_SIZE):
+    """Claim and remind one batch; returns the number of hearings reminded."""
+    now = now or timezone.now()
+    with transaction.atomic():
+        hearings = list(
+            due(now, lead).select_for_update(skip_locked=True, of=('self',))
+            .values(
+                'id', 'case_id', 'hearing_date', 'created_at', 'location', 'case__case_number', 'case__title',
+                'case__assigned_lawyer_id', 'case__customer__user_id',
+            )[:batch_size]
+        )
+        if not hearings:
+            return 0
+        ids = [hearing['id'] for hearing in hearings]
+        # reminder_sent=False again so a worker without row locks that lost
+        # a race notices; it backs off and leaves the batch to the winner.
+        claimed = Hearing.objects.filter(pk__in=ids, reminder_sent=False).update(reminder_sent=True)
+        if claimed != len(ids):
+            transaction.set_rollback(True)
+            return 0
+        notifications = _notifications(hearings)
+        Notification.objects.bulk_create(notifications, batch_size=1000)
+    # A reminder is due `lead` before the hearing, or on creation if later.
+    due_times = [max(hearing['hearing_date'] - lead, hearing['created_at']) for hearing in hearings]
+    run.record(due_times, len(notifications), now)
+    return len(hearings)
+
+
+def send_due(lead=DEFAULT_LEAD, batch_size=BATCH_SIZE, max_batches=None):
+    """Send every due reminder, batch by batch; returns the run's ReminderRun."""
+    run = ReminderRun()
+    while max_batches is None or run.batches < max_batches:
+        if not send_batch(run, lead=lead, batch_size=batch_size):
+            break
+    run.finished_at = timezone.now()
+    if run.hearings:
+        cache.set(METRICS_KEY, run.as_dict(), timeout=None)
+    return run
+
+
+def metrics(lead=DEFAULT_LEAD):
+    """The current backlog plus the numbers of the last run that sent anything."""
+    now = timezone.now()
+    backlog = due(now, lead)
+    oldest = backlog.values_list('hearing_date', flat=True).first()
+    return {
+        'backlog': backlog.count(),
+        'oldest_due_seconds': round(max((now - (oldest - lead)).total_seconds(), 0), 1) if oldest else 0.0,
+        'last_run': cache.get(METRICS_KEY),
+    }
@@ -0,0 +1,262 @@
+"""
+Ranked full-text search over cases.
+
+On SQLite builds with FTS5 the text lives in the `cases_fts` virtual table
+(rowid = case id) created by migration 0004. Anywhere else a process-local
+inverted index is built on the first search. Both are kept current from the
+Case post_save / post_delete signals; rows written with bulk_create or
+queryset.update() must be passed to `index_cases()` or picked up by the
+`rebuild_case_search` command.
+
+The inverted index applies changes in the writing process once they commit
+and bumps the shared "case-search" version; other processes see the new
+version on their next search and rebuild.
+"""
+import bisect
+import heapq
+import math
+import re
+import threading
+
+from django.db import connection, transaction
+
+from apps.core.cache import get_version, bump_version
+from .models import Case
+
+FTS_TABLE = 'cases_fts'
+VERSION_KEY = 'case-search'
+
+# Column order of the FTS table; weights feed bm25() and the fallback scorer.
+FIELDS = ('title', 'description', 'opposing_party', 'opposing_lawyer', 'internal_notes')
+WEIGHTS = (3.0, 1.0, 2.0, 2.0, 1.0)
+INTERNAL_FIELDS = ('internal_notes',)
+PUBLIC_FIELDS = tuple(f for f in FIELDS if f not in INTERNAL_FIELDS)
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower())
+
+
+def fts5_available():
+    """True when the default database is SQLite compiled with FTS5."""
+    if connection.vendor != 'sqlite':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute('pragma compile_options')
+        return any(row[0] == 'ENABLE_FTS5' for row in cursor.fetchall())
+
+
+class FTS5Backend:
+    def index(self, rows):
+        rows = list(rows)
+        if not rows:
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [(row[0],) for row in rows])
+            cursor.executemany(
+                f'INSERT INTO {FTS_TABLE} (rowid, {", ".join(FIELDS)}) VALUES (%s, %s, %s, %s, %s, %s)',
+                rows,
+            )
+
+    def remove(self, case_ids):
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [(pk,) for pk in case_ids])
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, {", ".join(FIELDS)}) '
+                f'SELECT id, {", ".join(FIELDS)} FROM {Case._meta.db_table}'
+            )
+            cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+
+    def search(self, query, include_internal=True, within=None, limit=20):
+        terms = tokenize(query)
+        if not terms:
+            return []
+        match = ' '.join(f'"{term}"*' for term in terms)
+        if not include_internal:
+            match = '{%s}: (%s)' % (' '.join(PUBLIC_FIELDS), match)
+        weights = ', '.join(str(w) for w in WEIGHTS)
+        sql = f'SELECT rowid, bm25({FTS_TABLE}, {weights}) AS score FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s'
+        params = [match]
+        if within is not None:
+            subquery, sub_params = within.order_by().values('id').query.sql_with_params()
+            sql += f' AND rowid IN ({subquery})'
+            params.extend(sub_params)
+        sql += ' ORDER BY score LIMIT %s'
+        params.append(limit)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            # bm25() is "lower is better"; flip it so callers always sort desc.
+            return [(pk, -score) for pk, score in cursor.fetchall()]
+
+
+class InvertedIndex:
+    """
+    Pure-Python fallback: token -> {case_id: weighted term frequency}.
+
+    Public and internal fields are posted separately so customer searches
+    never see matches that only occur in internal notes. Prefix matching
+    walks a sorted vocabulary with bisect.
+    """
+
+    def __init__(self):
+        self.version = None
+        self._reset()
+        self.lock = threading.RLock()
+
+    def _reset(self):
+        self.public = {}
+        self.internal = {}
+        self.doc_tokens = {}
+        self._vocab = []
+        self._vocab_dirty = False
+
+    def _ensure(self):
+        version = get_version(VERSION_KEY)
+        if version != self.version:
+            self.rebuild(version)
+
+    # -- incremental maintenance (applied after commit) -------------------
+
+    def index(self, rows):
+        transaction.on_commit(lambda: self._apply(self._index, list(rows)))
+
+    def remove(self, case_ids):
+        transaction.on_commit(lambda: self._apply(self._remove_all, list(case_ids)))
+
+    def _apply(self, change, values):
+        with self.lock:
+            # Not built yet: the first search reads the committed rows.
+            if self.version is not None:
+                change(values)
+            new_version = bump_version(VERSION_KEY)
+            # Only adopt the new version if nobody else bumped in between;
+            # otherwise their change is missing here and we must rebuild.
+            self.version = new_version if self.version == new_version - 1 else None
+
+    def _index(self, rows):
+        with self.lock:
+            for row in rows:
+                pk, values = row[0], row[1:]
+                self._remove(pk)
+                posted = set()
+                for field, weight, value in zip(FIELDS, WEIGHTS, values):
+                    internal = field in INTERNAL_FIELDS
+                    target = self.internal if internal else self.public
+                    for token in tokenize(value or ''):
+                        docs = target.setdefault(token, {})
+                        docs[pk] = docs.get(pk, 0.0) + weight
+                        posted.add((internal, token))
+                self.doc_tokens[pk] = posted
+                self._vocab_dirty = True
+
+    def _remove_all(self, case_ids):
+        with self.lock:
+            for pk in case_ids:
+                self._remove(pk)
+
+    def _remove(self, pk):
+        for internal, token in self.doc_tokens.pop(pk, ()):
+            target = self.internal if internal else self.public
+            docs = target.get(token)
+            if docs is not None:
+                docs.pop(pk, None)
+                if not docs:
+                    del target[token]
+                    self._vocab_dirty = True
+
+    def rebuild(self, version=None):
+        version = version if version is not None else get_version(VERSION_KEY)
+        with self.lock:
+            self._reset()
+            self._index(Case.objects.values_list('id', *FIELDS).iterator(chunk_size=5000))
+            self.version = version
+
+    def _expand(self, prefix):
+        if self._vocab_dirty:
+            self._vocab = sorted(set(self.public) | set(self.internal))
+            self._vocab_dirty = False
+        start = bisect.bisect_left(self._vocab, prefix)
+        end = bisect.bisect_left(self._vocab, prefix + '\uffff')
+        return self._vocab[start:end]
+
+    def search(self, query, include_internal=True, within=None, limit=20):
+        terms = tokenize(query)
+        if not terms:
+            return []
+        self._ensure()
+        allowed = set(within.order_by().values_list('id', flat=True)) if within is not None else None
+        sources = (self.public, self.internal) if include_internal else (self.public,)
+        total = max(len(self.doc_tokens), 1)
+        with self.lock:
+            scores = None
+            for term in terms:
+                term_scores = {}
+                for token in self._expand(term):
+                    for source in sources:
+                        docs = source.get(token)
+                        if not docs:
+                            continue
+                        idf = math.log(1 + total / len(docs))
+                        for pk, tf in docs.items():
+                            term_scores[pk] = term_scores.get(pk, 0.0) + tf * idf
+                if scores is None:
+                    scores = term_scores
+                else:
+                    scores = {pk: s + term_scores[pk] for pk, s in scores.items() if pk in term_scores}
+                if not scores:
+                    return []
+        if allowed is not None:
+            scores = {pk: s for pk, s in scores.items() if pk in allowed}
+        return heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = FTS5Backend() if fts5_available() else InvertedIndex()
+    return _backend
+
+
+def index_cases(case_ids):
+    """(Re)index the given cases, e.g. after bulk_create or update()."""
+    rows = Case.objects.filter(id__in=list(case_ids)).values_list('id', *FIELDS)
+    get_backend().index(rows)
+
+
+def index_case(case):
+    get_backend().index([(case.pk, *(getattr(case, field) for field in FIELDS))])
+
+
+def remove_cases(case_ids):
+    get_backend().remove(list(case_ids))
+
+
+def rebuild():
+    backend = get_backend()
+    backend.rebuild()
+    if isinstance(backend, InvertedIndex):
+        # Other processes' copies rebuild on their next search.
+        transaction.on_commit(lambda: bump_version(VERSION_KEY))
+
+
+def search(query, include_internal=True, within=None, limit=20):
+    """
+    Return up to `limit` (case_id, score) pairs, best first.
+
+    `within` is an optional Case queryset restricting the candidates (e.g.
+    the caller's visible cases); `include_internal=False` ignores matches
+    in internal notes.
+    """
+    return get_backend().search(query, include_internal=include_internal, within=within, limit=limit)
@@ -0,0 +1,81 @@
+from rest_framework import serializers
+from . import lookups
+from .access import is_customer
+from .models import Case, Hearing
+
+
+class LookupField(serializers.PrimaryKeyRelatedField):
+    """Related field validated against a cached lookup table, by id or name."""
+
+    def __init__(self, table, **kwargs):
+        self.table = table
+        kwargs.setdefault('queryset', table.model._default_manager.all())
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        row = self.table.resolve(data)
+        if row is None:
+            self.fail('does_not_exist', pk_value=data)
+        return row
+
+
+class LookupNameField(serializers.Field):
+    """Read-only name of a lookup row, rendered from its id without a join."""
+
+    def __init__(self, table, **kwargs):
+        self.table = table
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        return self.table.name_of(value)
+
+
+class CaseSerializer(serializers.ModelSerializer):
+    category = LookupField(lookups.categories)
+    status = LookupField(lookups.statuses)
+    priority = LookupField(lookups.priorities)
+    category_name = LookupNameField(lookups.categories, source='category_id')
+    status_name = LookupNameField(lookups.statuses, source='status_id')
+    priority_name = LookupNameField(lookups.priorities, source='priority_id')
+    is_overdue = serializers.BooleanField(read_only=True)
+    days_pending = serializers.IntegerField(read_only=True)
+    outstanding_fees = serializers.DecimalField(max_digits=13, decimal_places=2, read_only=True)
+
+    class Meta:
+        model = Case
+        fields = [
+            'id', 'case_number', 'title', 'description',
+            'category', 'category_name', 'status', 'status_name', 'priority', 'priority_name',
+            'customer', 'opposing_party', 'opposing_lawyer',
+            'court', 'judge', 'assigned_lawyer', 'team_members',
+            'filing_date', 'hearing_date', 'next_hearing_date',
+            'expected_closure_date', 'actual_closure_date',
+            'estimated_value', 'fees_charged', 'fees_paid',
+            'is_overdue', 'days_pending', 'outstanding_fees',
+            'is_active', 'is_archived', 'created_by', 'created_at', 'updated_at',
+            'internal_notes',
+        ]
+        # The hearing dates are derived from the case's hearings.
+        read_only_fields = ['id', 'hearing_date', 'next_hearing_date', 'created_by', 'created_at', 'updated_at']
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        if request is not None and is_customer(request.user):
+            # Neither shown to customers nor writable by them.
+            fields.pop('internal_notes', None)
+        return fields
+
+
+class HearingSerializer(serializers.ModelSerializer):
+    ends_at = serializers.DateTimeField(read_only=True)
+
+    class Meta:
+        model = Hearing
+        fields = [
+            'id', 'case', 'hearing_date', 'duration_minutes', 'ends_at', 'hearing_type', 'location', 'judge',
+            'agenda', 'notes', 'outcome', 'next_hearing_date', 'status',
+            'reminder_sent', 'created_by', 'created_at', 'updated_at',
+        ]
+        read_only_fields = ['id', 'reminder_sent', 'created_by', 'created_at', 'updated_at']
@@ -0,0 +1,219 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_delete, pre_save, m2m_changed
+from django.dispatch import receiver, Signal
+from django.utils import timezone
+
+from apps.core.cache import bump_version_on_commit
+from apps.customers.models import Customer
+from apps.employees.models import Employee
+from apps.users.models import User
+from . import access, counters, hearing_dates, search, hearing_calendar, lookups, workload
+from .models import Case, Hearing, CaseCategory, CaseStatus, CasePriority, CaseTag, CaseTagRelation
+from .tag_index import index as tag_index
+
+# Sent with `case_ids` after cases are written in bulk (bulk_create skips
+# post_save), so derived stores can catch up in one pass.
+cases_created = Signal()
+
+
+@receiver(post_save, sender=Case)
+def index_case_text(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index_case(instance)
+
+
+@receiver(cases_created, sender=Case)
+def index_created_cases(sender, case_ids, **kwargs):
+    search.index_cases(case_ids)
+
+
+@receiver(post_delete, sender=Case)
+def unindex_case_text(sender, instance, **kwargs):
+    search.remove_cases([instance.pk])
+
+
+@receiver(post_save, sender=Hearing)
+@receiver(post_delete, sender=Hearing)
+@receiver(post_save, sender=Case)
+@receiver(post_delete, sender=Case)
+def invalidate_calendar(sender, **kwargs):
+    bump_version_on_commit(hearing_calendar.VERSION_KEY)
+
+
+@receiver(post_save, sender=CaseCategory)
+@receiver(post_save, sender=CaseStatus)
+@receiver(post_save, sender=CasePriority)
+@receiver(post_save, sender=CaseTag)
+@receiver(post_delete, sender=CaseCategory)
+@receiver(post_delete, sender=CaseStatus)
+@receiver(post_delete, sender=CasePriority)
+@receiver(post_delete, sender=CaseTag)
+def invalidate_lookup_table(sender, **kwargs):
+    lookups.TABLES[sender].invalidate()
+
+
+@receiver(post_save, sender=CaseTagRelation)
+def index_tag_relation(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        transaction.on_commit(lambda: tag_index.tag_added(instance.tag_id, instance.case_id))
+    else:
+        transaction.on_commit(tag_index.invalidate)
+
+
+@receiver(post_delete, sender=CaseTagRelation)
+def unindex_tag_relation(sender, instance, **kwargs):
+    transaction.on_commit(lambda: tag_index.tag_removed(instance.tag_id, instance.case_id))
+
+
+@receiver(post_save, sender=Case)
+def add_case_to_tag_index(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        transaction.on_commit(lambda: tag_index.cases_added([instance.pk]))
+
+
+@receiver(cases_created, sender=Case)
+def add_created_cases_to_tag_index(sender, case_ids, **kwargs):
+    transaction.on_commit(lambda: tag_index.cases_added(case_ids))
+
+
+@receiver(post_delete, sender=Case)
+def remove_case_from_tag_index(sender, instance, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: tag_index.case_removed(pk))
+
+
+@receiver(pre_save, sender=Case)
+@receiver(pre_delete, sender=Case)
+def lock_counted_case(sender, instance, raw=False, **kwargs):
+    if not raw:
+        counters.lock_case(instance)
+
+
+@receiver(post_save, sender=Case)
+def count_saved_case(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        counters.case_saved(instance, created)
+
+
+@receiver(cases_created, sender=Case)
+def count_created_cases(sender, case_ids, **kwargs):
+    counters.cases_created(case_ids)
+
+
+@receiver(post_delete, sender=Case)
+def uncount_case(sender, instance, **kwargs):
+    counters.case_deleted(instance)
+
+
+@receiver(post_save, sender=Case)
+def grant_case_access(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    # Diffed against the row as stored just before the save: a stale
+    # instance writing an old lawyer, customer or court back must re-sync.
+    stored = counters.stored_values(instance)
+    if created or stored is None or any(stored[column] != getattr(instance, column) for column in access.GRANT_COLUMNS):
+        access.sync_cases([instance.pk])
+
+
+@receiver(cases_created, sender=Case)
+def grant_created_case_access(sender, case_ids, **kwargs):
+    access.sync_cases(case_ids)
+
+
+@receiver(m2m_changed, sender=Case.team_members.through)
+def grant_team_access(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        access.sync_cases([instance.pk])
+    elif action == 'post_clear':
+        access.sync_user(instance.pk)
+    else:
+        access.sync_cases(pk_set)
+
+
+@receiver(pre_delete, sender=Case)
+def revoke_case_access(sender, instance, **kwargs):
+    access.case_deleted(instance.pk)
+
+
+@receiver(post_save, sender=Customer)
+def grant_customer_access(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        access.sync_cases(Case.objects.filter(customer=instance).values_list('id', flat=True))
+
+
+@receiver(post_save, sender=Employee)
+def grant_court_access(sender, instance, raw=False, **kwargs):
+    if not raw:
+        access.sync_user(instance.user_id)
+
+
+@receiver(post_delete, sender=Employee)
+def revoke_court_access(sender, instance, **kwargs):
+    # Losing an employment only takes grants away, and inserting would
+    # resurrect rows when the user itself is being deleted.
+    access.sync_user(instance.user_id, revoke_only=True)
+
+
+@receiver(post_save, sender=Hearing)
+def refresh_case_hearing_dates(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_loaded_values', {}).get('case_id')
+    hearing_dates.refresh({instance.case_id, previous} - {None})
+
+
+@receiver(post_delete, sender=Hearing)
+def refresh_case_hearing_dates_on_delete(sender, instance, **kwargs):
+    hearing_dates.refresh([instance.case_id])
+
+
+@receiver(post_save, sender=Case)
+def update_lawyer_load(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        workload.case_saved(instance, created)
+
+
+@receiver(cases_created, sender=Case)
+def add_created_cases_to_lawyer_load(sender, case_ids, **kwargs):
+    workload.cases_created(case_ids)
+
+
+@receiver(post_delete, sender=Case)
+def remove_case_from_lawyer_load(sender, instance, **kwargs):
+    workload.case_deleted(instance)
+
+
+@receiver(post_save, sender=Hearing)
+def update_lawyer_hearings(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    loaded = getattr(instance, '_loaded_values', None)
+    if not created and loaded is None:
+        return  # not loaded from the database: nothing to diff, the nightly rebuild catches up
+    old = None if created else workload.hearing_values(
+        instance, {column: loaded.get(column) for column in workload.HEARING_COLUMNS},
+    )
+    workload.hearing_changed(old, workload.hearing_values(instance))
+
+
+@receiver(post_delete, sender=Hearing)
+def remove_lawyer_hearing(sender, instance, **kwargs):
+    workload.hearing_changed(workload.hearing_values(instance), None)
+
+
+USER_NAME_FIELDS = {'first_name', 'last_name'}
+
+
+@receiver(post_save, sender=User)
+def touch_customer_on_rename(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    # The conflict index reads customers' names through their user and
+    # catches up on customers by updated_at. Saves of other fields alone,
+    # such as last_login on every sign-in, leave the customer be.
+    if created or raw or (update_fields is not None and not USER_NAME_FIELDS & set(update_fields)):
+        return
+    Customer.objects.filter(user=instance).update(updated_at=timezone.now())
@@ -0,0 +1,216 @@
+"""
+In-memory tag bitmaps for boolean tag queries over cases.
+
+Each tag is a Python int whose bit n is set when case n carries the tag,
+plus one `universe` bitmap of all case ids. AND/OR/NOT and counting run in
+C over machine words, so "urgent AND (appeal OR writ) AND NOT closed" costs
+a handful of big-int operations however many relations exist. Memory is
+about max(case id) / 8 bytes per tag.
+
+The writing process applies tag/case changes in place after commit; other
+processes see the bumped "tag-index" version and rebuild from
+case_tag_relations in one streaming query.
+"""
+import re
+import threading
+
+from django.db.models import Max
+
+from apps.core.cache import get_version, bump_version
+from . import lookups
+from .models import Case, CaseTagRelation
+
+VERSION_KEY = 'tag-index'
+
+TOKEN_RE = re.compile(r'\s*(\(|\)|"[^"]*"|[^\s()]+)')
+OPERATORS = ('AND', 'OR', 'NOT')
+# NOTs and parentheses nest by recursion; deeper queries are refused.
+MAX_DEPTH = 50
+
+
+class TagQueryError(ValueError):
+    pass
+
+
+def _set_bit(bits, pk):
+    byte = pk >> 3
+    if byte >= len(bits):
+        bits.extend(bytes(byte - len(bits) + 1))
+    bits[byte] |= 1 << (pk & 7)
+
+
+def bitmap_of(ids, size_hint=0):
+    """Bitmap of an iterable of case ids (e.g. a caller's visible cases)."""
+    bits = bytearray((size_hint >> 3) + 1)
+    for pk in ids:
+        _set_bit(bits, pk)
+    return int.from_bytes(bits, 'little')
+
+
+class TagIndex:
+    def __init__(self):
+        self.version = None
+        self.tags = {}
+        self.universe = 0
+        self.lock = threading.RLock()
+
+    def _ensure(self):
+        version = get_version(VERSION_KEY)
+        if version != self.version:
+            self.rebuild(version)
+
+    def rebuild(self, version=None):
+        version = version if version is not None else get_version(VERSION_KEY)
+        size = Case.objects.aggregate(top=Max('id'))['top'] or 0
+        per_tag = {}
+        rows = CaseTagRelation.objects.values_list('tag_id', 'case_id').iterator(chunk_size=10000)
+        for tag_id, case_id in rows:
+            bits = per_tag.get(tag_id)
+            if bits is None:
+                bits = per_tag[tag_id] = bytearray((size >> 3) + 1)
+            _set_bit(bits, case_id)
+        tags = {tag_id: int.from_bytes(bits, 'little') for tag_id, bits in per_tag.items()}
+        universe = bitmap_of(Case.objects.values_list('id', flat=True).iterator(chunk_size=10000), size)
+        with self.lock:
+            self.tags, self.universe, self.version = tags, universe, version
+
+    # -- incremental maintenance (called after commit) --------------------
+
+    def _apply(self, change):
+        with self.lock:
+            change()
+            new_version = bump_version(VERSION_KEY)
+            # Only adopt the new version if nobody else bumped in between;
+            # otherwise their change is missing here and we must rebuild.
+            self.version = new_version if self.version == new_version - 1 else None
+
+    def invalidate(self):
+        with self.lock:
+            bump_version(VERSION_KEY)
+            self.version = None
+
+    def tag_added(self, tag_id, case_id):
+        def change():
+            self.tags[tag_id] = self.tags.get(tag_id, 0) | (1 << case_id)
+        self._apply(change)
+
+    def tag_removed(self, tag_id, case_id):
+        def change():
+            self.tags[tag_id] = self.tags.get(tag_id, 0) & ~(1 << case_id)
+        self._apply(change)
+
+    def cases_added(self, case_ids):
+        def change():
+            self.universe |= bitmap_of(case_ids)
+        self._apply(change)
+
+    def case_removed(self, case_id):
+        def change():
+            mask = ~(1 << case_id)
+            self.universe &= mask
+            for tag_id in self.tags:
+                self.tags[tag_id] &= mask
+        self._apply(change)
+
+    # -- queries ----------------------------------------------------------
+
+    def evaluate(self, expression):
+        """Bitmap of the cases matching a boolean tag expression."""
+        self._ensure()
+        tokens = TOKEN_RE.findall(expression)
+        if not tokens:
+            raise TagQueryError("empty tag expression")
+        with self.lock:
+            parser = _Parser(tokens, self)
+            result = parser.expression()
+            if parser.position != len(tokens):
+                raise TagQueryError(f"unexpected '{tokens[parser.position]}'")
+        return result
+
+    def page(self, bitmap, before=None, limit=20):
+        """Up to `limit` ids from `bitmap`, highest first, below `before`."""
+        # Clamped, so a huge `before` cannot make a mask as large as itself.
+        if before is not None and before < bitmap.bit_length():
+            bitmap &= (1 << before) - 1
+        ids = []
+        while bitmap and len(ids) < limit:
+            top = bitmap.bit_length() - 1
+            ids.append(top)
+            bitmap ^= 1 << top
+        return ids
+
+    def query(self, expression, within=None, before=None, limit=20):
+        """(total, page of ids) for an expression, optionally within a bitmap."""
+        result = self.evaluate(expression)
+        if within is not None:
+            result &= within
+        return result.bit_count(), self.page(result, before=before, limit=limit)
+
+
+class _Parser:
+    """
+    expression := term ('OR' term)*
+    term       := factor ('AND' factor)*
+    factor     := 'NOT' factor | '(' expression ')' | tag name
+    """
+
+    def __init__(self, tokens, index):
+        self.tokens = tokens
+        self.position = 0
+        self.index = index
+        self.depth = 0
+
+    def _peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else None
+
+    def _keyword(self, word):
+        token = self._peek()
+        if token is not None and token.upper() == word:
+            self.position += 1
+            return True
+        return False
+
+    def expression(self):
+        result = self.term()
+        while self._keyword('OR'):
+            result |= self.term()
+        return result
+
+    def term(self):
+        result = self.factor()
+        while self._keyword('AND'):
+            result &= self.factor()
+        return result
+
+    def _nested(self, parse):
+        self.depth += 1
+        if self.depth > MAX_DEPTH:
+            raise TagQueryError(f"expression nests deeper than {MAX_DEPTH} levels")
+        try:
+            return parse()
+        finally:
+            self.depth -= 1
+
+    def factor(self):
+        if self._keyword('NOT'):
+            return self.index.universe & ~self._nested(self.factor)
+        token = self._peek()
+        if token is None:
+            raise TagQueryError("expression ends unexpectedly")
+        self.position += 1
+        if token == '(':
+            result = self._nested(self.expression)
+            if self._peek() != ')':
+                raise TagQueryError("missing ')'")
+            self.position += 1
+            return result
+        if token == ')' or token.upper() in OPERATORS:
+            raise TagQueryError(f"unexpected '{token}'")
+        name = token[1:-1] if token.startswith('"') else token
+        tag = lookups.tags.get_by_name(name)
+        if tag is None:
+            raise TagQueryError(f"unknown tag '{name}'")
+        return self.index.tags.get(tag.pk, 0)
+
+
+index = TagIndex()
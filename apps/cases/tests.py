@@ -1,3 +1,993 @@
+import io
+import json
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.core.cache import cache, caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.core.cache import DatabaseCache as SharedDatabaseCache, bump_version, get_version
+from apps.courts.models import Court
+from apps.customers.models import Customer
+from apps.employees.models import Employee
+from apps.notifications.models import Notification
+from apps.users.models import User
+from . import (
+    access, analytics, conflicts, counters, exporter, hearing_calendar, hearing_dates, lookups, reminders, tag_index, timeline,
+    workload,
+)
+from .importer import CaseImporter, Resolver
+from .models import (
+    Case, CaseAccess, CaseCategory, CaseCounter, CaseDocument, CasePriority, CaseStatus, CaseTag, CaseTagRelation, CaseUpdate,
+    Hearing, LawyerExperience, LawyerLoad,
+)
+from .search import FIELDS as SEARCH_FIELDS, InvertedIndex
+
+
+def make_user(email, **extra):
+    return User.objects.create_user(email, 'not-a-real-password', first_name='Test', last_name=email.split('@')[0], **extra)
+
+
+def make_employee(email, court=None, designation='lawyer', **extra):
+    user = make_user(email, **extra)
+    Employee.objects.create(
+        user=user, court=court, employee_id=email, designation=designation, date_of_joining=date(2020, 1, 1),
+    )
+    return user
+
+
+def make_customer(email):
+    return Customer.objects.create(user=make_user(email), customer_id=email)
+
+
+class CaseFixtures:
+    """A court, one of each lookup row, a staff user, a lawyer and a customer."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.court = Court.objects.create(name='City Civil Court', court_type='district', address='1 Court Road')
+        cls.category = CaseCategory.objects.create(name='Civil')
+        cls.status = CaseStatus.objects.create(name='Filed')
+        cls.priority = CasePriority.objects.create(name='High', level=3)
+        cls.staff = make_user('admin@example.com', is_staff=True)
+        cls.lawyer = make_employee('lawyer@example.com')
+        cls.customer = make_customer('client@example.com')
+
+    def setUp(self):
+        super().setUp()
+        # Version stamps and the process-local copies built under them
+        # outlive the per-test rollback.
+        cache.clear()
+        hearing_calendar._indexes.clear()
+        tag_index.index.version = None
+        for table in lookups.TABLES.values():
+            table._drop()
+
+    @classmethod
+    def make_case(cls, number, **fields):
+        values = {
+            'case_number': number, 'title': f'Case {number}',
+            'category': cls.category, 'status': cls.status, 'priority': cls.priority,
+            'customer': cls.customer, 'court': cls.court, 'assigned_lawyer': cls.lawyer,
+            'filing_date': date(2024, 1, 1),
+        }
+        values.update(fields)
+        return Case.objects.create(**values)
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+
+class KeysetPaginationTests(CaseFixtures, TestCase):
+    def test_pages_cover_every_case_once(self):
+        cases = [self.make_case(f'KP-{i}') for i in range(7)]
+        client = self.client_for(self.staff)
+        seen, url = [], '/api/cases/cases/?page_size=3'
+        while url:
+            body = client.get(url).json()
+            seen += [row['id'] for row in body['results']]
+            url = body['next']
+        self.assertEqual(seen, [case.pk for case in sorted(cases, key=lambda c: (c.created_at, c.pk), reverse=True)])
+
+    def test_previous_link_returns_the_same_page(self):
+        for i in range(5):
+            self.make_case(f'KP-{i}')
+        client = self.client_for(self.staff)
+        first = client.get('/api/cases/cases/?page_size=2').json()
+        second = client.get(first['next']).json()
+        self.assertEqual(client.get(second['previous']).json()['results'], first['results'])
+
+    def test_invalid_cursor_is_not_found(self):
+        response = self.client_for(self.staff).get('/api/cases/cases/?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, 404)
+
+    def test_hearings_page_in_date_order(self):
+        case = self.make_case('KP-H')
+        start = timezone.make_aware(datetime(2025, 3, 1, 10))
+        for days in (3, 1, 2):
+            Hearing.objects.create(case=case, hearing_date=start + timedelta(days=days))
+        client = self.client_for(self.staff)
+        first = client.get('/api/cases/hearings/?page_size=2').json()
+        second = client.get(first['next']).json()
+        dates = [row['hearing_date'] for row in first['results'] + second['results']]
+        self.assertEqual(dates, sorted(dates))
+        self.assertIsNone(second['next'])
+
+
+class CaseWritePermissionTests(CaseFixtures, TestCase):
+    def case_payload(self, number):
+        return {
+            'case_number': number, 'title': 'New matter', 'category': self.category.pk,
+            'status': self.status.pk, 'priority': self.priority.pk, 'customer': self.customer.pk,
+            'court': self.court.pk, 'assigned_lawyer': self.lawyer.pk, 'filing_date': '2025-01-01',
+        }
+
+    def test_self_registered_user_cannot_create_cases(self):
+        response = self.client_for(make_user('stranger@example.com')).post('/api/cases/cases/', self.case_payload('P-1'))
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(Case.objects.filter(case_number='P-1').exists())
+
+    def test_customer_cannot_change_or_delete_own_case(self):
+        case = self.make_case('P-2')
+        client = self.client_for(self.customer.user)
+        self.assertEqual(client.get(f'/api/cases/cases/{case.pk}/').status_code, 200)
+        self.assertEqual(client.patch(f'/api/cases/cases/{case.pk}/', {'title': 'Mine now'}).status_code, 403)
+        self.assertEqual(client.delete(f'/api/cases/cases/{case.pk}/').status_code, 403)
+        hearing = Hearing.objects.create(case=case, hearing_date=timezone.now())
+        self.assertEqual(client.delete(f'/api/cases/hearings/{hearing.pk}/').status_code, 403)
+        self.assertTrue(Hearing.objects.filter(pk=hearing.pk).exists())
+
+    def test_employee_can_create_cases(self):
+        response = self.client_for(self.lawyer).post('/api/cases/cases/', self.case_payload('P-3'))
+        self.assertEqual(response.status_code, 201, response.content)
+
+    def test_internal_notes_hidden_from_customers(self):
+        case = self.make_case('P-4', internal_notes='Settle below 5L')
+        body = self.client_for(self.customer.user).get(f'/api/cases/cases/{case.pk}/').json()
+        self.assertNotIn('internal_notes', body)
+        self.assertEqual(self.client_for(self.lawyer).get(f'/api/cases/cases/{case.pk}/').json()['internal_notes'],
+                         'Settle below 5L')
+
+    def test_hearings_only_for_visible_cases(self):
+        other_lawyer = make_employee('other@example.com')
+        case = self.make_case('P-5', assigned_lawyer=other_lawyer)
+        response = self.client_for(self.lawyer).post('/api/cases/hearings/', {
+            'case': case.pk, 'hearing_date': '2025-06-01T10:00:00Z',
+        })
+        self.assertEqual(response.status_code, 403)
+
+
+class CaseSearchTests(CaseFixtures, TestCase):
+    def test_title_matches_rank_first_and_customers_skip_internal_notes(self):
+        title = self.make_case('S-1', title='Boundary dispute')
+        body = self.make_case('S-2', title='Lease renewal', description='the boundary wall was moved')
+        notes = self.make_case('S-3', title='Tenancy', internal_notes='boundary settlement offer')
+        staff = self.client_for(self.staff).get('/api/cases/cases/search/?q=bound').json()['results']
+        self.assertEqual(staff[0]['id'], title.pk)
+        self.assertEqual({row['id'] for row in staff}, {title.pk, body.pk, notes.pk})
+        customer = self.client_for(self.customer.user).get('/api/cases/cases/search/?q=boundary').json()['results']
+        self.assertEqual({row['id'] for row in customer}, {title.pk, body.pk})
+
+
+class InvertedIndexTests(CaseFixtures, TestCase):
+    def rows(self, case):
+        return Case.objects.filter(pk=case.pk).values_list('id', *SEARCH_FIELDS)
+
+    def test_other_processes_rebuild_after_a_committed_write(self):
+        reader, writer = InvertedIndex(), InvertedIndex()
+        case = self.make_case('S-4', title='Riparian rights')
+        self.assertEqual([pk for pk, _ in reader.search('riparian')], [case.pk])
+        writer.search('riparian')
+        with self.captureOnCommitCallbacks(execute=True):
+            Case.objects.filter(pk=case.pk).update(title='Easement')
+            writer.index(self.rows(case))
+        self.assertIsNotNone(writer.version, "the writer applies its own change in place")
+        self.assertEqual([pk for pk, _ in writer.search('easement')], [case.pk])
+        self.assertEqual([pk for pk, _ in reader.search('easement')], [case.pk])
+        self.assertEqual(reader.search('riparian'), [])
+
+    def test_uncommitted_writes_are_not_applied(self):
+        index = InvertedIndex()
+        case = self.make_case('S-5', title='Probate')
+        index.search('probate')
+        with self.captureOnCommitCallbacks(execute=False):
+            index.remove([case.pk])
+        self.assertEqual([pk for pk, _ in index.search('probate')], [case.pk])
+
+    def test_writes_do_not_build_an_unbuilt_index(self):
+        index = InvertedIndex()
+        case = self.make_case('S-6', title='Arbitration')
+        with self.captureOnCommitCallbacks(execute=True):
+            index.index(self.rows(case))
+        self.assertIsNone(index.version)
+        self.assertEqual(index.doc_tokens, {})
+
+
+class HearingCalendarTests(CaseFixtures, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.case = cls.make_case('HC-1')
+        cls.morning = timezone.make_aware(datetime(2025, 5, 6, 10))
+
+    def hearing(self, start, minutes=60, **fields):
+        return Hearing.objects.create(case=self.case, hearing_date=start, duration_minutes=minutes, **fields)
+
+    def test_interval_index_reports_overlaps_only(self):
+        index = hearing_calendar.IntervalIndex()
+        hour = timedelta(hours=1)
+        self.assertEqual(index.add(self.morning, self.morning + 3 * hour, 'long'), [])
+        self.assertEqual(index.add(self.morning + 3 * hour, self.morning + 4 * hour, 'after'), [])
+        clashes = index.overlapping(self.morning + 2 * hour, self.morning + 2 * hour + timedelta(minutes=1))
+        self.assertEqual([key for _, _, key in clashes], ['long'])
+
+    def test_slot_check_sees_hearings_once_they_commit(self):
+        first = self.hearing(self.morning)
+        slot = (self.morning + timedelta(minutes=30), self.morning + timedelta(minutes=90))
+        self.assertEqual([pk for _, _, pk in hearing_calendar.check_slot('lawyer', self.lawyer.pk, *slot)], [first.pk])
+        with self.captureOnCommitCallbacks(execute=True):
+            second = self.hearing(self.morning + timedelta(minutes=45))
+        clashes = hearing_calendar.check_slot('lawyer', self.lawyer.pk, *slot)
+        self.assertEqual(sorted(pk for _, _, pk in clashes), [first.pk, second.pk])
+
+    def test_cancelled_and_rescheduled_hearings_do_not_clash(self):
+        moved = self.hearing(self.morning)
+        self.hearing(self.morning, status='cancelled')
+        end = self.morning + timedelta(hours=1)
+        self.assertEqual(hearing_calendar.check_slot('lawyer', self.lawyer.pk, self.morning, end, exclude=moved.pk), [])
+
+    def test_conflicts_endpoint_lists_overlapping_pairs(self):
+        first = self.hearing(self.morning)
+        second = self.hearing(self.morning + timedelta(minutes=30))
+        self.hearing(self.morning + timedelta(hours=3))
+        response = self.client_for(self.staff).get(
+            f'/api/cases/hearings/conflicts/?lawyer={self.lawyer.pk}&view=day&date=2025-05-06',
+        )
+        self.assertEqual(response.json()['conflicts'], [[first.pk, second.pk]])
+
+    def test_agenda_groups_by_local_date(self):
+        self.hearing(self.morning)
+        self.hearing(self.morning + timedelta(days=1))
+        response = self.client_for(self.lawyer).get(
+            f'/api/cases/hearings/agenda/?lawyer={self.lawyer.pk}&view=week&date=2025-05-06',
+        )
+        days = response.json()['days']
+        self.assertEqual([day['date'] for day in days], ['2025-05-06', '2025-05-07'])
+
+
+class CaseImportTests(CaseFixtures, TestCase):
+    header = 'case_number,title,category,status,priority,customer,court,assigned_lawyer,filing_date\n'
+
+    def run_import(self, body, **options):
+        return CaseImporter(created_by=self.staff, **options).run(io.StringIO(self.header + body), 'csv')
+
+    def test_imports_good_rows_and_reports_bad_ones(self):
+        report = self.run_import(
+            'IMP-1,Sale deed,Civil,Filed,High,client@example.com,City Civil Court,lawyer@example.com,2025-01-02\n'
+            'IMP-2,Lease,civil,filed,3,client@example.com,city civil court,lawyer@example.com,2025-01-03\n'
+            'IMP-3,Bad court,Civil,Filed,High,client@example.com,Nowhere,lawyer@example.com,2025-01-04\n'
+            'IMP-1,Duplicate,Civil,Filed,High,client@example.com,City Civil Court,lawyer@example.com,2025-01-05\n'
+        )
+        self.assertEqual((report.rows, report.created, report.failed), (4, 2, 2))
+        self.assertEqual([error['line'] for error in report.errors], [4, 5])
+        self.assertIn('court', report.errors[0]['errors'])
+        self.assertIn('case_number', report.errors[1]['errors'])
+        self.assertEqual(set(Case.objects.filter(case_number__startswith='IMP-').values_list('title', flat=True)),
+                         {'Sale deed', 'Lease'})
+
+    def test_keys_resolve_whatever_their_case(self):
+        report = self.run_import(
+            'IMP-4,Appeal,Civil,Filed,High,CLIENT@EXAMPLE.COM,City Civil Court,Lawyer@Example.com,2025-01-02\n'
+        )
+        self.assertEqual(report.created, 1, report.errors)
+        case = Case.objects.get(case_number='IMP-4')
+        self.assertEqual((case.customer_id, case.assigned_lawyer_id), (self.customer.pk, self.lawyer.pk))
+
+    def test_prefetch_is_one_query_per_chunk(self):
+        resolver = Resolver(Customer.objects.all(), 'customer_id')
+        with self.assertNumQueries(1):
+            resolver.prefetch(['Client@Example.com', 'client@example.com', 'missing'])
+        with self.assertNumQueries(0):
+            resolver.prefetch(['CLIENT@example.com', 'MISSING'])
+        self.assertEqual(resolver.resolve(' client@EXAMPLE.com '), self.customer.pk)
+        self.assertEqual(resolver.missing, {'missing'})
+
+    def test_import_endpoint_is_staff_only(self):
+        upload = SimpleUploadedFile('cases.csv', self.header.encode())
+        response = self.client_for(self.lawyer).post('/api/cases/cases/import/', {'file': upload})
+        self.assertEqual(response.status_code, 403)
+
+
+class CaseExportTests(CaseFixtures, TestCase):
+    def body(self, response):
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv_export_round_trips_through_the_importer(self):
+        self.make_case('EXP-1', title='Partition, with a comma', internal_notes='secret')
+        self.make_case('EXP-2', title='Injunction')
+        exported = self.body(self.client_for(self.staff).get('/api/cases/cases/export/'))
+        self.assertNotIn('internal_notes', exported.splitlines()[0])
+        Case.objects.all().delete()
+        report = CaseImporter(created_by=self.staff).run(io.StringIO(exported), 'csv')
+        self.assertEqual((report.created, report.failed), (2, 0), report.errors)
+        self.assertEqual(Case.objects.get(case_number='EXP-1').title, 'Partition, with a comma')
+
+    def test_jsonl_export_is_limited_to_visible_cases(self):
+        self.make_case('EXP-3')
+        self.make_case('EXP-4', customer=make_customer('someone-else@example.com'))
+        body = self.body(self.client_for(self.customer.user).get('/api/cases/cases/export/?type=jsonl&internal=1'))
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([row['case_number'] for row in rows], ['EXP-3'])
+        self.assertNotIn('internal_notes', rows[0])
+
+    def test_rows_are_written_in_batches(self):
+        for i in range(3):
+            self.make_case(f'EXP-B{i}')
+        with mock.patch.object(exporter, 'ROWS_PER_WRITE', 2):
+            chunks = list(exporter.export(Case.objects.all(), 'jsonl'))
+        self.assertEqual([chunk.count('\n') for chunk in chunks], [2, 1])
+
+
+    def test_command_writes_to_its_stdout_and_refuses_bad_dates(self):
+        self.make_case('EXP-5', filing_date=date(2025, 3, 1))
+        self.make_case('EXP-6', filing_date=date(2025, 6, 1))
+        out = io.StringIO()
+        call_command('export_cases', '--format=jsonl', '--filed-from=2025-04-01', stdout=out)
+        self.assertEqual([json.loads(line)['case_number'] for line in out.getvalue().splitlines()], ['EXP-6'])
+        for bad in ('2025-13-01', '1/4/2025'):
+            with self.subTest(bad=bad), self.assertRaises(CommandError):
+                call_command('export_cases', f'--filed-from={bad}', stdout=io.StringIO())
+
+class LookupCacheTests(CaseFixtures, TestCase):
+    def test_other_processes_see_a_rename_once_it_commits(self):
+        # Two copies of the table stand in for two worker processes.
+        here, elsewhere = lookups.LookupTable(CaseCategory), lookups.LookupTable(CaseCategory)
+        here.check_interval = elsewhere.check_interval = 0
+        self.assertEqual(elsewhere.name_of(self.category.pk), 'Civil')
+        with self.captureOnCommitCallbacks(execute=True):
+            CaseCategory.objects.filter(pk=self.category.pk).update(name='Civil Suit')
+            here.invalidate()
+        self.assertEqual(elsewhere.name_of(self.category.pk), 'Civil Suit')
+
+    def test_cases_accept_lookup_names_and_filter_by_them(self):
+        self.make_case('LK-1')
+        self.make_case('LK-2', category=CaseCategory.objects.create(name='Criminal'))
+        client = self.client_for(self.staff)
+        rows = client.get('/api/cases/cases/?category=criminal').json()['results']
+        self.assertEqual([(row['case_number'], row['category_name']) for row in rows], [('LK-2', 'Criminal')])
+        self.assertEqual(client.get('/api/cases/cases/?category=Unknown').json()['results'], [])
+
+    def test_version_stamps_live_in_the_shared_cache(self):
+        self.assertIsInstance(caches['default'], SharedDatabaseCache)
+        before = get_version('tests')
+        self.assertEqual(bump_version('tests'), before + 1)
+        self.assertEqual(get_version('tests'), before + 1)
+        with self.assertRaises(ValueError):
+            caches['default'].incr('never-set')
+
+
+class TagIndexTests(CaseFixtures, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.urgent, cls.appeal, cls.closed = (CaseTag.objects.create(name=name) for name in ('urgent', 'appeal', 'closed'))
+        cls.cases = [cls.make_case(f'T-{n}') for n in range(4)]
+        for case, tags in zip(cls.cases, [(cls.urgent,), (cls.urgent, cls.appeal), (cls.urgent, cls.closed), ()]):
+            for tag in tags:
+                CaseTagRelation.objects.create(case=case, tag=tag)
+
+    def ids(self, *positions):
+        return sorted(self.cases[n].pk for n in positions)
+
+    def test_boolean_expressions(self):
+        index = tag_index.TagIndex()
+        self.assertEqual(sorted(index.page(index.evaluate('urgent AND NOT closed'))), self.ids(0, 1))
+        self.assertEqual(sorted(index.page(index.evaluate('appeal OR (closed AND urgent)'))), self.ids(1, 2))
+        self.assertEqual(sorted(index.page(index.evaluate('NOT urgent'))), self.ids(3))
+        for expression in ('', 'urgent AND', '(urgent', 'missing'):
+            with self.assertRaises(tag_index.TagQueryError):
+                index.evaluate(expression)
+
+    def test_pages_run_newest_first_below_before(self):
+        index = tag_index.TagIndex()
+        everything = index.evaluate('urgent')
+        first = index.page(everything, limit=2)
+        self.assertEqual(first, self.ids(1, 2)[::-1])
+        self.assertEqual(index.page(everything, before=first[-1], limit=2), self.ids(0))
+        self.assertEqual(index.page(everything, before=0), [])
+        self.assertEqual(index.page(everything, before=10 ** 11, limit=1), self.ids(2))
+
+    def test_nesting_is_limited(self):
+        index = tag_index.TagIndex()
+        self.assertEqual(sorted(index.page(index.evaluate('NOT ' * 50 + 'urgent'))), self.ids(0, 1, 2))
+        for expression in ('NOT ' * 2000 + 'urgent', '(' * 2000 + 'urgent' + ')' * 2000):
+            with self.assertRaises(tag_index.TagQueryError):
+                index.evaluate(expression)
+
+    def test_other_processes_rebuild_after_a_committed_change(self):
+        here, elsewhere = tag_index.TagIndex(), tag_index.TagIndex()
+        self.assertEqual(elsewhere.query('appeal')[0], 1)
+        here.evaluate('appeal')
+        with self.captureOnCommitCallbacks(execute=True):
+            CaseTagRelation.objects.create(case=self.cases[3], tag=self.appeal)
+            here.tag_added(self.appeal.pk, self.cases[3].pk)
+        self.assertIsNotNone(here.version, "the writer applies its own change in place")
+        self.assertEqual(here.query('appeal')[0], 2)
+        self.assertEqual(elsewhere.query('appeal')[0], 2)
+
+    def test_tagged_endpoint_limits_customers_to_their_cases(self):
+        other = make_customer('other@example.com')
+        hidden = self.make_case('T-9', customer=other)
+        CaseTagRelation.objects.create(case=hidden, tag=self.urgent)
+        staff = self.client_for(self.staff).get('/api/cases/cases/tagged/?q=urgent').json()
+        self.assertEqual(staff['count'], 4)
+        customer = self.client_for(self.customer.user).get('/api/cases/cases/tagged/?q=urgent&page_size=2').json()
+        self.assertEqual(customer['count'], 3)
+        self.assertEqual([row['id'] for row in customer['results']], self.ids(1, 2)[::-1])
+        self.assertEqual(customer['next_before'], self.cases[1].pk)
+
+    def test_tagged_endpoint_rejects_bad_parameters(self):
+        client = self.client_for(self.staff)
+        for query in ('q=urgent AND', 'q=urgent&before=-1', 'q=urgent&before=x', 'q=' + 'NOT%20' * 1200 + 'urgent'):
+            self.assertEqual(client.get(f'/api/cases/cases/tagged/?{query}').status_code, 400, query[:40])
+        response = client.get('/api/cases/cases/tagged/?q=urgent&before=100000000000')
+        self.assertEqual(response.json()['count'], 3)
+
+
+class TimelineTests(CaseFixtures, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.case = cls.make_case('TL-1')
+        cls.noon = timezone.make_aware(datetime(2025, 3, 1, 12))
+
+    def update(self, hours, **fields):
+        update = CaseUpdate.objects.create(case=self.case, title='Update', description='', **fields)
+        CaseUpdate.objects.filter(pk=update.pk).update(created_at=self.noon + timedelta(hours=hours))
+        return ('update', update.pk)
+
+    def hearing(self, hours):
+        return ('hearing', Hearing.objects.create(case=self.case, hearing_date=self.noon + timedelta(hours=hours)).pk)
+
+    def document(self, hours, **fields):
+        document = CaseDocument.objects.create(case=self.case, title='Document', uploaded_by=self.staff, **fields)
+        CaseDocument.objects.filter(pk=document.pk).update(uploaded_at=self.noon + timedelta(hours=hours))
+        return ('document', document.pk)
+
+    def walk(self, user, limit):
+        entries, cursor = timeline.page(self.case, user, limit=limit)
+        while cursor:
+            more, cursor = timeline.page(self.case, user, cursor=cursor, limit=limit)
+            entries += more
+        return [(entry['type'], entry['id']) for entry in entries]
+
+    def test_pages_merge_the_sources_newest_first(self):
+        oldest = self.update(0)
+        tied = [self.update(2), self.hearing(2), self.document(2), self.update(2)]
+        newest = self.hearing(5)
+        middle = self.document(1)
+        # Equal timestamps fall back to document, hearing, update, then id.
+        expected = [newest, tied[2], tied[1], tied[3], tied[0], middle, oldest]
+        for limit in (1, 2, 3, 20):
+            self.assertEqual(self.walk(self.staff, limit), expected, limit)
+
+    def test_each_page_is_three_queries(self):
+        for hours in range(10):
+            self.update(hours)
+            self.hearing(hours)
+            self.document(hours)
+        _, cursor = timeline.page(self.case, self.staff, limit=5)
+        with self.assertNumQueries(3):
+            entries, _ = timeline.page(self.case, self.staff, cursor=cursor, limit=5)
+        self.assertEqual(len(entries), 5)
+
+    def test_customers_see_only_what_is_shared_with_them(self):
+        shared = [self.update(0), self.document(1)]
+        self.update(2, is_visible_to_customer=False)
+        self.document(3, is_visible_to_customer=False)
+        self.document(4, is_confidential=True)
+        self.assertEqual(self.walk(self.customer.user, 20), shared[::-1])
+        self.assertEqual(len(self.walk(self.lawyer, 20)), 5)
+
+    def test_invalid_cursor_is_a_bad_request(self):
+        response = self.client_for(self.staff).get(f'/api/cases/cases/{self.case.pk}/timeline/?cursor=bogus')
+        self.assertEqual(response.status_code, 400)
+
+
+class CaseMetricsTests(CaseFixtures, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        today = timezone.now().date()
+        cls.late = cls.make_case('M-1', expected_closure_date=today - timedelta(days=3), fees_charged=500, fees_paid=100)
+        cls.later = cls.make_case('M-2', expected_closure_date=today - timedelta(days=1), fees_charged=900, fees_paid=0)
+        cls.closed = cls.make_case(
+            'M-3', expected_closure_date=today - timedelta(days=9), actual_closure_date=today - timedelta(days=5),
+            fees_charged=300, fees_paid=300,
+        )
+        cls.on_time = cls.make_case('M-4', expected_closure_date=today + timedelta(days=30), fees_charged=50)
+
+    def test_annotations_agree_with_the_properties(self):
+        for case in Case.objects.with_metrics():
+            self.assertEqual(case.overdue, case.is_overdue, case.case_number)
+            self.assertEqual(case.pending_for.days, case.days_pending, case.case_number)
+            self.assertEqual(case.fees_outstanding, case.outstanding_fees, case.case_number)
+        self.assertEqual(set(Case.objects.overdue()), {self.late, self.later})
+        self.assertEqual(set(Case.objects.open()), {self.late, self.later, self.on_time})
+
+    def test_overdue_cases_by_outstanding_fees(self):
+        client = self.client_for(self.staff)
+        rows = client.get('/api/cases/cases/?overdue=1&ordering=-outstanding_fees').json()['results']
+        self.assertEqual([row['case_number'] for row in rows], ['M-2', 'M-1'])
+        self.assertEqual([Decimal(row['outstanding_fees']) for row in rows], [900, 400])
+        rows = client.get('/api/cases/cases/?overdue=0').json()['results']
+        self.assertEqual({row['case_number'] for row in rows}, {'M-3', 'M-4'})
+
+    def test_metric_orderings_page_through_every_case(self):
+        client = self.client_for(self.staff)
+        cases = list(Case.objects.all())
+        expected = {
+            'outstanding_fees': sorted(cases, key=lambda case: (case.outstanding_fees, case.pk)),
+            '-days_pending': sorted(cases, key=lambda case: (case.days_pending, case.pk), reverse=True),
+        }
+        for ordering, order in expected.items():
+            seen, url = [], f'/api/cases/cases/?ordering={ordering}&page_size=1'
+            while url:
+                body = client.get(url).json()
+                seen += [row['id'] for row in body['results']]
+                url = body['next']
+            self.assertEqual(seen, [case.pk for case in order], ordering)
+
+
+class CaseCounterTests(CaseFixtures, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.closed = CaseStatus.objects.create(name='Closed')
+
+    def bucket(self, dimension, key):
+        return CaseCounter.objects.filter(dimension=dimension, key=key).values_list('case_count', 'fees_charged').first()
+
+    def test_saves_and_deletes_move_cases_between_buckets(self):
+        case = self.make_case('CC-1', fees_charged=100)
+        self.make_case('CC-2', fees_charged=50)
+        self.assertEqual(self.bucket('status', self.status.pk), (2, 150))
+        case.status = self.closed
+        case.actual_closure_date = date(2025, 1, 1)
+        case.save()
+        self.assertEqual(self.bucket('status', self.status.pk), (1, 50))
+        self.assertEqual(self.bucket('status', self.closed.pk), (1, 100))
+        self.assertEqual(CaseCounter.objects.get(dimension='all').open_count, 1)
+        case.delete()
+        self.assertEqual(self.bucket('status', self.closed.pk), (0, 0))
+        self.assertEqual(counters.reconcile(fix=False), [])
+
+    def test_stale_instances_do_not_make_counters_drift(self):
+        case = self.make_case('CC-3', fees_charged=100)
+        first, second = Case.objects.get(pk=case.pk), Case.objects.get(pk=case.pk)
+        first.status = self.closed
+        first.save()
+        # `second` was loaded before the status change; its save must not
+        # take the case out of the 'Filed' bucket a second time.
+        second.fees_charged = 300
+        second.save()
+        self.assertEqual(self.bucket('status', self.status.pk), (1, 300))
+        self.assertEqual(counters.reconcile(fix=False), [])
+        first.delete()
+        self.assertEqual(self.bucket('all', 0), (0, 0))
+
+    def test_reconcile_repairs_writes_that_skip_signals(self):
+        case = self.make_case('CC-4', fees_charged=100)
+        Case.objects.filter(pk=case.pk).update(status=self.closed)
+        drift = counters.reconcile()
+        self.assertEqual({(dimension, key) for dimension, key, _, _ in drift},
+                         {('status', self.status.pk), ('status', self.closed.pk)})
+        self.assertEqual(counters.reconcile(fix=False), [])
+
+    def test_dashboard_is_staff_only_and_names_buckets(self):
+        self.make_case('CC-5', fees_charged=100)
+        self.assertEqual(self.client_for(self.lawyer).get('/api/cases/cases/dashboard/').status_code, 403)
+        body = self.client_for(self.staff).get('/api/cases/cases/dashboard/?dimension=status').json()
+        self.assertEqual(body['totals']['case_count'], 1)
+        self.assertEqual([(row['name'], row['case_count']) for row in body['status']], [('Filed', 1)])
+        response = self.client_for(self.staff).get('/api/cases/cases/dashboard/?dimension=colour')
+        self.assertEqual(response.status_code, 400)
+
+
+class CaseAccessTests(CaseFixtures, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.other_court = Court.objects.create(name='High Court', court_type='high', address='2 Court Road')
+        cls.clerk = make_employee('clerk@example.com', court=cls.court, designation='clerk')
+        cls.associate = make_employee('associate@example.com')
+
+    def assertMatchesRule(self):
+        stored = set(CaseAccess.objects.values_list('user_id', 'case_id'))
+        expected = {
+            (user.pk, case_id)
+            for user in User.objects.filter(is_staff=False)
+            for case_id in Case.objects.filter(access.grant_rule(user)).values_list('id', flat=True)
+        }
+        self.assertEqual(stored, expected)
+
+    def test_grants_follow_lawyer_customer_team_and_court(self):
+        case = self.make_case('AC-1')
+        elsewhere = self.make_case('AC-2', court=self.other_court)
+        case.team_members.add(self.associate)
+        self.assertEqual(access.visible_case_ids(self.lawyer), {case.pk, elsewhere.pk})
+        self.assertEqual(access.visible_case_ids(self.customer.user), {case.pk, elsewhere.pk})
+        self.assertEqual(access.visible_case_ids(self.clerk), {case.pk})
+        self.assertEqual(access.visible_case_ids(self.associate), {case.pk})
+        self.assertMatchesRule()
+
+    def test_changes_revoke_grants_once_committed(self):
+        case = self.make_case('AC-3')
+        case.team_members.add(self.associate)
+        self.assertEqual(access.visible_case_ids(self.associate), {case.pk})
+        self.assertEqual(access.visible_case_ids(self.clerk), {case.pk})
+        with self.captureOnCommitCallbacks(execute=True):
+            case.team_members.remove(self.associate)
+            case.court = self.other_court
+            case.assigned_lawyer = self.associate
+            case.save()
+        self.assertEqual(access.visible_case_ids(self.associate), {case.pk})
+        self.assertEqual(access.visible_case_ids(self.clerk), frozenset())
+        self.assertEqual(access.visible_case_ids(self.lawyer), frozenset())
+        self.assertMatchesRule()
+
+    def test_stale_instance_writing_an_old_lawyer_back_resyncs(self):
+        case = self.make_case('AC-5')
+        first, stale = Case.objects.get(pk=case.pk), Case.objects.get(pk=case.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            first.assigned_lawyer = self.associate
+            first.save()
+        # `stale` still holds self.lawyer and writes it back.
+        with self.captureOnCommitCallbacks(execute=True):
+            stale.title = 'Renamed'
+            stale.save()
+        self.assertEqual(access.visible_case_ids(self.lawyer), {case.pk})
+        self.assertEqual(access.visible_case_ids(self.associate), frozenset())
+        self.assertMatchesRule()
+
+    def test_leaving_a_court_revokes_its_cases(self):
+        case = self.make_case('AC-4')
+        self.assertEqual(access.visible_case_ids(self.clerk), {case.pk})
+        employee = self.clerk.employee_profile
+        with self.captureOnCommitCallbacks(execute=True):
+            employee.is_active = False
+            employee.save()
+        self.assertEqual(access.visible_case_ids(self.clerk), frozenset())
+        with self.captureOnCommitCallbacks(execute=True):
+            employee.is_active = True
+            employee.save()
+        self.assertEqual(access.visible_case_ids(self.clerk), {case.pk})
+        with self.captureOnCommitCallbacks(execute=True):
+            employee.delete()
+        self.assertEqual(access.visible_case_ids(self.clerk), frozenset())
+        self.assertEqual(self.client_for(self.clerk).get(f'/api/cases/cases/{case.pk}/').status_code, 404)
+
+    def test_rebuild_matches_incremental_sync(self):
+        for number in range(5):
+            case = self.make_case(f'AC-R{number}', court=self.court if number % 2 else self.other_court)
+            case.team_members.add(self.associate)
+        incremental = set(CaseAccess.objects.values_list('user_id', 'case_id'))
+        CaseAccess.objects.all().delete()
+        self.assertEqual(access.rebuild(), len(incremental))
+        self.assertEqual(set(CaseAccess.objects.values_list('user_id', 'case_id')), incremental)
+        self.assertMatchesRule()
+
+
+class HearingReminderTests(CaseFixtures, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.case = cls.make_case('HR-1')
+        cls.associate = make_employee('associate@example.com')
+        cls.case.team_members.add(cls.associate)
+
+    def hearing(self, hours, **fields):
+        return Hearing.objects.create(case=self.case, hearing_date=timezone.now() + timedelta(hours=hours), **fields)
+
+    def test_only_upcoming_active_unsent_hearings_are_due(self):
+        soon = self.hearing(2)
+        self.hearing(30)
+        self.hearing(-2)
+        self.hearing(3, status='cancelled')
+        self.hearing(4, reminder_sent=True)
+        self.assertEqual(list(reminders.due()), [soon])
+
+    def test_each_participant_is_reminded_once(self):
+        hearings = [self.hearing(hours) for hours in (1, 2, 3)]
+        run = reminders.send_due(batch_size=2)
+        self.assertEqual((run.batches, run.hearings, run.notifications), (2, 3, 9))
+        recipients = Notification.objects.filter(notification_type='hearing_reminder', related_object_id=hearings[0].pk)
+        self.assertEqual(
+            set(recipients.values_list('user_id', flat=True)), {self.lawyer.pk, self.associate.pk, self.customer.user_id},
+        )
+        self.assertEqual(reminders.send_due().hearings, 0)
+        self.assertEqual(Notification.objects.count(), 9)
+        metrics = reminders.metrics()
+        self.assertEqual((metrics['backlog'], metrics['last_run']['hearings']), (0, 3))
+
+    def test_a_lost_claim_rolls_the_batch_back(self):
+        hearing = self.hearing(1)
+        # Another worker (without row locks) reminded it after we selected it.
+        Hearing.objects.filter(pk=hearing.pk).update(reminder_sent=True)
+        with mock.patch.object(reminders, 'due', return_value=Hearing.objects.filter(pk=hearing.pk)):
+            self.assertEqual(reminders.send_batch(reminders.ReminderRun()), 0)
+        self.assertFalse(Notification.objects.exists())
+
+    def test_rescheduling_sends_a_fresh_reminder(self):
+        hearing = self.hearing(1)
+        reminders.send_due()
+        client = self.client_for(self.lawyer)
+        new_date = (hearing.hearing_date + timedelta(hours=2)).isoformat()
+        self.assertEqual(client.patch(f'/api/cases/hearings/{hearing.pk}/', {'location': 'Room 4'}).status_code, 200)
+        hearing.refresh_from_db()
+        self.assertTrue(hearing.reminder_sent)
+        self.assertEqual(client.patch(f'/api/cases/hearings/{hearing.pk}/', {'hearing_date': new_date}).status_code, 200)
+        self.assertEqual(reminders.send_due().hearings, 1)
+
+
+class HearingDateTests(CaseFixtures, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.case = cls.make_case('HD-1')
+        cls.today = timezone.localdate()
+
+    def hearing(self, days, case=None, **fields):
+        day = self.today + timedelta(days=days)
+        when = timezone.make_aware(datetime(day.year, day.month, day.day, 10))
+        return Hearing.objects.create(case=case or self.case, hearing_date=when, **fields)
+
+    def dates(self, case=None):
+        case = case or self.case
+        case.refresh_from_db()
+        return case.hearing_date, case.next_hearing_date
+
+    def test_saves_and_deletes_keep_the_dates_current(self):
+        self.hearing(-10)
+        held = self.hearing(-3)
+        self.hearing(-1, status='cancelled')
+        self.hearing(7, status='cancelled')
+        upcoming = self.hearing(5)
+        self.assertEqual(self.dates(), (self.today - timedelta(days=3), self.today + timedelta(days=5)))
+        upcoming.delete()
+        held.status = 'postponed'
+        held.save()
+        self.assertEqual(self.dates(), (self.today - timedelta(days=10), None))
+
+    def test_moving_a_hearing_refreshes_both_cases(self):
+        other = self.make_case('HD-2')
+        hearing = self.hearing(2)
+        hearing.case = other
+        hearing.save()
+        self.assertEqual(self.dates(), (None, None))
+        self.assertEqual(self.dates(other), (None, self.today + timedelta(days=2)))
+
+    def test_recompute_only_touches_stale_cases(self):
+        self.hearing(-1)
+        fresh = self.make_case('HD-3')
+        Hearing.objects.create(case=fresh, hearing_date=timezone.now() + timedelta(days=3))
+        self.make_case('HD-4', next_hearing_date=date(2020, 1, 1))
+        # A hearing that was upcoming yesterday, as if the nightly run were due.
+        Case.objects.filter(pk=self.case.pk).update(next_hearing_date=self.today - timedelta(days=1), hearing_date=None)
+        self.assertEqual(hearing_dates.recompute(), 1)
+        self.assertEqual(self.dates(), (self.today - timedelta(days=1), None))
+        self.assertEqual(Case.objects.get(case_number='HD-4').next_hearing_date, date(2020, 1, 1))
+        self.assertEqual(hearing_dates.recompute(), 0)
+
+
+class WorkloadTests(CaseFixtures, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.low = CasePriority.objects.create(name='Low', level=1)
+        cls.lawyers = [make_employee(f'lawyer{n}@example.com', court=cls.court) for n in range(12)]
+
+    def load(self, lawyer):
+        row = LawyerLoad.objects.filter(lawyer=lawyer).values('open_cases', 'priority_load', 'upcoming_hearings').first()
+        return row and tuple(row.values())
+
+    def test_cases_and_hearings_keep_loads_current(self):
+        case = self.make_case('W-1')
+        Hearing.objects.create(case=case, hearing_date=timezone.now() + timedelta(days=2))
+        Hearing.objects.create(case=case, hearing_date=timezone.now() - timedelta(days=2))
+        self.assertEqual(self.load(self.lawyer), (1, 3, 1))
+        case.assigned_lawyer = self.lawyers[0]
+        case.priority = self.low
+        case.save()
+        self.assertEqual((self.load(self.lawyer), self.load(self.lawyers[0])), ((0, 0, 0), (1, 1, 1)))
+        case.actual_closure_date = date(2025, 1, 1)
+        case.save()
+        self.assertEqual(self.load(self.lawyers[0]), (0, 0, 1))
+        computed, _ = workload.compute()
+        stored = LawyerLoad.objects.exclude(open_cases=0, upcoming_hearings=0).values(
+            'lawyer_id', 'open_cases', 'priority_load', 'upcoming_hearings',
+        )
+        self.assertEqual({row.pop('lawyer_id'): row for row in stored}, {pk: dict(row) for pk, row in computed.items()})
+
+    def test_stale_instances_do_not_make_loads_drift(self):
+        case = self.make_case('W-3')
+        Hearing.objects.create(case=case, hearing_date=timezone.now() + timedelta(days=2))
+        first, stale = Case.objects.get(pk=case.pk), Case.objects.get(pk=case.pk)
+        first.assigned_lawyer = self.lawyers[0]
+        first.save()
+        # `stale` was loaded with self.lawyer and writes it back.
+        stale.priority = self.low
+        stale.save()
+        self.assertEqual((self.load(self.lawyer), self.load(self.lawyers[0])), ((1, 1, 1), (0, 0, 0)))
+        stale.delete()
+        self.assertEqual(self.load(self.lawyer), (0, 0, 0))
+        self.assertFalse(LawyerExperience.objects.exclude(case_count=0).exists())
+
+    def test_hearing_saves_read_the_lawyer_off_the_case(self):
+        case = self.make_case('W-2')
+        hearing = Hearing.objects.create(case=case, hearing_date=timezone.now() + timedelta(days=2))
+        client = self.client_for(self.staff)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.patch(f'/api/cases/hearings/{hearing.pk}/', {'status': 'cancelled'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.load(self.lawyer), (1, 3, 0))
+        lawyer_lookups = [
+            query['sql'] for query in queries.captured_queries
+            if query['sql'].startswith('SELECT "cases"."assigned_lawyer_id"')
+        ]
+        self.assertEqual(lawyer_lookups, [])
+
+    def test_recommendations_match_a_full_ranking(self):
+        for n, lawyer in enumerate(self.lawyers):
+            for i in range(n % 5):
+                self.make_case(f'W-{n}-{i}', assigned_lawyer=lawyer, priority=self.low if i % 2 else self.priority)
+        # Experience in the category can lift a busier lawyer past a freer one.
+        LawyerExperience.objects.filter(lawyer=self.lawyers[4]).update(case_count=40)
+        idle = make_employee('idle@example.com', court=self.court)
+        pool = [idle, *self.lawyers]  # the court's lawyers; self.lawyer has no court
+        loads = {row['lawyer_id']: row for row in LawyerLoad.objects.values()}
+        experience = dict(LawyerExperience.objects.filter(category=self.category).values_list('lawyer_id', 'case_count'))
+        empty = {'open_cases': 0, 'priority_load': 0, 'upcoming_hearings': 0}
+        expected = sorted(
+            (workload.score(loads.get(user.pk, empty), experience.get(user.pk, 0)), user.pk) for user in pool
+        )
+        for batch_size in (1, workload.BATCH_SIZE):
+            for limit in (1, 3, 5, 20):
+                with mock.patch.object(workload, 'BATCH_SIZE', batch_size):
+                    results = workload.recommend(court_id=self.court.pk, category_id=self.category.pk, limit=limit)
+                self.assertEqual([row['lawyer'] for row in results], [pk for _, pk in expected[:limit]], limit)
+        self.assertEqual(workload.recommend(court_id=self.court.pk, limit=1)[0]['lawyer'], self.lawyers[0].pk)
+
+    def test_recommend_endpoint_is_staff_only(self):
+        self.assertEqual(self.client_for(self.lawyer).get('/api/cases/cases/recommend-lawyer/').status_code, 403)
+        body = self.client_for(self.staff).get(f'/api/cases/cases/recommend-lawyer/?court={self.court.pk}&limit=2').json()
+        self.assertEqual(len(body['results']), 2)
+
+
+class AnalyticsTests(CaseFixtures, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.today = date(2025, 6, 30)
+        cls.other_court = Court.objects.create(name='High Court', court_type='high', address='2 Court Road')
+        for n, (filed, closed, charged, paid) in enumerate([
+            (date(2025, 1, 10), date(2025, 2, 9), 1000, 1000),
+            (date(2025, 1, 20), date(2025, 4, 30), 500, 250),
+            (date(2025, 2, 1), date(2025, 2, 11), 0, 0),
+            (date(2025, 2, 5), None, 800, 100),
+            (date(2024, 6, 1), None, 0, 0),
+        ]):
+            cls.make_case(f'AN-{n}', filing_date=filed, actual_closure_date=closed, fees_charged=charged, fees_paid=paid)
+        cls.make_case('AN-H', court=cls.other_court, filing_date=date(2025, 6, 29), fees_charged=300, fees_paid=300)
+
+    def compute(self, dimension):
+        return analytics.compute(Case.objects.all(), dimension, today=self.today)
+
+    def test_court_report(self):
+        civil, high = self.compute('court')
+        self.assertEqual((civil['name'], civil['cases'], civil['closed'], civil['open']), ('City Civil Court', 5, 3, 2))
+        self.assertEqual(civil['disposal_days'], {'p25': 20.0, 'p50': 30.0, 'p75': 65.0, 'p90': 86.0, 'mean': 46.7})
+        self.assertEqual(civil['pending_age']['90-179'], 1)
+        self.assertEqual(civil['pending_age']['365-729'], 1)
+        self.assertEqual(civil['collection_ratio'], round(1350 / 2300, 4))
+        self.assertEqual((high['disposal_days'], high['pending_age']['0-29'], high['collection_ratio']), (None, 1, 1.0))
+
+    def test_pure_python_fallback_gives_the_same_report(self):
+        expected = {dimension: self.compute(dimension) for dimension in analytics.DIMENSIONS}
+        with mock.patch.object(analytics, 'np', None):
+            for dimension in analytics.DIMENSIONS:
+                self.assertEqual(self.compute(dimension), expected[dimension], dimension)
+        self.assertEqual([group['name'] for group in expected['month']], ['2024-06', '2025-01', '2025-02', '2025-06'])
+        self.assertEqual([group['name'] for group in expected['judge']], ['Unassigned'])
+
+    def test_reports_are_served_from_snapshots(self):
+        client = self.client_for(self.staff)
+        self.assertEqual(self.client_for(self.lawyer).get('/api/cases/cases/analytics/').status_code, 403)
+        first = client.get('/api/cases/cases/analytics/?by=category').json()
+        self.make_case('AN-X')
+        self.assertEqual(client.get('/api/cases/cases/analytics/?by=category').json(), first)
+        refreshed = client.get('/api/cases/cases/analytics/?by=category&refresh=1').json()
+        self.assertEqual(refreshed['groups'][0]['cases'], first['groups'][0]['cases'] + 1)
+        self.assertEqual(client.get('/api/cases/cases/analytics/?by=colour').status_code, 400)
+
+
+class ConflictCheckTests(CaseFixtures, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        Customer.objects.filter(pk=cls.customer.pk).update(company_name='Acme Industries Pvt Ltd')
+        cls.past = cls.make_case('CF-1', opposing_party='Globex Corporation', opposing_lawyer='Adv. Meera Iyer')
+
+    def setUp(self):
+        super().setUp()
+        conflicts.index = conflicts.TrigramIndex()
+
+    def names(self, results):
+        return [(row['kind'], row['name']) for row in results]
+
+    def test_opposing_parties_resembling_customers_and_past_parties(self):
+        results = conflicts.check(opposing_party='ACME Industries Ltd.', opposing_lawyer='Meera Iyer')
+        self.assertEqual(self.names(results), [
+            (conflicts.CUSTOMER_COMPANY, 'Acme Industries Pvt Ltd'), (conflicts.OPPOSING_LAWYER, 'Adv. Meera Iyer'),
+        ])
+        self.assertEqual(conflicts.check(opposing_party='Globex Corp', exclude_case=self.past.pk), [])
+        self.assertEqual(conflicts.check(opposing_party='Initech'), [])
+
+    def test_saves_are_seen_by_the_next_check(self):
+        conflicts.check(opposing_party='anything')
+        self.make_case('CF-2', opposing_party='Umbrella Holdings')
+        Case.objects.filter(pk=self.past.pk).update(opposing_party='Soylent Foods')
+        self.assertEqual(self.names(conflicts.check(opposing_party='Umbrella Holding')),
+                         [(conflicts.OPPOSING_PARTY, 'Umbrella Holdings')])
+        self.assertEqual(conflicts.check(opposing_party='Globex Corporation'), [])
+        self.assertEqual(len(conflicts.check(opposing_party='Soylent Foods')), 1)
+
+    def test_only_renames_touch_the_customer(self):
+        user = self.customer.user
+        stamp = timezone.now() - timedelta(days=1)
+        Customer.objects.filter(pk=self.customer.pk).update(updated_at=stamp)
+        user.last_login = timezone.now()
+        user.save(update_fields=['last_login'])
+        self.assertEqual(Customer.objects.get(pk=self.customer.pk).updated_at, stamp)
+        user.last_name = 'Renamed'
+        user.save(update_fields=['last_name'])
+        self.assertGreater(Customer.objects.get(pk=self.customer.pk).updated_at, stamp)
+
+    def test_pure_python_scoring_matches_numpy(self):
+        for n in range(30):
+            self.make_case(f'CF-N{n}', opposing_party=f'Party {n} Traders', opposing_lawyer=f'Counsel {n % 7}')
+        queries = ('Party 1 Traders', 'Counsel 3', 'Acme Industries', 'Traders')
+        with_numpy = conflicts.TrigramIndex()
+        with_numpy.rebuild()
+        self.make_case('CF-P', opposing_party='Party 1 Trader')  # in the pending postings
+        with_numpy.sync()
+        expected = {query: with_numpy.match(query, threshold=0.3) for query in queries}
+        with mock.patch.object(conflicts, 'np', None):
+            without = conflicts.TrigramIndex()
+            without.rebuild()
+            for query in queries:
+                self.assertEqual(without.match(query, threshold=0.3), expected[query], query)
 
-# Create your tests here.
+    def test_only_employees_may_run_conflict_checks(self):
+        outsider = make_user('outsider@example.com')
+        start = timezone.make_aware(datetime(2025, 5, 6, 10))
+        requests = (
+            ('get', '/api/cases/cases/conflict-check/?opposing_party=Globex', {}),
+            ('get', f'/api/cases/hearings/conflicts/?lawyer={self.lawyer.pk}&view=day&date=2025-05-06', {}),
+            ('post', '/api/cases/hearings/check/', {'case': self.past.pk, 'hearing_date': start.isoformat()}),
+        )
+        for method, url, data in requests:
+            for user, expected in ((self.customer.user, 403), (outsider, 403), (self.lawyer, 200), (self.staff, 200)):
+                response = getattr(self.client_for(user), method)(url, data, format='json')
+                self.assertEqual(response.status_code, expected, (url, user.email))
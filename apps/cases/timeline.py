@@ -0,0 +1,101 @@
+"""
+Newest-first timeline of a case: updates, hearings and documents.
+
+Each source is read with its own ordered, LIMITed query that starts right
+after the cursor, and the three sorted streams are merged lazily with a
+heap. A page therefore costs three index range scans of page_size + 1 rows
+however long the case's history is.
+
+Entries are totally ordered by (timestamp, source rank, id), descending;
+the cursor is that triple for the last entry shown.
+"""
+import base64
+import binascii
+import heapq
+import itertools
+import json
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from .access import case_document_filter, case_update_filter
+from .models import CaseUpdate, Hearing, CaseDocument
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class Source:
+    def __init__(self, kind, rank, model, timestamp, fields):
+        self.kind = kind
+        self.rank = rank
+        self.model = model
+        self.timestamp = timestamp
+        self.fields = fields
+
+    def after(self, cursor):
+        """Rows strictly after `cursor` in (timestamp, rank, id) desc order."""
+        if cursor is None:
+            return Q()
+        ts, rank, pk = cursor
+        if self.rank < rank:
+            return Q(**{f'{self.timestamp}__lte': ts})
+        if self.rank > rank:
+            return Q(**{f'{self.timestamp}__lt': ts})
+        return Q(**{f'{self.timestamp}__lt': ts}) | Q(**{self.timestamp: ts, 'id__lt': pk})
+
+    def rows(self, case, visibility, cursor, limit):
+        queryset = (
+            self.model.objects.filter(visibility, self.after(cursor), case=case)
+            .order_by(f'-{self.timestamp}', '-id')
+            .values('id', self.timestamp, *self.fields)[:limit]
+        )
+        for row in queryset:
+            yield (row[self.timestamp], self.rank, row['id']), self, row
+
+
+SOURCES = (
+    Source('update', 0, CaseUpdate, 'created_at', ('title', 'description', 'update_type', 'created_by')),
+    Source('hearing', 1, Hearing, 'hearing_date', ('hearing_type', 'status', 'location', 'judge', 'outcome')),
+    Source('document', 2, CaseDocument, 'uploaded_at', (
+        'title', 'document_type', 'file_type', 'file_size', 'is_confidential', 'uploaded_by',
+    )),
+)
+
+
+def encode_cursor(key):
+    ts, rank, pk = key
+    payload = json.dumps([ts.isoformat(), rank, pk], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def decode_cursor(token):
+    try:
+        ts, rank, pk = json.loads(base64.urlsafe_b64decode(token.encode()).decode())
+        ts = parse_datetime(ts)
+        if ts is None:
+            raise ValueError
+        return ts, int(rank), int(pk)
+    except (TypeError, ValueError, binascii.Error):
+        raise InvalidCursor("Invalid cursor")
+
+
+def page(case, user, cursor=None, limit=20):
+    """(entries, next cursor or None) for one page of `case`'s timeline."""
+    position = decode_cursor(cursor) if cursor else None
+    visibility = {
+        'update': case_update_filter(user, case),
+        'hearing': Q(),
+        'document': case_document_filter(user),
+    }
+    streams = [source.rows(case, visibility[source.kind], position, limit + 1) for source in SOURCES]
+    merged = heapq.merge(*streams, key=lambda entry: entry[0], reverse=True)
+    entries = list(itertools.islice(merged, limit + 1))
+
+    results = []
+    for _, source, row in entries[:limit]:
+        timestamp = row.pop(source.timestamp)
+        results.append({'type': source.kind, 'timestamp': timestamp, **row})
+    next_cursor = encode_cursor(entries[limit - 1][0]) if len(entries) > limit else None
+    return results, next_cursor
@@ -0,0 +1,11 @@
+from django.urls import path, include
+from rest_framework.routers import DefaultRouter
+from .views import CaseViewSet, HearingViewSet
+
+router = DefaultRouter()
+router.register(r'cases', CaseViewSet, basename='case')
+router.register(r'hearings', HearingViewSet, basename='hearing')
+
+urlpatterns = [
+    path('', include(router.urls)),
+]
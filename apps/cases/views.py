@@ -1,3 +1,343 @@
-from django.shortcuts import render
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework import viewsets, permissions, status
+from rest_framework.decorators import action
+from rest_framework.exceptions import PermissionDenied, ValidationError
+from rest_framework.response import Response
 
-# Create your views here.
+from apps.customers.models import Customer
+from . import analytics, conflicts, counters, exporter, hearing_calendar, lookups, reminders, timeline, workload
+from .access import is_customer, visible_cases, visible_case_ids
+from .importer import CaseImporter, text_stream
+from .models import Case, Hearing
+from .pagination import CasePagination, HearingPagination
+from .permissions import IsEmployee, IsEmployeeOrReadOnly
+from .search import search as search_cases
+from .serializers import CaseSerializer, HearingSerializer
+from .tag_index import index as tag_index, bitmap_of, TagQueryError
+
+
+class CaseViewSet(viewsets.ModelViewSet):
+    queryset = Case.objects.all()
+    serializer_class = CaseSerializer
+    # Reads are limited to visible cases by get_queryset; writes to employees.
+    permission_classes = [IsEmployeeOrReadOnly]
+    pagination_class = CasePagination
+
+    # ?param= -> (lookup table, filter); values may be ids or names.
+    lookup_filters = {
+        'category': (lookups.categories, 'category_id'),
+        'status': (lookups.statuses, 'status_id'),
+        'priority': (lookups.priorities, 'priority_id'),
+        'tag': (lookups.tags, 'tag_relations__tag_id'),
+    }
+
+    # ?ordering= -> keyset ordering; the metric orderings use with_metrics().
+    orderings = {
+        'created_at': ('created_at', 'id'),
+        '-created_at': ('-created_at', '-id'),
+        'outstanding_fees': ('fees_outstanding', 'id'),
+        '-outstanding_fees': ('-fees_outstanding', '-id'),
+        'days_pending': ('pending_for', 'id'),
+        '-days_pending': ('-pending_for', '-id'),
+    }
+    metric_annotations = ('fees_outstanding', 'pending_for')
+
+    def get_queryset(self):
+        return visible_cases(self.request.user).prefetch_related('team_members')
+
+    def get_keyset_ordering(self, request):
+        return self.orderings.get(request.query_params.get('ordering'), self.pagination_class.ordering)
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        params = self.request.query_params
+        if params.get('overdue') in ('1', 'true'):
+            queryset = queryset.overdue()
+        elif params.get('overdue') in ('0', 'false'):
+            queryset = queryset.exclude(
+                actual_closure_date__isnull=True, expected_closure_date__lt=timezone.now().date(),
+            )
+        ordering = self.get_keyset_ordering(self.request)
+        if any(spec.lstrip('-') in self.metric_annotations for spec in ordering):
+            queryset = queryset.with_metrics()
+        for param, (table, field) in self.lookup_filters.items():
+            value = self.request.query_params.get(param)
+            if not value:
+                continue
+            row = table.resolve(value)
+            if row is None:
+                return queryset.none()
+            queryset = queryset.filter(**{field: row.pk})
+        return queryset
+
+    def perform_create(self, serializer):
+        serializer.save(created_by=self.request.user)
+
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({"detail": "q is required"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = min(max(int(request.query_params.get('limit', 20)), 1), 100)
+        except ValueError:
+            return Response({"detail": "limit must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+
+        user = request.user
+        hits = search_cases(
+            query,
+            include_internal=not is_customer(user),
+            within=None if user.is_staff else visible_cases(user),
+            limit=limit,
+        )
+        cases = self.get_queryset().in_bulk([pk for pk, _ in hits])
+        ranked = [cases[pk] for pk, _ in hits if pk in cases]
+        return Response({'results': self.get_serializer(ranked, many=True).data})
+
+    @action(detail=True, methods=['get'])
+    def timeline(self, request, pk=None):
+        """Updates, hearings and documents of a case, newest first."""
+        case = self.get_object()
+        try:
+            limit = min(max(int(request.query_params.get('page_size', 20)), 1), 100)
+            entries, next_cursor = timeline.page(
+                case, request.user, cursor=request.query_params.get('cursor'), limit=limit,
+            )
+        except (ValueError, timeline.InvalidCursor) as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'next': next_cursor, 'results': entries})
+
+    @action(detail=False, methods=['get'])
+    def tagged(self, request):
+        """
+        Cases matching a boolean tag expression, newest id first, e.g.
+        ?q=urgent AND (appeal OR writ) AND NOT closed&before=<id>.
+        """
+        try:
+            before = int(request.query_params['before']) if request.query_params.get('before') else None
+            limit = min(max(int(request.query_params.get('page_size', 20)), 1), 100)
+        except ValueError:
+            return Response({"detail": "before and page_size must be integers"}, status=status.HTTP_400_BAD_REQUEST)
+        if before is not None and before < 0:
+            return Response({"detail": "before must not be negative"}, status=status.HTTP_400_BAD_REQUEST)
+        user = request.user
+        within = None if user.is_staff else bitmap_of(visible_case_ids(user))
+        try:
+            total, ids = tag_index.query(request.query_params.get('q', ''), within=within, before=before, limit=limit)
+        except TagQueryError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        cases = self.get_queryset().in_bulk(ids)
+        page = [cases[pk] for pk in ids if pk in cases]
+        return Response({
+            'count': total,
+            'next_before': ids[-1] if len(ids) == limit else None,
+            'results': self.get_serializer(page, many=True).data,
+        })
+
+    @action(detail=False, methods=['get'], permission_classes=[permissions.IsAdminUser])
+    def dashboard(self, request):
+        """Firm-wide counts and fee totals, optionally ?dimension=status,court,..."""
+        requested = request.query_params.get('dimension')
+        dimensions = tuple(requested.split(',')) if requested else counters.DIMENSIONS
+        unknown = set(dimensions) - set(counters.DIMENSIONS)
+        if unknown:
+            raise ValidationError({'dimension': f"unknown dimension(s): {', '.join(sorted(unknown))}"})
+        return Response(counters.dashboard(dimensions))
+
+    @action(detail=False, methods=['get'], url_path='analytics', permission_classes=[permissions.IsAdminUser])
+    def analytics_report(self, request):
+        """
+        Disposal times, pending-age histogram and fee collection grouped
+        ?by=court|judge|category|month, optionally within filed_from/filed_to.
+        """
+        params = request.query_params
+        dimension = params.get('by', 'court')
+        if dimension not in analytics.DIMENSIONS:
+            raise ValidationError({"by": f"must be one of {', '.join(analytics.DIMENSIONS)}"})
+        filed_from, filed_to = params.get('filed_from'), params.get('filed_to')
+        if (filed_from and parse_date(filed_from) is None) or (filed_to and parse_date(filed_to) is None):
+            raise ValidationError({"detail": "filed_from/filed_to must be YYYY-MM-DD"})
+        refresh = params.get('refresh') in ('1', 'true')
+        return Response(analytics.report(dimension, filed_from, filed_to, refresh=refresh))
+
+    @action(detail=False, methods=['get'], url_path='conflict-check', permission_classes=[IsEmployee])
+    def conflict_check(self, request):
+        """
+        Customers and past parties resembling ?opposing_party= / ?opposing_lawyer=,
+        and past opposing parties resembling ?customer=<id>. Pass ?case=<id>
+        to check an existing case against everything but itself.
+        """
+        params = request.query_params
+        try:
+            customer = Customer.objects.select_related('user').get(pk=params['customer']) if params.get('customer') else None
+            exclude = int(params['case']) if params.get('case') else None
+        except (ValueError, Customer.DoesNotExist):
+            raise ValidationError({"detail": "customer and case must be existing ids"})
+        if not (params.get('opposing_party') or params.get('opposing_lawyer') or customer):
+            raise ValidationError({"detail": "pass opposing_party, opposing_lawyer or customer"})
+        results = conflicts.check(
+            opposing_party=params.get('opposing_party', ''),
+            opposing_lawyer=params.get('opposing_lawyer', ''),
+            customer=customer,
+            exclude_case=exclude,
+        )
+        return Response({'results': results})
+
+    @action(detail=False, methods=['get'], url_path='recommend-lawyer', permission_classes=[permissions.IsAdminUser])
+    def recommend_lawyer(self, request):
+        """Least-loaded lawyers for a new case in ?court= and ?category= (id or name)."""
+        params = request.query_params
+        try:
+            court = int(params['court']) if params.get('court') else None
+            limit = min(max(int(params.get('limit', 5)), 1), 50)
+        except ValueError:
+            raise ValidationError({"detail": "court and limit must be integers"})
+        category = None
+        if params.get('category'):
+            category = lookups.categories.resolve(params['category'])
+            if category is None:
+                raise ValidationError({"category": "unknown category"})
+        candidates = workload.recommend(court_id=court, category_id=category and category.pk, limit=limit)
+        return Response({'results': candidates})
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """Stream visible cases as ?type=csv (default) or ?type=jsonl."""
+        fmt = request.query_params.get('type', 'csv')
+        if fmt not in exporter.FORMATS:
+            return Response({"detail": "type must be csv or jsonl"}, status=status.HTTP_400_BAD_REQUEST)
+        params = request.query_params
+        filed_from, filed_to = params.get('filed_from'), params.get('filed_to')
+        if (filed_from and parse_date(filed_from) is None) or (filed_to and parse_date(filed_to) is None):
+            return Response({"detail": "filed_from/filed_to must be YYYY-MM-DD"}, status=status.HTTP_400_BAD_REQUEST)
+        queryset = exporter.filter_cases(
+            visible_cases(request.user),
+            court=params.get('court'),
+            category=params.get('category'),
+            status=params.get('status'),
+            filed_from=filed_from,
+            filed_to=filed_to,
+        )
+        include_internal = request.user.is_staff and params.get('internal') in ('1', 'true')
+        response = StreamingHttpResponse(
+            exporter.export(queryset, fmt, include_internal=include_internal),
+            content_type=exporter.FORMATS[fmt],
+        )
+        response['Content-Disposition'] = f'attachment; filename="cases-{timezone.localdate():%Y%m%d}.{fmt}"'
+        return response
+
+    @action(detail=False, methods=['post'], url_path='import', permission_classes=[permissions.IsAdminUser])
+    def import_cases(self, request):
+        """Bulk import from an uploaded CSV or JSON Lines `file`."""
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({"detail": "file is required"}, status=status.HTTP_400_BAD_REQUEST)
+        fmt = request.data.get('format') or upload.name.rsplit('.', 1)[-1].lower()
+        if fmt not in ('csv', 'jsonl'):
+            return Response({"detail": "format must be csv or jsonl"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            report = CaseImporter(created_by=request.user).run(text_stream(upload), fmt)
+        except UnicodeDecodeError:
+            return Response({"detail": "file must be UTF-8 encoded"}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(report.as_dict(), status=status.HTTP_201_CREATED if report.created else status.HTTP_200_OK)
+
+
+class HearingViewSet(viewsets.ModelViewSet):
+    queryset = Hearing.objects.all()
+    serializer_class = HearingSerializer
+    permission_classes = [IsEmployeeOrReadOnly]
+    pagination_class = HearingPagination
+
+    def get_queryset(self):
+        qs = Hearing.objects.all()
+        if self.request.method not in permissions.SAFE_METHODS:
+            # The workload signals read the case's lawyer off the instance.
+            qs = qs.select_related('case')
+        if not self.request.user.is_staff:
+            qs = qs.filter(case__in=visible_cases(self.request.user).values('id'))
+        case_id = self.request.query_params.get('case')
+        if case_id:
+            qs = qs.filter(case_id=case_id)
+        return qs
+
+    def _check_case(self, serializer):
+        case = serializer.validated_data.get('case')
+        if case is not None and not visible_cases(self.request.user).filter(pk=case.pk).exists():
+            raise PermissionDenied("You cannot schedule hearings for this case.")
+
+    def perform_create(self, serializer):
+        self._check_case(serializer)
+        serializer.save(created_by=self.request.user)
+
+    def perform_update(self, serializer):
+        self._check_case(serializer)
+        # A rescheduled hearing gets a fresh reminder for its new date.
+        new_date = serializer.validated_data.get('hearing_date')
+        if new_date is not None and new_date != serializer.instance.hearing_date:
+            serializer.save(reminder_sent=False)
+        else:
+            serializer.save()
+
+    def _calendar_params(self, request):
+        owners = [kind for kind in hearing_calendar.RESOURCE_FIELDS if kind in request.query_params]
+        if len(owners) != 1:
+            raise ValidationError({"detail": "pass exactly one of lawyer, judge or court"})
+        kind = owners[0]
+        try:
+            resource_id = int(request.query_params[kind])
+        except ValueError:
+            raise ValidationError({kind: "must be an integer"})
+        view = request.query_params.get('view', 'month')
+        if view not in hearing_calendar.VIEWS:
+            raise ValidationError({"view": f"must be one of {', '.join(hearing_calendar.VIEWS)}"})
+        day = request.query_params.get('date')
+        day = parse_date(day) if day else timezone.localdate()
+        if day is None:
+            raise ValidationError({"date": "expected YYYY-MM-DD"})
+        return kind, resource_id, view, day
+
+    @staticmethod
+    def _clashes(entries):
+        return [{'hearing': pk, 'start': start, 'end': end} for start, end, pk in entries]
+
+    @action(detail=False, methods=['get'])
+    def agenda(self, request):
+        """Day, week or month agenda of one lawyer, judge or court."""
+        kind, resource_id, view, day = self._calendar_params(request)
+        start, end, days = hearing_calendar.agenda(kind, resource_id, view, day, queryset=self.get_queryset())
+        return Response({
+            'start': start,
+            'end': end,
+            'days': [
+                {'date': date, 'hearings': self.get_serializer(hearings, many=True).data}
+                for date, hearings in days.items()
+            ],
+        })
+
+    @action(detail=False, methods=['get'], permission_classes=[IsEmployee])
+    def conflicts(self, request):
+        """Overlapping pairs of active hearings in a lawyer/judge/court calendar."""
+        kind, resource_id, view, day = self._calendar_params(request)
+        start, end = hearing_calendar.view_bounds(view, day)
+        pairs = hearing_calendar.find_conflicts(kind, resource_id, start, end)
+        return Response({'start': start, 'end': end, 'conflicts': [list(pair) for pair in pairs]})
+
+    @action(detail=False, methods=['get'], url_path='reminders', permission_classes=[permissions.IsAdminUser])
+    def reminder_metrics(self, request):
+        """Reminder backlog and the throughput/lag of the last sending run."""
+        return Response(reminders.metrics())
+
+    @action(detail=False, methods=['post'], permission_classes=[IsEmployee])
+    def check(self, request):
+        """Clashes a proposed (or rescheduled, via `hearing`) slot would cause."""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        hearing = Hearing(**serializer.validated_data)
+        try:
+            hearing.pk = int(request.data['hearing']) if request.data.get('hearing') else None
+        except (TypeError, ValueError):
+            raise ValidationError({"hearing": "must be an integer"})
+        clashes = hearing_calendar.hearing_conflicts(hearing)
+        return Response({kind: self._clashes(entries) for kind, entries in clashes.items()})
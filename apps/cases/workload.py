@@ -0,0 +1,271 @@
+"""
+Lawyer workload counters and assignment recommendations.
+
+Each lawyer's load is kept in lawyer_loads as running totals over the
+cases assigned to them: open cases, the sum of CasePriority.level over
+those, and upcoming (scheduled or in-progress, from today on) hearings.
+lawyer_experience counts, per category, every case a lawyer has been
+assigned. Case and Hearing signals apply F() deltas in the writer's
+transaction, like `counters`. Recommending lawyers for a new case walks
+lawyer_loads in weighted-load order (an indexed generated column) and
+stops as soon as nobody further down could still make the list, so it
+reads a few rows per recommendation however many lawyers the pool holds.
+
+Hearings stop being upcoming when their day passes, and a change to a
+priority's level changes what its open cases weigh; `rebuild()`
+(`manage.py rebuild_lawyer_load`, nightly) recomputes both tables.
+"""
+from collections import defaultdict
+
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Exists, F, OuterRef, Sum
+
+from apps.employees.models import Employee
+from . import counters, lookups
+from .hearing_calendar import ACTIVE_STATUSES
+from .hearing_dates import today_start
+from .models import HEARING_WEIGHT, Case, Hearing, LawyerExperience, LawyerLoad
+
+# Load discount for the most experienced lawyers in the case's category;
+# experience saturates at SPECIALIST_CASES cases.
+SPECIALIST_DISCOUNT = 0.3
+SPECIALIST_CASES = 20
+# lawyer_loads rows read at a time while recommending (at least).
+BATCH_SIZE = 50
+
+CASE_COLUMNS = ('assigned_lawyer_id', 'category_id', 'priority_id', 'actual_closure_date')
+HEARING_COLUMNS = ('case_id', 'status', 'hearing_date')
+
+
+def _level(priority_id):
+    priority = lookups.priorities.get_by_id(priority_id)
+    return priority.level if priority is not None else 0
+
+
+def _add(model, key_field, deltas):
+    """Add {key: {field: delta}} to `model` rows with F() updates, creating missing rows."""
+    for key, changes in deltas.items():
+        changes = {field: delta for field, delta in changes.items() if delta}
+        if not changes:
+            continue
+        lookup = dict(zip(key_field, key)) if isinstance(key_field, tuple) else {key_field: key}
+        updates = {field: F(field) + delta for field, delta in changes.items()}
+        if model.objects.filter(**lookup).update(**updates):
+            continue
+        try:
+            with transaction.atomic():
+                model.objects.create(**lookup, **changes)
+        except IntegrityError:
+            model.objects.filter(**lookup).update(**updates)
+
+
+def _case_deltas(loads, experience, values, sign, upcoming=0):
+    lawyer = values['assigned_lawyer_id']
+    if values['actual_closure_date'] is None:
+        loads[lawyer]['open_cases'] += sign
+        loads[lawyer]['priority_load'] += sign * _level(values['priority_id'])
+    loads[lawyer]['upcoming_hearings'] += sign * upcoming
+    experience[(lawyer, values['category_id'])]['case_count'] += sign
+
+
+def _apply(loads, experience):
+    _add(LawyerLoad, 'lawyer_id', loads)
+    _add(LawyerExperience, ('lawyer_id', 'category_id'), experience)
+
+
+def _deltas():
+    return defaultdict(lambda: defaultdict(int)), defaultdict(lambda: defaultdict(int))
+
+
+def _upcoming(case_id):
+    return Hearing.objects.filter(
+        case_id=case_id, status__in=ACTIVE_STATUSES, hearing_date__gte=today_start(),
+    ).count()
+
+
+def case_saved(case, created):
+    loads, experience = _deltas()
+    new = {column: getattr(case, column) for column in CASE_COLUMNS}
+    # The row as stored before this save, not as this instance was loaded:
+    # someone else may have moved the case since.
+    old = None if created else counters.stored_values(case)
+    if created or old is None:
+        _case_deltas(loads, experience, new, 1)
+    elif any(old[column] != new[column] for column in CASE_COLUMNS):
+        # Hearings only move with the lawyer.
+        upcoming = _upcoming(case.pk) if old['assigned_lawyer_id'] != new['assigned_lawyer_id'] else 0
+        _case_deltas(loads, experience, old, -1, upcoming)
+        _case_deltas(loads, experience, new, 1, upcoming)
+    _apply(loads, experience)
+
+
+def case_deleted(case):
+    # Its hearings were deleted (and uncounted) just before it.
+    loads, experience = _deltas()
+    old = counters.stored_values(case) or {column: getattr(case, column) for column in CASE_COLUMNS}
+    _case_deltas(loads, experience, old, -1)
+    _apply(loads, experience)
+
+
+def cases_created(case_ids):
+    loads, experience = _deltas()
+    for values in Case.objects.filter(pk__in=case_ids).values(*CASE_COLUMNS).iterator(chunk_size=2000):
+        _case_deltas(loads, experience, values, 1)
+    _apply(loads, experience)
+
+
+def hearing_values(hearing, values=None):
+    """
+    HEARING_COLUMNS of `hearing` (or the `values` it was loaded with) plus
+    the assigned lawyer when the instance holds their case, so the save
+    needs no query for it. Otherwise `_hearing_lawyer` looks it up, and
+    only for hearings that count.
+    """
+    if values is None:
+        values = {column: getattr(hearing, column) for column in HEARING_COLUMNS}
+    if values['case_id'] == hearing.case_id and Hearing.case.is_cached(hearing):
+        values['assigned_lawyer_id'] = hearing.case.assigned_lawyer_id
+    return values
+
+
+def _hearing_lawyer(values, since):
+    """(lawyer id, 1) if the hearing counts as upcoming, else (None, 0)."""
+    if values.get('status') not in ACTIVE_STATUSES or values['hearing_date'] < since:
+        return None, 0
+    if 'assigned_lawyer_id' in values:
+        lawyer = values['assigned_lawyer_id']
+    else:
+        lawyer = Case.objects.filter(pk=values['case_id']).values_list('assigned_lawyer_id', flat=True).first()
+    return lawyer, 1 if lawyer is not None else 0
+
+
+def hearing_changed(old, new):
+    """
+    Move a hearing in or out of a lawyer's upcoming count. `old`/`new` are
+    its `hearing_values` before and after; None when it was created or
+    deleted.
+    """
+    since = today_start()
+    before = _hearing_lawyer(old, since) if old else (None, 0)
+    after = _hearing_lawyer(new, since) if new else (None, 0)
+    if before == after:
+        return
+    loads = defaultdict(lambda: defaultdict(int))
+    if before[0] is not None:
+        loads[before[0]]['upcoming_hearings'] -= 1
+    if after[0] is not None:
+        loads[after[0]]['upcoming_hearings'] += 1
+    _add(LawyerLoad, 'lawyer_id', loads)
+
+
+def compute():
+    """(loads, experience) recomputed from cases and hearings."""
+    open_cases = Case.objects.filter(actual_closure_date__isnull=True).order_by()
+    loads = defaultdict(lambda: {'open_cases': 0, 'priority_load': 0, 'upcoming_hearings': 0})
+    for row in open_cases.values('assigned_lawyer_id').annotate(
+        open_cases=Count('id'), priority_load=Sum('priority__level'),
+    ):
+        loads[row['assigned_lawyer_id']].update(open_cases=row['open_cases'], priority_load=row['priority_load'])
+    upcoming = Hearing.objects.filter(status__in=ACTIVE_STATUSES, hearing_date__gte=today_start()).order_by()
+    for row in upcoming.values('case__assigned_lawyer_id').annotate(n=Count('id')):
+        loads[row['case__assigned_lawyer_id']]['upcoming_hearings'] = row['n']
+    experience = {
+        (row['assigned_lawyer_id'], row['category_id']): row['n']
+        for row in Case.objects.order_by().values('assigned_lawyer_id', 'category_id').annotate(n=Count('id'))
+    }
+    return loads, experience
+
+
+def rebuild():
+    """Rewrite both tables from scratch; returns the number of lawyers with load."""
+    loads, experience = compute()
+    with transaction.atomic():
+        LawyerLoad.objects.all().delete()
+        LawyerExperience.objects.all().delete()
+        LawyerLoad.objects.bulk_create([LawyerLoad(lawyer_id=pk, **values) for pk, values in loads.items()])
+        LawyerExperience.objects.bulk_create([
+            LawyerExperience(lawyer_id=lawyer, category_id=category, case_count=n)
+            for (lawyer, category), n in experience.items()
+        ])
+    return len(loads)
+
+
+def candidate_pool(court_id=None):
+    """
+    Active lawyers of the court, failing that all active lawyers, as an
+    Employee queryset; None (everyone with load) if there are none.
+    """
+    lawyers = Employee.objects.filter(designation='lawyer', is_active=True)
+    if court_id is not None:
+        in_court = lawyers.filter(court_id=court_id)
+        if in_court.exists():
+            return in_court
+    return lawyers if lawyers.exists() else None
+
+
+def score(load, category_cases):
+    """Lower is better: weighted load, discounted for experience in the category."""
+    weighted = load['priority_load'] + HEARING_WEIGHT * load['upcoming_hearings']
+    specialization = min(category_cases, SPECIALIST_CASES) / SPECIALIST_CASES
+    return weighted * (1 - SPECIALIST_DISCOUNT * specialization)
+
+
+def _by_weighted_load(pool, batch_size):
+    """Batches of `pool`'s lawyer_loads rows, least weighted load first."""
+    rows = LawyerLoad.objects.all()
+    if pool is not None:
+        # EXISTS rather than IN, so the weighted index is walked in order
+        # and each row probed, instead of the whole pool fetched and sorted.
+        rows = rows.filter(Exists(pool.filter(user_id=OuterRef('lawyer_id'))))
+    rows = rows.order_by('weighted_load', 'lawyer_id').values(
+        'lawyer_id', 'open_cases', 'priority_load', 'upcoming_hearings',
+    )
+    batch = []
+    for row in rows.iterator(chunk_size=batch_size):
+        batch.append(row)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def recommend(court_id=None, category_id=None, limit=5):
+    """
+    Candidates for a new case, least loaded (after specialization) first.
+
+    Experience takes at most SPECIALIST_DISCOUNT off a lawyer's weighted
+    load, so once the weighted load reached, discounted in full, is above
+    the `limit`th best score, nobody further down can get on the list.
+    Lawyers with no load row score 0 and come first.
+    """
+    pool = candidate_pool(court_id)
+    empty = {'open_cases': 0, 'priority_load': 0, 'upcoming_hearings': 0}
+    ranked = []
+    if pool is not None:
+        idle = pool.filter(user__case_load__isnull=True).order_by('user_id').values_list('user_id', flat=True)
+        ranked = [(0.0, pk, empty, 0) for pk in idle[:limit]]
+    for batch in _by_weighted_load(pool, batch_size=max(4 * limit, BATCH_SIZE)):
+        if len(ranked) == limit and score(batch[0], SPECIALIST_CASES) > ranked[-1][0]:
+            break
+        lawyer_ids = [row['lawyer_id'] for row in batch]
+        experience = dict(
+            LawyerExperience.objects.filter(lawyer_id__in=lawyer_ids, category_id=category_id)
+            .values_list('lawyer_id', 'case_count')
+        ) if category_id is not None else {}
+        for row in batch:
+            pk = row.pop('lawyer_id')
+            ranked.append((score(row, experience.get(pk, 0)), pk, row, experience.get(pk, 0)))
+        ranked = sorted(ranked, key=lambda candidate: candidate[:2])[:limit]
+    users = get_user_model().objects.in_bulk([pk for _, pk, _, _ in ranked])
+    return [
+        {
+            'lawyer': pk,
+            'name': users[pk].get_full_name().strip() or users[pk].email,
+            'score': round(value, 2),
+            **load,
+            'category_cases': category_cases,
+        }
+        for value, pk, load, category_cases in ranked if pk in users
+    ]
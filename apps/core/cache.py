@@ -0,0 +1,81 @@
+"""
+Version stamps for process-local caches.
+
+Each worker keeps its own copy of some derived data (lookup tables,
+interval indexes, ...) tagged with the version it was built from. Writers
+bump the version in the shared Django cache and every worker rebuilds on
+its next read. That only works when every worker sees the same cache:
+settings.CACHES uses Redis when REDIS_URL is set and the `DatabaseCache`
+below otherwise, never the per-process LocMemCache.
+"""
+import time
+
+from django.core.cache import cache
+from django.core.cache.backends import db
+from django.db import connections, router, transaction
+
+
+class DatabaseCache(db.DatabaseCache):
+    """
+    Django's database cache with an incr() that is safe under concurrent
+    writers. The stock one reads the value and writes it back, so two
+    workers bumping a version at once could both store n + 1 and each
+    believe it was the only writer.
+    """
+
+    def incr(self, key, delta=1, version=None):
+        using = router.db_for_write(self.cache_model_class)
+        connection = connections[using]
+        quote_name = connection.ops.quote_name
+        with transaction.atomic(using=using):
+            # A no-op UPDATE as the transaction's first statement takes the
+            # row lock (on SQLite, the write lock) before the value is read
+            # and holds it until commit; concurrent bumps queue up behind it.
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'UPDATE %s SET %s = %s WHERE %s = %%s' % (
+                        quote_name(self._table), quote_name('expires'), quote_name('expires'),
+                        quote_name('cache_key'),
+                    ),
+                    [self.make_and_validate_key(key, version=version)],
+                )
+                if not cursor.rowcount:
+                    raise ValueError(f"Key '{key}' not found")
+            return super().incr(key, delta, version)
+
+
+def _key(name):
+    return f'version:{name}'
+
+
+def _seed():
+    # Start from the clock rather than 1 so a key evicted from the cache
+    # never comes back with a version some worker already built from.
+    return int(time.time() * 1000)
+
+
+def get_version(name):
+    key = _key(name)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _seed(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(name):
+    key = _key(name)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.add(key, _seed(), timeout=None)
+        return cache.incr(key)
+
+
+def bump_version_on_commit(name):
+    """
+    Bump once the current transaction commits. Bumping earlier would let
+    another worker rebuild from pre-commit data and keep it under the new
+    version.
+    """
+    transaction.on_commit(lambda: bump_version(name))
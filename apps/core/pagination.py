@@ -0,0 +1,162 @@
+import base64
+import binascii
+import datetime
+import decimal
+import json
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from django.utils.duration import duration_string
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+def _dump(value):
+    """JSON-safe, lossless form of a cursor value; parsed back with Field.to_python()."""
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, datetime.timedelta):
+        return duration_string(value)
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    return value
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination keyed on a composite, unique ordering.
+
+    Unlike PageNumberPagination there is no OFFSET and no COUNT(*): each page
+    is a single `WHERE (a, b) < (x, y) ORDER BY a, b LIMIT n` query, so page
+    5000 costs the same as page 1 as long as an index covers `ordering`.
+    The last field of `ordering` must be unique (normally the primary key)
+    and none of the fields may be nullable. Views may pick the ordering per
+    request with `get_keyset_ordering(request)`; fields may be annotations.
+    """
+    ordering = ('-created_at', '-id')
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        if view is not None and hasattr(view, 'get_keyset_ordering'):
+            self.ordering = tuple(view.get_keyset_ordering(request))
+        self.names = [spec.lstrip('-') for spec in self.ordering]
+        self.fields = [self._field(queryset, name) for name in self.names]
+
+        position, reverse = self.decode_cursor(request)
+        ordering = self._flip(self.ordering) if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self._after(position, reverse))
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+
+        if reverse:
+            self.has_next, self.has_previous = position is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+        self.page = results
+        return results
+
+    def get_page_size(self, request):
+        if self.page_size_query_param:
+            try:
+                size = int(request.query_params[self.page_size_query_param])
+                if size > 0:
+                    return min(size, self.max_page_size)
+            except (KeyError, ValueError):
+                pass
+        return self.page_size
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.position_of(self.page[-1]), reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.position_of(self.page[0]), reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    @staticmethod
+    def _field(queryset, name):
+        try:
+            return queryset.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return queryset.query.annotations[name].output_field
+
+    def position_of(self, obj):
+        """Cursor position (one value per ordering field) of an instance."""
+        return [_dump(getattr(obj, name)) for name in self.names]
+
+    def encode_cursor(self, position, reverse=False):
+        payload = {'p': position, 'r': int(reverse), 'o': list(self.ordering)}
+        payload = json.dumps(payload, separators=(',', ':'))
+        token = base64.urlsafe_b64encode(payload.encode()).decode()
+        return replace_query_param(self.base_url, self.cursor_query_param, token)
+
+    def decode_cursor(self, request):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None, False
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(token.encode()).decode())
+            raw = payload['p']
+            if len(raw) != len(self.fields) or payload.get('o', list(self.ordering)) != list(self.ordering):
+                raise ValueError
+            position = [field.to_python(value) for field, value in zip(self.fields, raw)]
+            reverse = bool(payload.get('r'))
+        except (TypeError, ValueError, KeyError, binascii.Error, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse
+
+    def _after(self, position, reverse):
+        # (a > x) OR (a = x AND b > y) OR ..., with the comparison flipped for
+        # descending fields and again when walking backwards. The redundant
+        # inclusive bound on `a` lets the planner seek into the index instead
+        # of scanning it to evaluate the OR.
+        condition = Q()
+        equal = {}
+        for spec, name, value in zip(self.ordering, self.names, position):
+            descending = spec.startswith('-')
+            lookup = 'lt' if descending != reverse else 'gt'
+            condition |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        lead, lead_value = self.names[0], position[0]
+        lookup = 'lte' if self.ordering[0].startswith('-') != reverse else 'gte'
+        return Q(**{f'{lead}__{lookup}': lead_value}) & condition
+
+    @staticmethod
+    def _flip(ordering):
+        return tuple(f[1:] if f.startswith('-') else f'-{f}' for f in ordering)
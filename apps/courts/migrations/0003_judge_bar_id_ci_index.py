@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 07:16
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courts', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='judge',
+            index=models.Index(django.db.models.functions.text.Lower('bar_id'), name='judges_bar_id_ci_idx'),
+        ),
+    ]
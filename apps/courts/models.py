@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models.functions import Lower
 from django.utils import timezone
 from apps.users.models import User
 
@@ -80,6 +81,10 @@ class Judge(models.Model):
     class Meta:
         db_table = 'judges'
         ordering = ['name']
+        indexes = [
+            # Case-insensitive lookups by bar id (the case importer).
+            models.Index(Lower('bar_id'), name='judges_bar_id_ci_idx'),
+        ]
     
     def __str__(self):
         return f"Judge {self.name}"        
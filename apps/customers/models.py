@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models.functions import Lower
 from apps.users.models import User
 class Customer(models.Model):
     user=models.OneToOneField(User, on_delete=models.CASCADE, related_name='customer_profile')
@@ -40,6 +41,11 @@ class Customer(models.Model):
     class Meta:
         db_table = 'customers'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['updated_at']),
+            # Case-insensitive lookups by customer id (the case importer).
+            models.Index(Lower('customer_id'), name='customers_customer_id_ci_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.get_full_name()} ({self.customer_id})"
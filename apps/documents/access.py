@@ -0,0 +1,36 @@
+"""
+Which case and user documents a user may see.
+
+Case documents follow their case (`apps.cases.access.visible_cases`),
+and within it `apps.cases.access.case_document_filter`: customers see
+only documents shared with them that are not confidential, and
+confidential documents are further limited to staff, the case's
+assigned lawyer and team, and their uploader. User documents are
+visible to their uploader, and to everyone when public. Employee
+documents are visible to staff and to the employee.
+"""
+from django.db.models import Q
+
+from apps.cases.access import case_document_filter, visible_cases
+from apps.cases.models import CaseDocument
+from apps.employees.models import EmployeeDocument
+from .models import UploadedDocument
+
+
+def visible_case_documents(user):
+    if user.is_staff:
+        return CaseDocument.objects.all()
+    documents = CaseDocument.objects.filter(case__in=visible_cases(user).values('id'))
+    return documents.filter(case_document_filter(user))
+
+
+def visible_uploaded_documents(user):
+    if user.is_staff:
+        return UploadedDocument.objects.all()
+    return UploadedDocument.objects.filter(Q(is_public=True) | Q(uploaded_by=user))
+
+
+def visible_employee_documents(user):
+    if user.is_staff:
+        return EmployeeDocument.objects.all()
+    return EmployeeDocument.objects.filter(employee__user=user)
@@ -0,0 +1,161 @@
+"""
+Compression of stored document files, in pure Python.
+
+`choose()` decides whether a file is worth compressing: files under
+MIN_SIZE, and files whose first bytes mark an already compressed format
+(JPEG, PNG, ZIP-based office documents, archives, media), stay as they
+are; anything else is sampled, and compressed only if a fast zlib pass
+over the first SAMPLE_SIZE bytes saves at least MIN_SAVING. Scanned PDFs
+with uncompressed or lightly filtered images and text-heavy filings pass;
+JPEG scans do not. Compressible files get zstd when the zstandard package
+is installed, as it decompresses several times faster than gzip for the
+same ratio, and gzip from the standard library otherwise.
+
+Reading never needs the whole file: `open_decoded()` streams the
+decompressed bytes and can skip forward, which is all a Range request
+needs, and `decoded_path()` gives code that must have a real file
+(zipfile, pypdf, Pillow) a temporary decompressed copy. Like
+`extraction`, this module does not touch Django, so workers can use it.
+"""
+import gzip
+import io
+import os
+import shutil
+import tempfile
+import zlib
+from contextlib import contextmanager
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional
+    zstandard = None
+
+GZIP = 'gzip'
+ZSTD = 'zstd'
+CODECS = (GZIP, ZSTD)
+# Added to the blob's file name, so a blob's encoded and plain files never
+# share a path.
+SUFFIXES = {'': '', GZIP: '.gz', ZSTD: '.zst'}
+
+BLOCK_SIZE = 1024 * 1024
+SAMPLE_SIZE = 256 * 1024
+MIN_SIZE = 4096
+MIN_SAVING = 0.1
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 6
+
+COMPRESSED_SIGNATURES = (
+    b'\xff\xd8\xff',  # JPEG
+    b'\x89PNG',
+    b'GIF8',
+    b'PK\x03\x04',  # ZIP, DOCX, XLSX, ODT
+    b'\x1f\x8b',  # gzip
+    b'\x28\xb5\x2f\xfd',  # zstd
+    b'BZh',
+    b'\xfd7zXZ\x00',
+    b'7z\xbc\xaf\x27\x1c',
+    b'Rar!',
+    b'RIFF',  # WebP, WAV, AVI
+    b'ID3',  # MP3
+)
+
+
+def default_codec():
+    return ZSTD if zstandard is not None else GZIP
+
+
+def available(codec):
+    return codec == GZIP or (codec == ZSTD and zstandard is not None)
+
+
+def choose(path, codec=None):
+    """The codec to store the file at `path` with, or '' to keep it as it is."""
+    if os.path.getsize(path) < MIN_SIZE:
+        return ''
+    with open(path, 'rb') as fh:
+        sample = fh.read(SAMPLE_SIZE)
+    if sample.startswith(COMPRESSED_SIGNATURES) or sample[4:8] == b'ftyp':  # MP4, MOV, HEIC
+        return ''
+    if len(zlib.compress(sample, 1)) > len(sample) * (1 - MIN_SAVING):
+        return ''
+    return codec or default_codec()
+
+
+def compress_file(source, target, codec):
+    """Write `source` compressed with `codec` to `target`; returns the bytes written."""
+    with open(source, 'rb') as src, open(target, 'wb') as dst:
+        if codec == ZSTD:
+            compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL)
+            compressor.copy_stream(src, dst, size=os.path.getsize(source), read_size=BLOCK_SIZE)
+        elif codec == GZIP:
+            # mtime=0: the same content always compresses to the same bytes.
+            with gzip.GzipFile(fileobj=dst, mode='wb', compresslevel=GZIP_LEVEL, mtime=0) as out:
+                shutil.copyfileobj(src, out, BLOCK_SIZE)
+        else:
+            raise ValueError(f"Unknown codec {codec!r}")
+    return os.path.getsize(target)
+
+
+class DecodedFile(io.RawIOBase):
+    """
+    The decompressed content of a stored file, read front to back. It
+    has no fileno(), so servers cannot sendfile the compressed bytes by
+    mistake, and seek() only skips forward.
+    """
+
+    def __init__(self, path, codec):
+        if codec == GZIP:
+            self.raw = gzip.GzipFile(path, 'rb')
+        elif codec == ZSTD:
+            if zstandard is None:
+                raise RuntimeError(f"{path} is zstd-compressed but zstandard is not installed")
+            self.raw = zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+        else:
+            raise ValueError(f"Unknown codec {codec!r}")
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.raw.read(len(buffer))
+        buffer[:len(data)] = data
+        self.position += len(data)
+        return len(data)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        target = offset if whence == io.SEEK_SET else self.position + offset
+        if whence not in (io.SEEK_SET, io.SEEK_CUR) or target < self.position:
+            raise io.UnsupportedOperation("compressed files only seek forward")
+        while self.position < target:
+            if not self.read(min(BLOCK_SIZE, target - self.position)):
+                break
+        return self.position
+
+    def tell(self):
+        return self.position
+
+    def close(self):
+        if not self.closed:
+            self.raw.close()
+        super().close()
+
+
+def open_decoded(path, codec):
+    """A readable binary file of the content at `path`, decompressing `codec` ('' for none)."""
+    return DecodedFile(path, codec) if codec else open(path, 'rb')
+
+
+@contextmanager
+def decoded_path(path, codec):
+    """`path` itself, or for a compressed file a temporary decompressed copy, while the block runs."""
+    if not codec:
+        yield path
+        return
+    fd, temp = tempfile.mkstemp(prefix='decoded-')
+    try:
+        with os.fdopen(fd, 'wb') as out, DecodedFile(path, codec) as fh:
+            shutil.copyfileobj(fh, out, BLOCK_SIZE)
+        yield temp
+    finally:
+        os.remove(temp)
@@ -0,0 +1,169 @@
+"""
+Protected document downloads.
+
+The view checks access and conditional headers, then gets the bytes out
+of the Python worker one of three ways (settings.DOCUMENT_DOWNLOAD_BACKEND):
+
+- 'x-accel': an empty response whose X-Accel-Redirect names the file
+  under DOCUMENT_X_ACCEL_PREFIX, an `internal` nginx location aliased to
+  the media root; nginx serves the body and any Range itself.
+- 'x-sendfile': the same with X-Sendfile and the absolute path, for
+  Apache mod_xsendfile or lighttpd.
+- 'python' (default): a FileResponse over the open file. Under a server
+  with wsgi.file_wrapper (gunicorn) the body goes out with os.sendfile
+  from the file's current offset for Content-Length bytes, so a range is
+  served by seeking to its start; `FileRange` also bounds plain reads for
+  servers without it.
+
+Blobs stored compressed are always streamed by the Python worker,
+decompressing on the fly (the web server would send the stored bytes),
+and a range is served by decompressing up to its start.
+
+ETags are the blob's SHA-256, known without reading the file; files not
+yet in the blob store get one from their size and mtime. If-None-Match
+answers 304, and a single `bytes=` range (honouring If-Range) answers 206
+or 416. Several ranges get the whole file, as RFC 9110 allows.
+"""
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse
+from django.utils.http import content_disposition_header
+
+from apps.cases.models import CaseDocument
+from apps.employees.models import EmployeeDocument
+from . import access, compression
+from .storage import local_file
+from .models import UploadedDocument
+
+# Kind in the URL -> (model, documents the user may download).
+KINDS = {
+    'case_document': (CaseDocument, access.visible_case_documents),
+    'uploaded_document': (UploadedDocument, access.visible_uploaded_documents),
+    'employee_document': (EmployeeDocument, access.visible_employee_documents),
+}
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class FileRange:
+    """`length` bytes of an open file from `start`, read-bounded but still sendfile-able."""
+
+    def __init__(self, fh, start, length):
+        fh.seek(start)
+        self.fh = fh
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.fh.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.fh.fileno()
+
+    def close(self):
+        self.fh.close()
+
+
+def locate(document):
+    """(absolute path, codec, original size, ETag) of a document's file, or None if it is missing."""
+    content = local_file(document.file.storage, document.file.name)
+    if not os.path.exists(content.path):
+        return None
+    if content.sha256:
+        return content.path, content.encoding, content.size, f'"{content.sha256}"'
+    stat = os.stat(content.path)
+    return content.path, '', stat.st_size, f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+
+
+def etag_matches(header, etag):
+    """Weak comparison of If-None-Match against `etag`."""
+    if header.strip() == '*':
+        return True
+    tags = [tag.strip() for tag in header.split(',')]
+    return any(tag.removeprefix('W/') == etag for tag in tags)
+
+
+def parse_range(header, size):
+    """
+    (start, end) of a single satisfiable range, None to send the whole
+    file, or 'unsatisfiable'.
+    """
+    match = RANGE_RE.match(header.replace(' ', ''))
+    if match is None:
+        return None  # malformed or several ranges: ignore
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        length = int(last)
+        if length == 0 or size == 0:
+            return 'unsatisfiable'
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or (last and int(last) < start):
+        return 'unsatisfiable'
+    return start, end
+
+
+def serve(request, document, as_attachment=True):
+    located = locate(document)
+    if located is None:
+        return None
+    path, encoding, size, etag = located
+    filename = os.path.basename(document.file.name)
+    headers = {
+        'ETag': etag,
+        'Accept-Ranges': 'bytes',
+        'Cache-Control': 'private, no-cache',
+        'Content-Type': mimetypes.guess_type(filename)[0] or 'application/octet-stream',
+        'Content-Disposition': content_disposition_header(as_attachment, filename),
+    }
+
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match and etag_matches(if_none_match, etag):
+        response = HttpResponse(status=304)
+        for name in ('ETag', 'Cache-Control'):
+            response[name] = headers[name]
+        return response
+
+    backend = getattr(settings, 'DOCUMENT_DOWNLOAD_BACKEND', 'python')
+    if backend in ('x-accel', 'x-sendfile') and not encoding:
+        response = HttpResponse()
+        for name, value in headers.items():
+            response[name] = value
+        if backend == 'x-accel':
+            relative = os.path.relpath(path, document.file.storage.location).replace(os.sep, '/')
+            response['X-Accel-Redirect'] = getattr(settings, 'DOCUMENT_X_ACCEL_PREFIX', '/protected-media/') + relative
+        else:
+            response['X-Sendfile'] = path
+        return response
+
+    byte_range = None
+    if request.headers.get('Range') and request.headers.get('If-Range', etag) == etag:
+        byte_range = parse_range(request.headers['Range'], size)
+    if byte_range == 'unsatisfiable':
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    fh = compression.open_decoded(path, encoding)
+    if byte_range is None:
+        # A decoded file has no fileno() to sendfile from, and FileRange
+        # keeps FileResponse from seeking to its end to measure it.
+        response = FileResponse(FileRange(fh, 0, size) if encoding else fh)
+        response['Content-Length'] = str(size)
+    else:
+        start, end = byte_range
+        response = FileResponse(FileRange(fh, start, end - start + 1), status=206)
+        response['Content-Length'] = str(end - start + 1)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    for name, value in headers.items():
+        response[name] = value
+    return response
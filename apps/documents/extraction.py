@@ -0,0 +1,226 @@
+"""
+Plain-text extraction from document files, in pure Python.
+
+This module does not touch Django, so `extract()` can run in worker
+processes. Plain text is decoded as UTF-8 (falling back to cp1252), DOCX
+is read from its word/*.xml parts with zipfile and ElementTree, and PDF
+goes through pypdf when it is installed, or else through a small reader
+for the text-showing operators of Flate-compressed content streams that
+copes with the PDFs most scanners and word processors write. Text is cut
+at MAX_TEXT_CHARS, and the markup it is read from at MAX_MARKUP_BYTES,
+however far a file's compressed parts would inflate. Files stored
+compressed are read from a temporary decompressed copy.
+"""
+import re
+import zipfile
+import zlib
+from xml.etree import ElementTree
+
+from . import compression
+
+try:
+    import pypdf
+except ImportError:  # pragma: no cover - optional
+    pypdf = None
+
+MAX_FILE_BYTES = 100 * 1024 * 1024
+MAX_TEXT_CHARS = 1_000_000
+# Markup (PDF content streams, DOCX XML) is inflated and parsed up to this
+# many bytes in all; a few bytes of zlib can decompress to gigabytes.
+MAX_MARKUP_BYTES = 32 * MAX_TEXT_CHARS
+
+TEXT_TYPES = ('txt', 'text', 'csv', 'md', 'log')
+
+# Extraction outcomes, as stored in DocumentText.status.
+DONE = 'done'
+UNSUPPORTED = 'unsupported'
+FAILED = 'failed'
+
+
+def sniff(path, file_type=''):
+    """'pdf', 'docx', 'txt' or None, from the extension and the first bytes."""
+    file_type = (file_type or '').lower()
+    with open(path, 'rb') as fh:
+        head = fh.read(8)
+    if head.startswith(b'%PDF'):
+        return 'pdf'
+    if head.startswith(b'PK\x03\x04'):
+        try:
+            with zipfile.ZipFile(path) as archive:
+                return 'docx' if 'word/document.xml' in archive.namelist() else None
+        except zipfile.BadZipFile:
+            return None
+    if file_type in TEXT_TYPES:
+        return 'txt'
+    return None
+
+
+def extract(path, file_type='', encoding=''):
+    """
+    (status, text, error) for the file at `path`, compressed with
+    `encoding` if not ''. Never raises: a file that cannot be parsed
+    comes back FAILED with the reason.
+    """
+    try:
+        with compression.decoded_path(path, encoding) as path:
+            kind = sniff(path, file_type)
+            if kind is None:
+                return UNSUPPORTED, '', ''
+            with open(path, 'rb') as fh:
+                fh.seek(0, 2)
+                if fh.tell() > MAX_FILE_BYTES:
+                    return UNSUPPORTED, '', f'larger than {MAX_FILE_BYTES} bytes'
+            text = {'pdf': pdf_text, 'docx': docx_text, 'txt': plain_text}[kind](path)
+        return DONE, normalize_whitespace(text)[:MAX_TEXT_CHARS], ''
+    except Exception as exc:  # corrupt or hostile files must not kill the worker
+        return FAILED, '', f'{type(exc).__name__}: {exc}'[:500]
+
+
+def normalize_whitespace(text):
+    text = text.replace('\x00', '')
+    text = re.sub(r'[ \t\r\f\v]+', ' ', text)
+    return re.sub(r'\n\s*\n+', '\n\n', text).strip()
+
+
+def plain_text(path):
+    with open(path, 'rb') as fh:
+        data = fh.read(MAX_TEXT_CHARS * 4)
+    try:
+        return data.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        return data.decode('cp1252', errors='replace')
+
+
+# -- DOCX -----------------------------------------------------------------
+
+W = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+DOCX_PARTS = re.compile(r'^word/(document|header\d*|footer\d*|footnotes|endnotes)\.xml$')
+
+
+def docx_text(path):
+    parts = []
+    with zipfile.ZipFile(path) as archive:
+        names = sorted(name for name in archive.namelist() if DOCX_PARTS.match(name))
+        # The body first, then headers, footers and notes.
+        names.sort(key=lambda name: name != 'word/document.xml')
+        budget = MAX_MARKUP_BYTES
+        for name in names:
+            # zipfile stops reading a member at its file_size, so this bounds the parse.
+            size = archive.getinfo(name).file_size
+            if size > budget:
+                break
+            budget -= size
+            with archive.open(name) as fh:
+                parts.append(_docx_part(fh))
+    return '\n\n'.join(part for part in parts if part)
+
+
+def _docx_part(fh):
+    out = []
+    for event, element in ElementTree.iterparse(fh, events=('end',)):
+        tag = element.tag
+        if tag == W + 't':
+            out.append(element.text or '')
+        elif tag == W + 'tab':
+            out.append('\t')
+        elif tag in (W + 'br', W + 'cr'):
+            out.append('\n')
+        elif tag == W + 'p':
+            out.append('\n')
+            element.clear()
+    return ''.join(out)
+
+
+# -- PDF ------------------------------------------------------------------
+
+def pdf_text(path):
+    if pypdf is not None:
+        reader = pypdf.PdfReader(path)
+        return '\n\n'.join(page.extract_text() or '' for page in reader.pages)
+    with open(path, 'rb') as fh:
+        return _pdf_text_fallback(fh.read())
+
+
+STREAM_RE = re.compile(rb'<<(.*?)>>\s*stream\r?\n(.*?)\r?\n?endstream', re.S)
+# A string operand, a TJ array, or an operator that moves to a new line.
+PDF_TOKEN_RE = re.compile(
+    rb'\((?:\\.|[^\\)])*\)\s*(?:Tj|\'|")'
+    rb'|\[(?:\\.|[^\]\\])*\]\s*TJ'
+    rb'|<[0-9A-Fa-f\s]*>\s*Tj'
+    rb'|\bT\*|\bTd\b|\bTD\b|\bET\b',
+    re.S,
+)
+PDF_STRING_RE = re.compile(rb'\((?:\\.|[^\\)])*\)|<[0-9A-Fa-f\s]*>|-?\d+(?:\.\d+)?', re.S)
+PDF_ESCAPES = {b'n': b'\n', b'r': b'\r', b't': b'\t', b'b': b'\b', b'f': b'\f'}
+
+
+def _pdf_literal(token):
+    body, out, i = token[1:-1], bytearray(), 0
+    while i < len(body):
+        ch = body[i:i + 1]
+        if ch != b'\\':
+            out += ch
+            i += 1
+            continue
+        nxt = body[i + 1:i + 2]
+        octal = re.match(rb'[0-7]{1,3}', body[i + 1:i + 4])
+        if octal:
+            out.append(int(octal.group(), 8) & 0xFF)
+            i += 1 + len(octal.group())
+        elif nxt in (b'\r', b'\n'):
+            i += 2  # line continuation
+        else:
+            out += PDF_ESCAPES.get(nxt, nxt)
+            i += 2
+    return out.decode('latin-1')
+
+
+def _pdf_hex(token):
+    digits = re.sub(rb'\s', b'', token[1:-1])
+    data = bytes.fromhex((digits + b'0' * (len(digits) % 2)).decode())
+    if len(data) > 1 and data[0] == 0:  # two-byte codes, usually Unicode in simple fonts
+        return data.decode('utf-16-be', errors='ignore')
+    return data.decode('latin-1')
+
+
+def _pdf_content_text(content):
+    out = []
+    for match in PDF_TOKEN_RE.finditer(content):
+        token = match.group()
+        if token.startswith((b'(', b'<')):
+            operand = PDF_STRING_RE.match(token).group()
+            if token.rstrip().endswith((b"'", b'"')):
+                out.append('\n')
+            out.append(_pdf_literal(operand) if operand.startswith(b'(') else _pdf_hex(operand))
+        elif token.startswith(b'['):
+            for part in PDF_STRING_RE.findall(token):
+                if part.startswith(b'('):
+                    out.append(_pdf_literal(part))
+                elif part.startswith(b'<'):
+                    out.append(_pdf_hex(part))
+                elif float(part) < -200:  # a kerning gap wide enough to be a space
+                    out.append(' ')
+        else:
+            out.append('\n')
+    return ''.join(out)
+
+
+def _pdf_text_fallback(data):
+    pages = []
+    budget = MAX_MARKUP_BYTES
+    for dictionary, stream in STREAM_RE.findall(data):
+        if budget <= 0:
+            break
+        if b'/Image' in dictionary or b'/XRef' in dictionary or b'/ObjStm' in dictionary:
+            continue
+        if b'/FlateDecode' in dictionary:
+            try:
+                stream = zlib.decompressobj().decompress(stream, budget)
+            except zlib.error:
+                continue
+        elif b'/Filter' in dictionary:
+            continue
+        budget -= len(stream)
+        if b'BT' in stream:
+            pages.append(_pdf_content_text(stream))
+    return '\n\n'.join(pages)
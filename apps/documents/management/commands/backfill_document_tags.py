@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from apps.documents import tags
+
+
+class Command(BaseCommand):
+    help = "Parse the tags strings of user documents into normalized tag relations, in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=tags.BATCH_SIZE)
+        parser.add_argument('--dry-run', action='store_true', help="Only report what would change")
+
+    def handle(self, *args, **options):
+        stats = tags.backfill(batch_size=options['batch_size'], dry_run=options['dry_run'])
+        add, remove = ("Would add", "remove") if options['dry_run'] else ("Added", "removed")
+        self.stdout.write(self.style.SUCCESS(
+            f"{add} {stats['added']} and {remove} {stats['removed']} tag relation(s) "
+            f"across {stats['documents']} document(s)"
+        ))
@@ -0,0 +1,124 @@
+import os
+import random
+import shutil
+import struct
+import tempfile
+import time
+import zlib
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import override_settings
+
+from apps.documents import previews, rendering, work_queue
+from apps.documents.models import DocumentPreview, UploadedDocument
+from apps.documents.storage import document_storage
+
+
+def png(width, height, rng):
+    """A gradient PNG, different for every seed, written with zlib alone."""
+    red, green, blue = (rng.randrange(256) for _ in range(3))
+    template = b''.join(bytes(((red + x) % 256, green, (blue + x // 2) % 256)) for x in range(width))
+    # Rotate the row by a pixel per line, so the image is not one repeated row.
+    rows = b''.join(
+        b'\x00' + template[3 * (y % width):] + template[:3 * (y % width)] for y in range(height)
+    )
+
+    def chunk(tag, data):
+        return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data))
+
+    header = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    return b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header) + chunk(b'IDAT', zlib.compress(rows, 1)) + chunk(b'IEND', b'')
+
+
+def pdf(text):
+    """A one-page PDF showing `text`, with a valid cross-reference table."""
+    content = f'BT /F1 24 Tf 72 720 Td ({text}) Tj ET'.encode()
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        b'<< /Type /Pages /Kids [3 0 R] /Count 1 >>',
+        b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R '
+        b'/Resources << /Font << /F1 5 0 R >> >> >>',
+        b'<< /Length %d >>\nstream\n' % len(content) + content + b'\nendstream',
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>',
+    ]
+    out, offsets = bytearray(b'%PDF-1.4\n'), []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b'%d 0 obj\n' % number + body + b'\nendobj\n'
+    xref = len(out)
+    out += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    for offset in offsets:
+        out += b'%010d 00000 n \n' % offset
+    out += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+class Command(BaseCommand):
+    help = "Measure preview rendering throughput over a backlog of synthetic images and PDFs, cold and cached"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--files', type=int, default=10_000)
+        parser.add_argument('--pdf-share', type=float, default=0.2, help="Fraction of the files that are PDFs")
+        parser.add_argument('--image-size', type=int, default=640, help="Width of the synthetic images")
+        parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: CPU count)")
+        parser.add_argument('--batch-size', type=int, default=200)
+
+    def handle(self, *args, **options):
+        renderers = [name for name, present in (
+            ('Pillow', rendering.Image is not None),
+            ('pypdfium2', rendering.pdfium is not None),
+            ('pdftoppm', rendering.PDFTOPPM is not None),
+        ) if present]
+        self.stdout.write(f"renderers: {', '.join(renderers) or 'none (everything will be unsupported)'}")
+        media_root = tempfile.mkdtemp(prefix='bench-previews-')
+        try:
+            with override_settings(MEDIA_ROOT=media_root), transaction.atomic():
+                ids = self.seed(options)
+                rows = DocumentPreview.objects.filter(kind='uploaded_document', document_id__in=ids)
+                with work_queue.make_pool(options['workers']) as pool:
+                    self.run('cold', pool, rows, options)
+                    rows.update(status='pending', attempts=0, claimed_at=None)
+                    self.run('cached', pool, rows, options)
+                transaction.set_rollback(True)
+        finally:
+            shutil.rmtree(media_root, ignore_errors=True)
+
+    def seed(self, options):
+        rng = random.Random(0)
+        storage = document_storage()
+        width = options['image_size']
+        height = width * 3 // 4
+        started = time.perf_counter()
+        documents = []
+        for i in range(options['files']):
+            if rng.random() < options['pdf_share']:
+                name, data = f'documents/bench/{i}.pdf', pdf(f'Benchmark document {i} {rng.random()}')
+            else:
+                name, data = f'documents/bench/{i}.png', png(width, height, rng)
+            fd, temp = storage._temp_file()
+            with os.fdopen(fd, 'wb') as fh:
+                fh.write(data)
+            name = storage.adopt(name, temp)
+            documents.append(UploadedDocument(
+                title=f'Bench {i}', file=name, file_size=len(data), file_type=name.rsplit('.', 1)[1],
+            ))
+        documents = UploadedDocument.objects.bulk_create(documents, batch_size=1000)
+        DocumentPreview.objects.bulk_create([
+            DocumentPreview(kind='uploaded_document', document_id=document.pk, file=document.file.name)
+            for document in documents
+        ], batch_size=1000)
+        self.stdout.write(f"seeded {len(documents)} files in {time.perf_counter() - started:.1f}s")
+        return [document.pk for document in documents]
+
+    def run(self, label, pool, rows, options):
+        started = time.perf_counter()
+        totals = {}
+        while rows.filter(status='pending').exists():
+            for status, count in previews.run_batch(pool, options['batch_size']).items():
+                totals[status] = totals.get(status, 0) + count
+        elapsed = time.perf_counter() - started
+        summary = ', '.join(f"{count} {status}" for status, count in sorted(totals.items()))
+        self.stdout.write(
+            f"{label}: {summary} in {elapsed:.1f}s ({sum(totals.values()) / max(elapsed, 1e-9):.0f} files/s)"
+        )
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from apps.documents import storage
+
+
+class Command(BaseCommand):
+    help = "Move existing document files into the content-addressed blob store, sharing duplicates"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Only hash the files and report the savings")
+
+    def handle(self, *args, **options):
+        stats = storage.dedupe_existing(dry_run=options['dry_run'])
+        verb = "Would move" if options['dry_run'] else "Moved"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {stats['files']} file(s), {stats['duplicates']} of them duplicates "
+            f"({stats['bytes_saved']} bytes saved); {stats['missing']} missing on disk"
+        ))
@@ -0,0 +1,52 @@
+import time
+from concurrent.futures.process import BrokenProcessPool
+
+from django.core.management.base import BaseCommand
+
+from apps.documents import text_index, work_queue
+
+
+class Command(BaseCommand):
+    help = "Extract the text of queued case and user documents in a process pool and index it"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: CPU count)")
+        parser.add_argument('--batch-size', type=int, default=text_index.BATCH_SIZE)
+        parser.add_argument('--backfill', action='store_true', help="First queue documents never extracted")
+        parser.add_argument('--rebuild-index', action='store_true', help="Re-index all extracted text and exit")
+        parser.add_argument('--loop', action='store_true', help="Keep running, polling every --interval seconds")
+        parser.add_argument('--interval', type=float, default=30)
+
+    def handle(self, *args, **options):
+        if options['rebuild_index']:
+            text_index.rebuild()
+            self.stdout.write(self.style.SUCCESS("Rebuilt the document text index"))
+            return
+        if options['backfill']:
+            self.stdout.write(f"queued {text_index.queue_missing()} document(s)")
+        pool = work_queue.make_pool(options['workers'])
+        try:
+            while True:
+                started = time.perf_counter()
+                totals = {}
+                while True:
+                    try:
+                        counts = text_index.run_batch(pool, options['batch_size'])
+                    except BrokenProcessPool:
+                        # Its rows were requeued; carry on with a fresh pool.
+                        self.stderr.write("an extraction worker died; restarting the pool")
+                        pool.shutdown(wait=False, cancel_futures=True)
+                        pool = work_queue.make_pool(options['workers'])
+                        continue
+                    if not counts:
+                        break
+                    for status, count in counts.items():
+                        totals[status] = totals.get(status, 0) + count
+                if totals or not options['loop']:
+                    summary = ', '.join(f"{count} {status}" for status, count in sorted(totals.items())) or 'nothing'
+                    self.stdout.write(f"extracted {summary} in {time.perf_counter() - started:.1f}s")
+                if not options['loop']:
+                    break
+                time.sleep(options['interval'])
+        finally:
+            pool.shutdown()
@@ -0,0 +1,25 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from apps.documents import previews, storage
+
+
+class Command(BaseCommand):
+    help = "Delete document file names no row refers to, unreferenced blobs, stray blob files and orphaned previews"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-hours', type=float, default=storage.GC_GRACE.total_seconds() / 3600,
+                            help="Leave anything younger than this alone")
+        parser.add_argument('--dry-run', action='store_true', help="Report what would be deleted")
+
+    def handle(self, *args, **options):
+        grace = timedelta(hours=options['grace_hours'])
+        stats = storage.collect_garbage(grace=grace, dry_run=options['dry_run'])
+        pruned = previews.prune(grace=grace, dry_run=options['dry_run'])
+        verb = "Would delete" if options['dry_run'] else "Deleted"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {stats['names']} orphaned name(s), {stats['blobs']} blob(s), "
+            f"{stats['stray_files']} stray file(s) and {pruned['previews']} preview(s); "
+            f"{stats['bytes'] + pruned['bytes']} bytes"
+        ))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from apps.documents import uploads
+
+
+class Command(BaseCommand):
+    help = "Delete expired upload sessions and the partial files of abandoned ones"
+
+    def handle(self, *args, **options):
+        purged = uploads.purge_expired()
+        self.stdout.write(self.style.SUCCESS(f"Purged {purged} expired upload session(s)"))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.documents import compression, storage
+
+
+class Command(BaseCommand):
+    help = "Compress the compressible document blobs already stored, or convert them to another codec"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--codec', choices=['auto', *compression.CODECS, 'none'], default='auto',
+            help="auto: compress plain blobs with the storage's codec; gzip/zstd: also convert blobs in the "
+                 "other codec; none: decompress every blob",
+        )
+        parser.add_argument('--batch-size', type=int, default=storage.RECOMPRESS_BATCH_SIZE)
+        parser.add_argument('--dry-run', action='store_true', help="Only count the blobs that would change")
+
+    def handle(self, *args, **options):
+        codec = {'auto': None, 'none': ''}.get(options['codec'], options['codec'])
+        if codec and not compression.available(codec):
+            raise CommandError(f"{codec} is not available; install the zstandard package")
+        stats = storage.recompress(codec=codec, batch_size=options['batch_size'], dry_run=options['dry_run'])
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(
+                f"Would convert {stats['blobs']} blob(s); {stats['skipped']} left as they are, "
+                f"{stats['missing']} missing on disk"
+            ))
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f"Converted {stats['blobs']} blob(s), saving {stats['bytes_saved']} bytes; "
+            f"{stats['skipped']} left as they are, {stats['missing']} missing on disk. "
+            "The old files go with the next gc_document_blobs after its grace period."
+        ))
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.documents import quota
+
+
+class Command(BaseCommand):
+    help = "Recompute User.storage_used from document file sizes and open uploads and report drift"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Report drift without correcting it")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        drift = quota.reconcile(fix=not options['dry_run'])
+        for user_id, stored, expected in drift:
+            self.stdout.write(f"user {user_id}: {stored} -> {expected}")
+        elapsed = time.perf_counter() - started
+        if not drift:
+            self.stdout.write(self.style.SUCCESS(f"Storage usage is consistent ({elapsed:.1f}s)"))
+        elif options['dry_run']:
+            self.stdout.write(self.style.WARNING(f"{len(drift)} user(s) drifted; run without --dry-run to fix"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Fixed {len(drift)} user(s) in {elapsed:.1f}s"))
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.7 on 2026-10-18 06:40
+
+import apps.documents.storage
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0003_upload_sessions'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='uploadeddocument',
+            name='file',
+            field=models.FileField(storage=apps.documents.storage.document_storage, upload_to='documents/%Y/%m/'),
+        ),
+        migrations.AlterField(
+            model_name='uploadsession',
+            name='path',
+            field=models.CharField(blank=True, max_length=500),
+        ),
+        migrations.CreateModel(
+            name='Blob',
+            fields=[
+                ('sha256', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('size', models.BigIntegerField()),
+                ('ref_count', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'storage_blobs',
+                'indexes': [models.Index(condition=models.Q(('ref_count', 0)), fields=['updated_at'], name='storage_blobs_unreferenced_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='StoredFile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('blob', models.ForeignKey(db_column='sha256', on_delete=django.db.models.deletion.PROTECT, related_name='files', to='documents.blob')),
+            ],
+            options={
+                'db_table': 'storage_files',
+            },
+        ),
+    ]
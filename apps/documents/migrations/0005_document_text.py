@@ -0,0 +1,56 @@
+# Generated by Django 5.2.7 on 2026-10-18 06:43
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def create_fts_table(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('pragma compile_options')
+        if not any(row[0] == 'ENABLE_FTS5' for row in cursor.fetchall()):
+            return
+        cursor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS document_text_fts USING fts5("
+            "title, content, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+        )
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS document_text_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0004_blob_storage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentText',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('case_document', 'Case document'), ('uploaded_document', 'User document')], max_length=20)),
+                ('document_id', models.BigIntegerField()),
+                ('file', models.CharField(max_length=255)),
+                ('sha256', models.CharField(blank=True, db_index=True, max_length=64)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('done', 'Done'), ('unsupported', 'Unsupported'), ('failed', 'Failed')], default='pending', max_length=12)),
+                ('text', models.TextField(blank=True)),
+                ('error', models.CharField(blank=True, max_length=500)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('queued_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('claimed_at', models.DateTimeField(blank=True, null=True)),
+                ('extracted_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'document_texts',
+                'indexes': [models.Index(condition=models.Q(('status', 'pending')), fields=['queued_at', 'id'], name='document_texts_pending_idx')],
+                'constraints': [models.UniqueConstraint(fields=('kind', 'document_id'), name='document_texts_document_uniq')],
+            },
+        ),
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
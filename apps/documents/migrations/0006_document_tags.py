@@ -0,0 +1,60 @@
+# Generated by Django 5.2.7 on 2026-10-18 06:47
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0005_document_text'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentTag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50)),
+                ('key', models.CharField(max_length=50, unique=True)),
+                ('document_count', models.IntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'document_tags',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='DocumentTagRelation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+            ],
+            options={
+                'db_table': 'document_tag_relations',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='uploadeddocument',
+            index=models.Index(fields=['category', '-uploaded_at'], name='uploaded_docs_category_idx'),
+        ),
+        migrations.AddField(
+            model_name='documenttagrelation',
+            name='document',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tag_relations', to='documents.uploadeddocument'),
+        ),
+        migrations.AddField(
+            model_name='documenttagrelation',
+            name='tag',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='document_relations', to='documents.documenttag'),
+        ),
+        migrations.AddIndex(
+            model_name='documenttagrelation',
+            index=models.Index(fields=['tag', 'document'], name='document_tag_rel_tag_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='documenttagrelation',
+            unique_together={('document', 'tag')},
+        ),
+    ]
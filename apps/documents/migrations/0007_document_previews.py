@@ -0,0 +1,36 @@
+# Generated by Django 5.2.7 on 2026-10-18 06:49
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0006_document_tags'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentPreview',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('case_document', 'Case document'), ('uploaded_document', 'User document')], max_length=20)),
+                ('document_id', models.BigIntegerField()),
+                ('file', models.CharField(max_length=255)),
+                ('sha256', models.CharField(blank=True, max_length=64)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('done', 'Done'), ('unsupported', 'Unsupported'), ('failed', 'Failed')], default='pending', max_length=12)),
+                ('preview', models.CharField(blank=True, max_length=255)),
+                ('error', models.CharField(blank=True, max_length=500)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('queued_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('claimed_at', models.DateTimeField(blank=True, null=True)),
+                ('rendered_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'document_previews',
+                'indexes': [models.Index(condition=models.Q(('status', 'pending')), fields=['queued_at', 'id'], name='document_previews_pending_idx')],
+                'constraints': [models.UniqueConstraint(fields=('kind', 'document_id'), name='document_previews_document_uniq')],
+            },
+        ),
+    ]
@@ -1,10 +1,14 @@
+import uuid
+
 from django.db import models
+from django.utils import timezone
 from apps.users.models import User
+from .storage import document_storage
 
 class UploadedDocument(models.Model):
     uploaded_by=models.ForeignKey(User,on_delete=models.SET_NULL,null=True)
     title = models.CharField(max_length=200)
-    file = models.FileField(upload_to='documents/%Y/%m/')
+    file = models.FileField(upload_to='documents/%Y/%m/', storage=document_storage)
     file_size = models.BigIntegerField(default=0)
     file_type = models.CharField(max_length=50, blank=True)
     description = models.TextField(blank=True)
@@ -17,6 +21,211 @@ class UploadedDocument(models.Model):
     class Meta:
         db_table = 'uploaded_documents'
         ordering = ['-uploaded_at']
+        indexes = [
+            models.Index(fields=['category', '-uploaded_at'], name='uploaded_docs_category_idx'),
+        ]
     
     def __str__(self):
         return self.title
+
+
+class DocumentTag(models.Model):
+    """A tag on user documents, parsed out of UploadedDocument.tags"""
+    name = models.CharField(max_length=50)
+    # Case-folded name: tags are unique by it, and autocomplete scans its
+    # index by prefix.
+    key = models.CharField(max_length=50, unique=True)
+    # Documents carrying the tag (see apps.documents.tags); ranks autocomplete.
+    document_count = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'document_tags'
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
+
+
+class DocumentTagRelation(models.Model):
+    """Many-to-many relationship between user documents and tags"""
+    document = models.ForeignKey(UploadedDocument, on_delete=models.CASCADE, related_name='tag_relations')
+    tag = models.ForeignKey(DocumentTag, on_delete=models.CASCADE, related_name='document_relations')
+
+    class Meta:
+        db_table = 'document_tag_relations'
+        unique_together = ['document', 'tag']
+        indexes = [
+            # Tag filters go from the tag to its documents.
+            models.Index(fields=['tag', 'document'], name='document_tag_rel_tag_idx'),
+        ]
+
+
+class Blob(models.Model):
+    """One stored file content, shared by every name that holds it"""
+    ENCODING_CHOICES = [
+        ('', 'None'),
+        ('gzip', 'gzip'),
+        ('zstd', 'zstd'),
+    ]
+
+    sha256 = models.CharField(max_length=64, primary_key=True)
+    # Original size; the file on disk is `stored_size` bytes when compressed.
+    size = models.BigIntegerField()
+    # Number of StoredFile names pointing at this blob.
+    ref_count = models.IntegerField(default=0)
+    encoding = models.CharField(max_length=8, choices=ENCODING_CHOICES, blank=True, default='')
+    stored_size = models.BigIntegerField(null=True, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'storage_blobs'
+        indexes = [
+            # Garbage collection looks for blobs unreferenced for a while.
+            models.Index(
+                fields=['updated_at'], condition=models.Q(ref_count=0), name='storage_blobs_unreferenced_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.sha256} ({self.ref_count} refs)"
+
+
+class StoredFile(models.Model):
+    """A file name in the document storage and the blob holding its content"""
+    name = models.CharField(max_length=255, unique=True)
+    blob = models.ForeignKey(Blob, on_delete=models.PROTECT, related_name='files', db_column='sha256')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'storage_files'
+
+    def __str__(self):
+        return self.name
+
+
+class UploadSession(models.Model):
+    """A resumable upload, written chunk by chunk to a staging file"""
+    TARGET_CHOICES = [
+        ('case_document', 'Case document'),
+        ('uploaded_document', 'User document'),
+    ]
+    STATUS_CHOICES = [
+        ('active', 'Active'),
+        ('complete', 'Complete'),
+        ('aborted', 'Aborted'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='upload_sessions')
+    target = models.CharField(max_length=20, choices=TARGET_CHOICES)
+    case = models.ForeignKey(
+        'cases.Case', on_delete=models.CASCADE, null=True, blank=True, related_name='upload_sessions'
+    )
+
+    filename = models.CharField(max_length=255)
+    size = models.BigIntegerField()
+    # Bytes received so far; the next chunk must start here.
+    offset = models.BigIntegerField(default=0)
+    # Optional SHA-256 (hex) of the whole file, verified on completion.
+    checksum = models.CharField(max_length=64, blank=True)
+    # Staging file the chunks are written to, under the storage's uploads/
+    # directory; empty when the content was already stored.
+    path = models.CharField(max_length=500, blank=True)
+    # Fields of the document created on completion (title, description, ...).
+    metadata = models.JSONField(default=dict, blank=True)
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='active')
+    document_id = models.BigIntegerField(null=True, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        db_table = 'upload_sessions'
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.filename} ({self.offset}/{self.size})"
+
+
+class DocumentText(models.Model):
+    """Text extracted from a case or user document, kept off the document rows"""
+    KIND_CHOICES = [
+        ('case_document', 'Case document'),
+        ('uploaded_document', 'User document'),
+    ]
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('done', 'Done'),
+        ('unsupported', 'Unsupported'),
+        ('failed', 'Failed'),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    document_id = models.BigIntegerField()
+    # File the text was (or is to be) extracted from, and its content hash.
+    file = models.CharField(max_length=255)
+    sha256 = models.CharField(max_length=64, blank=True, db_index=True)
+
+    status = models.CharField(max_length=12, choices=STATUS_CHOICES, default='pending')
+    text = models.TextField(blank=True)
+    error = models.CharField(max_length=500, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+
+    queued_at = models.DateTimeField(default=timezone.now)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    extracted_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'document_texts'
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'document_id'], name='document_texts_document_uniq'),
+        ]
+        indexes = [
+            models.Index(
+                fields=['queued_at', 'id'], condition=models.Q(status='pending'), name='document_texts_pending_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.kind}:{self.document_id} ({self.status})"
+
+
+class DocumentPreview(models.Model):
+    """Thumbnail of a case or user document, rendered in the background"""
+    KIND_CHOICES = DocumentText.KIND_CHOICES
+    STATUS_CHOICES = DocumentText.STATUS_CHOICES
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    document_id = models.BigIntegerField()
+    # File the preview was (or is to be) rendered from, and its content hash.
+    file = models.CharField(max_length=255)
+    sha256 = models.CharField(max_length=64, blank=True)
+
+    status = models.CharField(max_length=12, choices=STATUS_CHOICES, default='pending')
+    # Rendered image in the document storage, named after the content hash.
+    preview = models.CharField(max_length=255, blank=True)
+    error = models.CharField(max_length=500, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+
+    queued_at = models.DateTimeField(default=timezone.now)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    rendered_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'document_previews'
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'document_id'], name='document_previews_document_uniq'),
+        ]
+        indexes = [
+            models.Index(
+                fields=['queued_at', 'id'], condition=models.Q(status='pending'), name='document_previews_pending_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.kind}:{self.document_id} ({self.status})"
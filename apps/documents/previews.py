@@ -0,0 +1,174 @@
+"""
+Background thumbnails of case and user documents.
+
+Saving a document only queues it: once the transaction commits, a
+`document_previews` row is set to pending if the file's extension is one
+`rendering` can handle, and to unsupported otherwise, so a list page never
+waits for a renderer. Workers (`manage.py render_document_previews`) claim
+pending rows through `work_queue` and hand the files to a bounded process
+pool running `rendering.render`.
+
+Previews live in the document storage under `rendering.PREVIEW_DIR`,
+named after the content hash. For files in the blob store the hash is
+known up front and a preview already on disk is recorded without going to
+the pool at all; re-queueing, re-uploading or copying a document therefore
+costs a row update, not a render. `prune()` (run by `manage.py
+gc_document_blobs`) deletes preview files no row refers to any more.
+"""
+import concurrent.futures
+import os
+from concurrent.futures.process import BrokenProcessPool
+
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.utils import timezone
+
+from apps.cases.models import CaseDocument
+from . import rendering, work_queue
+from .models import DocumentPreview, UploadedDocument
+from .storage import GC_GRACE, document_storage, local_file
+from .work_queue import BATCH_SIZE
+
+MODELS = {'case_document': CaseDocument, 'uploaded_document': UploadedDocument}
+KINDS = {model: kind for kind, model in MODELS.items()}
+
+
+def preview_root(storage=None):
+    """Directory the preview names are relative to: the storage's root, not resolved through the blob store."""
+    return FileSystemStorage.path(storage or document_storage(), '')
+
+
+def previewable(name):
+    return os.path.splitext(name)[1].lstrip('.').lower() in rendering.PREVIEW_TYPES
+
+
+# -- queueing -------------------------------------------------------------
+
+def queue(document):
+    """Queue `document` for a preview once the current transaction commits."""
+    kind, pk, name = KINDS[type(document)], document.pk, document.file.name or ''
+    transaction.on_commit(lambda: _queue(kind, pk, name))
+
+
+def _queue(kind, document_id, name):
+    if DocumentPreview.objects.filter(kind=kind, document_id=document_id, file=name).exists():
+        return
+    values = {
+        'file': name, 'sha256': '', 'status': 'pending' if previewable(name) else 'unsupported', 'preview': '',
+        'error': '', 'attempts': 0, 'queued_at': timezone.now(), 'claimed_at': None, 'rendered_at': None,
+    }
+    DocumentPreview.objects.update_or_create(kind=kind, document_id=document_id, defaults=values)
+
+
+def remove(document):
+    DocumentPreview.objects.filter(kind=KINDS[type(document)], document_id=document.pk).delete()
+
+
+def queue_missing():
+    """Queue every document that has no preview row yet; returns how many."""
+    rows = []
+    for kind, model in MODELS.items():
+        known = DocumentPreview.objects.filter(kind=kind).values('document_id')
+        for pk, name in model.objects.exclude(pk__in=known).exclude(file='').values_list('pk', 'file').iterator():
+            rows.append(DocumentPreview(kind=kind, document_id=pk, file=name,
+                                        status='pending' if previewable(name) else 'unsupported'))
+    DocumentPreview.objects.bulk_create(rows, batch_size=1000, ignore_conflicts=True)
+    return len(rows)
+
+
+# -- rendering ------------------------------------------------------------
+
+def claim(batch_size=BATCH_SIZE):
+    """Claim up to `batch_size` pending rows; returns their values."""
+    return work_queue.claim(
+        DocumentPreview, ('kind', 'document_id', 'file'), batch_size, abandoned='Rendering did not finish',
+    )
+
+
+def _store(row_id, status, name, digest, error):
+    DocumentPreview.objects.filter(pk=row_id, status='processing').update(
+        status=status, preview=name, sha256=digest or '', error=error, rendered_at=timezone.now(),
+    )
+
+
+def run_batch(pool, batch_size=BATCH_SIZE, size=rendering.PREVIEW_SIZE):
+    """
+    Render one claimed batch through `pool`; returns {status: count}.
+    Raises BrokenProcessPool, after requeueing the rows it held, if a
+    worker process died.
+    """
+    rows = claim(batch_size)
+    counts = {}
+    futures = {}
+    broken = []
+    for row in rows:
+        storage = MODELS[row['kind']]._meta.get_field('file').storage
+        root = preview_root(storage)
+        try:
+            content = local_file(storage, row['file'])
+        except NotImplementedError:
+            _store(row['id'], 'unsupported', '', None, 'Storage has no local paths')
+            counts['unsupported'] = counts.get('unsupported', 0) + 1
+            continue
+        digest = content.sha256
+        if digest and os.path.exists(os.path.join(root, rendering.preview_name(digest, size))):
+            _store(row['id'], 'done', rendering.preview_name(digest, size), digest, '')
+            counts['cached'] = counts.get('cached', 0) + 1
+            continue
+        if not os.path.exists(content.path):
+            _store(row['id'], 'failed', '', digest, 'File is missing')
+            counts['failed'] = counts.get('failed', 0) + 1
+            continue
+        file_type = os.path.splitext(row['file'])[1].lstrip('.')
+        try:
+            future = pool.submit(rendering.render, content.path, file_type, root, digest, size, content.encoding)
+        except BrokenProcessPool:
+            broken.append(row['id'])
+            continue
+        futures[future] = row['id']
+    for future in concurrent.futures.as_completed(futures):
+        row_id = futures[future]
+        try:
+            status, name, digest, error = future.result()
+        except BrokenProcessPool:
+            broken.append(row_id)
+            continue
+        except Exception as exc:
+            status, name, digest, error = 'failed', '', '', f'{type(exc).__name__}: {exc}'[:500]
+        _store(row_id, status, name, digest, error)
+        counts[status] = counts.get(status, 0) + 1
+    if broken:
+        # A worker process died and took the pool with it.
+        work_queue.release(DocumentPreview, broken, 'Render worker died')
+        raise BrokenProcessPool("A render worker died; start a new pool")
+    return counts
+
+
+def preview_path(document):
+    """Absolute path of a document's rendered preview, or None."""
+    name = DocumentPreview.objects.filter(
+        kind=KINDS[type(document)], document_id=document.pk, status='done',
+    ).values_list('preview', flat=True).first()
+    if not name:
+        return None
+    path = os.path.join(preview_root(document.file.storage), name)
+    return path if os.path.exists(path) else None
+
+
+def prune(storage=None, grace=GC_GRACE, dry_run=False):
+    """Delete preview files older than `grace` that no row refers to; returns counts and bytes freed."""
+    root = os.path.join(preview_root(storage), rendering.PREVIEW_DIR)
+    cutoff = (timezone.now() - grace).timestamp()
+    referenced = set(DocumentPreview.objects.exclude(preview='').values_list('preview', flat=True))
+    stats = {'previews': 0, 'bytes': 0}
+    for directory, _, files in os.walk(root):
+        for filename in files:
+            path = os.path.join(directory, filename)
+            name = os.path.relpath(path, preview_root(storage))
+            if name in referenced or os.path.getmtime(path) >= cutoff:
+                continue
+            stats['previews'] += 1
+            stats['bytes'] += os.path.getsize(path)
+            if not dry_run:
+                os.remove(path)
+    return stats
@@ -0,0 +1,125 @@
+"""
+Storage quota accounting on User.storage_used.
+
+Usage changes only through single-statement F() updates: `reserve()`
+adds a size if, and only if, it still fits under storage_quota (the
+check is part of the UPDATE's WHERE clause), and `release()` takes it
+away again. Parallel uploads therefore never lose an update and never
+overshoot the quota together, and no transaction holds the user's row
+while bytes are being transferred.
+
+A resumable upload reserves its declared size when its session starts;
+the reservation becomes the document's usage on completion and is
+released if the session is aborted or expires. Documents created any
+other way are charged as they are saved, and every document releases
+its size when deleted. Users are charged the logical size of what they
+upload even where the blob store keeps one copy for several documents.
+
+`reconcile()` (`manage.py reconcile_storage_usage`) recomputes usage
+from the documents' file sizes plus open upload reservations.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import F, Sum
+from django.db.models.functions import Greatest
+
+from apps.cases.models import CaseDocument
+from apps.employees.models import Employee, EmployeeDocument
+from apps.users.models import User
+from .models import UploadedDocument, UploadSession, StoredFile
+
+
+class QuotaExceeded(Exception):
+    def __init__(self, available):
+        super().__init__(f"Storage quota exceeded; {max(available, 0)} bytes available")
+        self.available = max(available, 0)
+
+
+def reserve(user_id, size):
+    """Add `size` bytes to the user's usage if they fit, else raise QuotaExceeded."""
+    if size <= 0:
+        return
+    fits = User.objects.filter(pk=user_id, storage_used__lte=F('storage_quota') - size)
+    if not fits.update(storage_used=F('storage_used') + size):
+        row = User.objects.filter(pk=user_id).values('storage_quota', 'storage_used').first()
+        raise QuotaExceeded(row['storage_quota'] - row['storage_used'] if row else 0)
+
+
+def charge(user_id, size):
+    """Add `size` bytes to the user's usage regardless of the quota."""
+    if user_id is not None and size:
+        User.objects.filter(pk=user_id).update(storage_used=F('storage_used') + size)
+
+
+def release(user_id, size):
+    if user_id is not None and size:
+        User.objects.filter(pk=user_id).update(storage_used=Greatest(F('storage_used') - size, 0))
+
+
+def _file_size(storage, name):
+    try:
+        return storage.size(name) if name else 0
+    except OSError:
+        return 0
+
+
+def document_owner(document):
+    """(user id, size) a document is charged as."""
+    if isinstance(document, EmployeeDocument):
+        user_id = Employee.objects.filter(pk=document.employee_id).values_list('user_id', flat=True).first()
+        return user_id, _file_size(document.file.storage, document.file.name)
+    return document.uploaded_by_id, document.file_size
+
+
+def usage(user_ids=None):
+    """{user id: bytes} from document sizes and open upload reservations."""
+    totals = defaultdict(int)
+
+    def scoped(queryset, field):
+        return queryset.filter(**{f'{field}__in': user_ids}) if user_ids is not None else queryset
+
+    for model in (UploadedDocument, CaseDocument):
+        rows = scoped(model.objects.exclude(uploaded_by=None), 'uploaded_by_id').order_by()
+        for user_id, size in rows.values('uploaded_by_id').annotate(size=Sum('file_size')).values_list(
+            'uploaded_by_id', 'size',
+        ):
+            totals[user_id] += size or 0
+
+    # Employee documents carry no file_size: take it from the blob store,
+    # and from the disk for files not moved there yet.
+    employee_files = scoped(EmployeeDocument.objects.exclude(file=''), 'employee__user_id').values_list(
+        'employee__user_id', 'file',
+    )
+    blob_sizes = dict(
+        StoredFile.objects.filter(name__in=employee_files.values('file')).values_list('name', 'blob__size')
+    )
+    storage = EmployeeDocument._meta.get_field('file').storage
+    for user_id, name in employee_files:
+        totals[user_id] += blob_sizes[name] if name in blob_sizes else _file_size(storage, name)
+
+    sessions = scoped(UploadSession.objects.filter(status='active'), 'user_id').order_by()
+    for user_id, size in sessions.values('user_id').annotate(size=Sum('size')).values_list('user_id', 'size'):
+        totals[user_id] += size
+    return totals
+
+
+def reconcile(fix=True):
+    """
+    Compare storage_used with a fresh computation and return the drift as
+    [(user id, stored, expected)]. With `fix`, each drifted user is
+    recomputed again under a row lock and corrected, so uploads that
+    happened during the batch pass are not overwritten.
+    """
+    expected = usage()
+    drift = [
+        (user_id, stored, expected.get(user_id, 0))
+        for user_id, stored in User.objects.values_list('id', 'storage_used').iterator()
+        if stored != expected.get(user_id, 0)
+    ]
+    if fix:
+        for user_id, _, _ in drift:
+            with transaction.atomic():
+                list(User.objects.select_for_update().filter(pk=user_id).values_list('pk'))
+                User.objects.filter(pk=user_id).update(storage_used=usage([user_id]).get(user_id, 0))
+    return drift
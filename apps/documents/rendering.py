@@ -0,0 +1,147 @@
+"""
+Thumbnail rendering for document files, in pure Python.
+
+Like `extraction`, this module does not touch Django, so `render()` can
+run in worker processes. Images are thumbnailed with Pillow, decoding
+JPEGs at a reduced scale (`Image.draft`) so large scans are not inflated
+to full size first. The first page of a PDF is rasterised with pypdfium2
+when it is installed, or else by poppler's `pdftoppm` if it is on the
+PATH. Without Pillow, or without either PDF renderer, those files come
+back UNSUPPORTED.
+
+Previews are JPEGs named after the SHA-256 of the source content and the
+preview size, `previews/<aa>/<bb>/<sha256>-<size>.jpg`, so every document
+holding the same content shares one preview and rendering it again is a
+no-op: a preview that already exists is returned without opening the
+source. Files are written under a temporary name and renamed into place,
+so two workers rendering the same content never leave a partial file.
+Files stored compressed are rendered from a temporary decompressed copy.
+"""
+import hashlib
+import os
+import shutil
+import subprocess
+import tempfile
+
+from . import compression
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # pragma: no cover - optional
+    Image = ImageOps = None
+
+try:
+    import pypdfium2 as pdfium
+except ImportError:  # pragma: no cover - optional
+    pdfium = None
+
+PREVIEW_DIR = 'previews'
+PREVIEW_SIZE = 320
+JPEG_QUALITY = 80
+PDFTOPPM_TIMEOUT = 60
+
+IMAGE_TYPES = ('jpg', 'jpeg', 'png', 'gif', 'webp', 'bmp', 'tif', 'tiff')
+PREVIEW_TYPES = IMAGE_TYPES + ('pdf',)
+IMAGE_SIGNATURES = (b'\xff\xd8\xff', b'\x89PNG\r\n\x1a\n', b'GIF87a', b'GIF89a', b'BM', b'II*\x00', b'MM\x00*')
+
+# Rendering outcomes, as stored in DocumentPreview.status.
+DONE = 'done'
+UNSUPPORTED = 'unsupported'
+FAILED = 'failed'
+
+PDFTOPPM = shutil.which('pdftoppm')
+
+
+def preview_name(digest, size=PREVIEW_SIZE):
+    return os.path.join(PREVIEW_DIR, digest[:2], digest[2:4], f'{digest}-{size}.jpg')
+
+
+def sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for block in iter(lambda: fh.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def sniff(path, file_type=''):
+    """'image', 'pdf' or None (also when no renderer for it is installed)."""
+    file_type = (file_type or '').lower()
+    with open(path, 'rb') as fh:
+        head = fh.read(16)
+    if head.startswith(b'%PDF'):
+        return 'pdf' if (pdfium is not None and Image is not None) or PDFTOPPM else None
+    is_image = head.startswith(IMAGE_SIGNATURES) or (head[:4] == b'RIFF' and head[8:12] == b'WEBP')
+    if Image is not None and (is_image or file_type in IMAGE_TYPES):
+        return 'image'
+    return None
+
+
+def render(path, file_type, root, digest=None, size=PREVIEW_SIZE, encoding=''):
+    """
+    (status, preview name, sha256, error) for the file at `path`,
+    compressed with `encoding` if not '', with the preview written under
+    the directory `root`. Never raises: a file that cannot be rendered
+    comes back FAILED with the reason.
+    """
+    try:
+        if digest and os.path.exists(os.path.join(root, preview_name(digest, size))):
+            return DONE, preview_name(digest, size), digest, ''
+        with compression.decoded_path(path, encoding) as path:
+            kind = sniff(path, file_type)
+            if kind is None:
+                return UNSUPPORTED, '', digest or '', ''
+            digest = digest or sha256_file(path)
+            name = preview_name(digest, size)
+            target = os.path.join(root, name)
+            if os.path.exists(target):
+                return DONE, name, digest, ''
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            fd, temp = tempfile.mkstemp(dir=os.path.dirname(target), suffix='.jpg')
+            os.close(fd)
+            try:
+                {'image': image_preview, 'pdf': pdf_preview}[kind](path, temp, size)
+                os.replace(temp, target)
+            finally:
+                if os.path.exists(temp):
+                    os.remove(temp)
+        return DONE, name, digest, ''
+    except Exception as exc:  # corrupt or hostile files must not kill the worker
+        return FAILED, '', digest or '', f'{type(exc).__name__}: {exc}'[:500]
+
+
+def _save(image, out, size):
+    image.thumbnail((size, size))
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+    elif image.mode != 'RGB':
+        image = image.convert('RGB')
+    image.save(out, 'JPEG', quality=JPEG_QUALITY, optimize=True)
+
+
+def image_preview(path, out, size=PREVIEW_SIZE):
+    with Image.open(path) as image:
+        image.draft('RGB', (size, size))
+        image.seek(0)  # first frame of animations and multi-page TIFFs
+        _save(ImageOps.exif_transpose(image), out, size)
+
+
+def pdf_preview(path, out, size=PREVIEW_SIZE):
+    if pdfium is not None and Image is not None:
+        document = pdfium.PdfDocument(path)
+        try:
+            page = document[0]
+            width, height = page.get_size()
+            image = page.render(scale=size / max(width, height, 1)).to_pil()
+        finally:
+            document.close()
+        _save(image, out, size)
+        return
+    # pdftoppm appends the extension to the output prefix it is given.
+    subprocess.run(
+        [PDFTOPPM, '-f', '1', '-l', '1', '-singlefile', '-jpeg', '-scale-to', str(size), path, out[:-len('.jpg')]],
+        check=True, capture_output=True, timeout=PDFTOPPM_TIMEOUT,
+    )
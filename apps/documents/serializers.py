@@ -0,0 +1,102 @@
+import re
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from rest_framework import serializers
+
+from apps.cases.access import is_employee, visible_cases
+from .models import UploadedDocument, UploadSession
+from . import quota, tags, uploads
+
+SHA256_RE = re.compile(r'^[0-9a-fA-F]{64}$')
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = UploadSession
+        fields = [
+            'id', 'target', 'case', 'filename', 'size', 'offset', 'checksum', 'metadata',
+            'status', 'document_id', 'created_at', 'updated_at', 'expires_at',
+        ]
+        read_only_fields = ['id', 'offset', 'status', 'document_id', 'created_at', 'updated_at', 'expires_at']
+
+    def validate_size(self, value):
+        if value <= 0 or value > uploads.MAX_UPLOAD_SIZE:
+            raise serializers.ValidationError(f"must be between 1 and {uploads.MAX_UPLOAD_SIZE} bytes")
+        return value
+
+    def validate_checksum(self, value):
+        if value and not SHA256_RE.match(value):
+            raise serializers.ValidationError("must be a hex SHA-256 digest")
+        return value
+
+    def validate(self, attrs):
+        target, case = attrs['target'], attrs.get('case')
+        user = self.context['request'].user
+        if target == 'case_document':
+            # Customers see some of a case's documents but add none of them.
+            if not is_employee(user):
+                raise serializers.ValidationError({'target': "only employees can add case documents"})
+            if case is None:
+                raise serializers.ValidationError({'case': "required for case documents"})
+            if not visible_cases(user).filter(pk=case.pk).exists():
+                raise serializers.ValidationError({'case': "not found"})
+        elif case is not None:
+            raise serializers.ValidationError({'case': "only case documents belong to a case"})
+
+        # Check the document fields now, so completing cannot fail on them.
+        model, allowed = uploads.TARGETS[target]
+        metadata = attrs.get('metadata') or {}
+        if not isinstance(metadata, dict):
+            raise serializers.ValidationError({'metadata': "must be an object"})
+        errors = {}
+        for key, value in metadata.items():
+            if key not in allowed:
+                errors[key] = f"not accepted for {target}; use one of {', '.join(allowed)}"
+                continue
+            try:
+                model._meta.get_field(key).clean(value, None)
+            except DjangoValidationError as exc:
+                errors[key] = exc.messages
+        if errors:
+            raise serializers.ValidationError({'metadata': errors})
+        return attrs
+
+    def create(self, validated_data):
+        try:
+            return self._start(validated_data)
+        except quota.QuotaExceeded as exc:
+            raise serializers.ValidationError({'size': str(exc)})
+
+    def _start(self, validated_data):
+        return uploads.start(
+            user=self.context['request'].user,
+            target=validated_data['target'],
+            filename=validated_data['filename'],
+            size=validated_data['size'],
+            metadata=validated_data.get('metadata'),
+            case=validated_data.get('case'),
+            checksum=validated_data.get('checksum', ''),
+        )
+
+
+class UploadedDocumentSerializer(serializers.ModelSerializer):
+    """A user document; `tags` is written as a comma-separated string and also read back as `tag_list`"""
+    tag_list = serializers.SerializerMethodField()
+
+    class Meta:
+        model = UploadedDocument
+        fields = [
+            'id', 'uploaded_by', 'title', 'file', 'file_size', 'file_type', 'description', 'category',
+            'tags', 'tag_list', 'is_public', 'uploaded_at',
+        ]
+        read_only_fields = ['id', 'uploaded_by', 'file', 'file_size', 'file_type', 'uploaded_at']
+
+    def validate_tags(self, value):
+        value = ', '.join(name for _, name in tags.parse(value))
+        if len(value) > UploadedDocument._meta.get_field('tags').max_length:
+            raise serializers.ValidationError("too many tags")
+        return value
+
+    def get_tag_list(self, obj):
+        # Prefetched by the view as tag_relations__tag.
+        return sorted(relation.tag.name for relation in obj.tag_relations.all())
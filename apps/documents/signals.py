@@ -0,0 +1,71 @@
+from django.db.models.signals import post_save, post_delete, pre_delete, pre_save
+from django.dispatch import receiver
+
+from apps.cases.models import CaseDocument
+from apps.employees.models import EmployeeDocument
+from . import previews, quota, tags, text_index
+from .models import UploadedDocument
+
+
+@receiver(pre_save, sender=UploadedDocument)
+@receiver(pre_save, sender=CaseDocument)
+def record_file_size(sender, instance, raw=False, **kwargs):
+    # The original size, also for files the storage keeps compressed.
+    if not raw and not instance.file_size and instance.file:
+        try:
+            instance.file_size = instance.file.size
+        except OSError:
+            pass
+
+
+@receiver(post_save, sender=UploadedDocument)
+@receiver(post_save, sender=CaseDocument)
+@receiver(post_save, sender=EmployeeDocument)
+def charge_document(sender, instance, created, raw=False, **kwargs):
+    # Documents from resumable uploads were paid for when the upload started.
+    if created and not raw and not getattr(instance, '_quota_reserved', False):
+        quota.charge(*quota.document_owner(instance))
+
+
+@receiver(post_delete, sender=UploadedDocument)
+@receiver(post_delete, sender=CaseDocument)
+@receiver(post_delete, sender=EmployeeDocument)
+def release_document(sender, instance, **kwargs):
+    quota.release(*quota.document_owner(instance))
+
+
+@receiver(post_save, sender=UploadedDocument)
+@receiver(post_save, sender=CaseDocument)
+def queue_text_extraction(sender, instance, raw=False, **kwargs):
+    if not raw:
+        text_index.queue(instance)
+
+
+@receiver(post_delete, sender=UploadedDocument)
+@receiver(post_delete, sender=CaseDocument)
+def remove_document_text(sender, instance, **kwargs):
+    text_index.remove(instance)
+
+
+@receiver(post_save, sender=UploadedDocument)
+@receiver(post_save, sender=CaseDocument)
+def queue_preview(sender, instance, raw=False, **kwargs):
+    if not raw:
+        previews.queue(instance)
+
+
+@receiver(post_delete, sender=UploadedDocument)
+@receiver(post_delete, sender=CaseDocument)
+def remove_preview(sender, instance, **kwargs):
+    previews.remove(instance)
+
+
+@receiver(post_save, sender=UploadedDocument)
+def sync_document_tags(sender, instance, raw=False, update_fields=None, **kwargs):
+    if not raw and (update_fields is None or 'tags' in update_fields):
+        tags.sync(instance)
+
+
+@receiver(pre_delete, sender=UploadedDocument)
+def forget_document_tags(sender, instance, **kwargs):
+    tags.forget(instance)
@@ -0,0 +1,438 @@
+"""
+Content-addressed, deduplicated storage for document files.
+
+Case, employee and user documents keep their usual names
+(`case_documents/2025/10/order.pdf`), but the bytes live once per distinct
+content under `blobs/<aa>/<bb>/<sha256>`. A StoredFile row maps each name
+to its Blob, and Blob.ref_count counts those names, so uploading a PDF
+that is already stored costs a hash and two rows, not another copy.
+
+Saving streams the content into a temporary file while hashing it, records
+the name (incrementing or creating the blob's row), then renames the
+temporary file into place unless the blob already exists. Deleting a name
+only drops its row and reference; `collect_garbage()` (`manage.py
+gc_document_blobs`) deletes names that no document refers to any more,
+blobs nobody has referenced for a grace period, and blob files left
+without a row by interrupted saves. Names saved before this storage are
+still read from their old path until `dedupe_existing()` (`manage.py
+dedupe_media`) moves them into the blob store.
+
+A blob's file may be compressed (Blob.encoding, see `compression`); its
+name then ends in `.gz` or `.zst`. Every ContentAddressedStorage reads such
+blobs, decompressing as it streams, and reports their original size.
+`CompressedStorage` additionally compresses compressible content when it
+is first stored, and `recompress()` (`manage.py recompress_documents`)
+converts the blobs already on disk. Compressed blobs have no plain path:
+`path()` raises NotImplementedError for them, and code that reads files
+itself goes through `stored()`.
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+from collections import namedtuple
+from datetime import timedelta
+
+from django.apps import apps
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage, storages
+from django.db import IntegrityError, transaction
+from django.db.models import F, FileField
+from django.utils import timezone
+from django.utils.deconstruct import deconstructible
+
+from . import compression
+
+BLOCK_SIZE = 1024 * 1024
+BLOB_DIR = 'blobs'
+TEMP_DIR = os.path.join(BLOB_DIR, 'tmp')
+# Resumable uploads are written here before they are hashed into a blob.
+STAGING_DIR = 'uploads'
+GC_GRACE = timedelta(hours=24)
+RECOMPRESS_BATCH_SIZE = 500
+
+# A stored name's file on disk, the SHA-256 of its content (None for names
+# saved before this storage), the codec it is compressed with ('' for
+# none) and its original size (None if the file is missing).
+StoredContent = namedtuple('StoredContent', 'path sha256 encoding size')
+
+
+def document_storage():
+    return storages['documents']
+
+
+def sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for block in iter(lambda: fh.read(BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+@deconstructible(path='apps.documents.storage.ContentAddressedStorage')
+class ContentAddressedStorage(FileSystemStorage):
+
+    @staticmethod
+    def blob_name(digest, encoding=''):
+        return os.path.join(BLOB_DIR, digest[:2], digest[2:4], digest + compression.SUFFIXES[encoding])
+
+    def blob_path(self, digest, encoding=''):
+        return super().path(self.blob_name(digest, encoding))
+
+    def digest_of(self, name):
+        """SHA-256 of a stored name's content, or None for names saved before this storage."""
+        from .models import StoredFile
+        return StoredFile.objects.filter(name=name).values_list('blob_id', flat=True).first()
+
+    def stored(self, name):
+        from .models import StoredFile
+        row = StoredFile.objects.filter(name=name).values_list('blob_id', 'blob__encoding', 'blob__size').first()
+        if row is not None:
+            digest, encoding, size = row
+            return StoredContent(self.blob_path(digest, encoding), digest, encoding, size)
+        path = super().path(name)
+        return StoredContent(path, None, '', os.path.getsize(path) if os.path.exists(path) else None)
+
+    def path(self, name):
+        content = self.stored(name)
+        if content.encoding:
+            raise NotImplementedError(f"'{name}' is stored compressed; open() it or use stored()")
+        return content.path
+
+    def exists(self, name):
+        # A name is taken once it has a row, whatever its blob's encoding;
+        # path() would refuse compressed blobs.
+        from .models import StoredFile
+        return StoredFile.objects.filter(name=name).exists() or os.path.lexists(super().path(name))
+
+    def size(self, name):
+        content = self.stored(name)
+        if content.size is None:
+            raise FileNotFoundError(f"No file for '{name}'")
+        return content.size
+
+    def _open(self, name, mode='rb'):
+        content = self.stored(name)
+        if not content.encoding:
+            return File(open(content.path, mode))
+        if mode not in ('r', 'rb'):
+            raise ValueError(f"'{name}' is stored compressed and can only be read")
+        file = File(compression.DecodedFile(content.path, content.encoding), name=name)
+        file.size = content.size
+        return file
+
+    def _temp_file(self):
+        directory = super().path(TEMP_DIR)
+        os.makedirs(directory, exist_ok=True)
+        return tempfile.mkstemp(dir=directory)
+
+    def _save(self, name, content):
+        fd, temp = self._temp_file()
+        digest, size = hashlib.sha256(), 0
+        try:
+            with os.fdopen(fd, 'wb') as fh:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for chunk in content.chunks(BLOCK_SIZE):
+                    digest.update(chunk)
+                    fh.write(chunk)
+                    size += len(chunk)
+            return self._register(name, digest.hexdigest(), size, temp)
+        finally:
+            if os.path.exists(temp):
+                os.remove(temp)
+
+    def _add_ref(self, digest, size):
+        from .models import Blob
+        now = timezone.now()
+        if Blob.objects.filter(pk=digest).update(ref_count=F('ref_count') + 1, updated_at=now):
+            return
+        try:
+            with transaction.atomic():
+                Blob.objects.create(sha256=digest, size=size, ref_count=1)
+        except IntegrityError:
+            Blob.objects.filter(pk=digest).update(ref_count=F('ref_count') + 1, updated_at=now)
+
+    def _register(self, name, digest, size, source=None):
+        """
+        Record `name` as holding blob `digest`, placing `source` (a local
+        file with that content, moved or removed) if the blob file is
+        missing. Returns the name, made unique if another save took it.
+        """
+        from .models import StoredFile
+        if source is None and self._blob_file(digest) is None:
+            raise FileNotFoundError(f"No blob {digest} to link '{name}' to")
+        while True:
+            try:
+                with transaction.atomic():
+                    self._add_ref(digest, size)
+                    StoredFile.objects.create(name=name, blob_id=digest)
+                break
+            except IntegrityError:
+                name = self.get_available_name(name)
+        if self._blob_file(digest) is None:
+            self._place(source, digest)
+        elif source is not None:
+            os.remove(source)
+        return name
+
+    def _blob_file(self, digest):
+        """Path of the blob's file if it exists, else None."""
+        from .models import Blob
+        encoding = Blob.objects.filter(pk=digest).values_list('encoding', flat=True).first() or ''
+        path = self.blob_path(digest, encoding)
+        return path if os.path.exists(path) else None
+
+    def _codec(self, path):
+        """Codec to store a new blob's file with; '' keeps it as it is."""
+        return ''
+
+    def _place(self, source, digest):
+        """Move the local file `source` into place as blob `digest`, compressed if `_codec` says so."""
+        from .models import Blob
+        codec = self._codec(source)
+        blob_path = self.blob_path(digest, codec)
+        os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+        if codec:
+            fd, temp = self._temp_file()
+            os.close(fd)
+            try:
+                stored_size = compression.compress_file(source, temp, codec)
+                os.replace(temp, blob_path)
+            finally:
+                if os.path.exists(temp):
+                    os.remove(temp)
+            os.remove(source)
+        else:
+            stored_size = os.path.getsize(source)
+            os.replace(source, blob_path)
+        if self.file_permissions_mode is not None:
+            os.chmod(blob_path, self.file_permissions_mode)
+        Blob.objects.filter(pk=digest).update(encoding=codec, stored_size=stored_size)
+
+    def adopt(self, name, local_path, digest=None):
+        """Save the local file at `local_path` (on this filesystem) by moving it into the blob store."""
+        digest = digest or sha256_file(local_path)
+        return self._register(self.get_available_name(name), digest, os.path.getsize(local_path), local_path)
+
+    def blob_size(self, digest):
+        """Size of a blob that is stored and referenced, else None."""
+        from .models import Blob
+        row = Blob.objects.filter(pk=digest, ref_count__gt=0).values_list('size', 'encoding').first()
+        if row is None or not os.path.exists(self.blob_path(digest, row[1])):
+            return None
+        return row[0]
+
+    def link(self, name, digest):
+        """Save `name` as another reference to the stored blob `digest`, without any content."""
+        from .models import Blob
+        size = Blob.objects.filter(pk=digest).values_list('size', flat=True).get()
+        return self._register(self.get_available_name(name), digest, size)
+
+    def delete(self, name):
+        from .models import Blob, StoredFile
+        with transaction.atomic():
+            stored = StoredFile.objects.select_for_update().filter(name=name).first()
+            if stored is not None:
+                stored.delete()
+                Blob.objects.filter(pk=stored.blob_id).update(
+                    ref_count=F('ref_count') - 1, updated_at=timezone.now(),
+                )
+                return
+        super().delete(name)
+
+    def staging_path(self, key):
+        directory = super().path(STAGING_DIR)
+        os.makedirs(directory, exist_ok=True)
+        return os.path.join(directory, key)
+
+
+@deconstructible(path='apps.documents.storage.CompressedStorage')
+class CompressedStorage(ContentAddressedStorage):
+    """
+    A ContentAddressedStorage that compresses new blobs `compression.choose()`
+    finds compressible, with `codec` ('gzip' or 'zstd'; None for the best
+    one installed).
+    """
+
+    def __init__(self, codec=None, **kwargs):
+        super().__init__(**kwargs)
+        if codec and not compression.available(codec):
+            raise ImproperlyConfigured(f"Document compression codec {codec!r} is not available")
+        self.codec = codec
+
+    def _codec(self, path):
+        return compression.choose(path, self.codec)
+
+
+def local_file(storage, name):
+    """StoredContent of a name in any storage; NotImplementedError for storages without local files."""
+    if isinstance(storage, ContentAddressedStorage):
+        return storage.stored(name)
+    path = storage.path(name)
+    return StoredContent(path, None, '', os.path.getsize(path) if os.path.exists(path) else None)
+
+
+def document_fields():
+    """(model, field) for every FileField kept in a content-addressed storage."""
+    return [
+        (model, field)
+        for model in apps.get_models()
+        for field in model._meta.concrete_fields
+        if isinstance(field, FileField) and isinstance(field.storage, ContentAddressedStorage)
+    ]
+
+
+def referenced_names(storage):
+    names = set()
+    for model, field in document_fields():
+        if field.storage is storage:
+            names.update(model._base_manager.exclude(**{field.attname: ''}).values_list(field.attname, flat=True))
+    return names
+
+
+def collect_garbage(storage=None, grace=GC_GRACE, dry_run=False):
+    """
+    Delete unreferenced names, then blobs unreferenced for `grace`, then
+    blob files without a row that are older than `grace`. Returns counts
+    and the bytes freed.
+    """
+    from .models import Blob, StoredFile
+    storage = storage or document_storage()
+    cutoff = timezone.now() - grace
+    stats = {'names': 0, 'blobs': 0, 'stray_files': 0, 'bytes': 0}
+
+    referenced = referenced_names(storage)
+    orphans = [
+        name for name in StoredFile.objects.filter(created_at__lt=cutoff).values_list('name', flat=True).iterator()
+        if name not in referenced
+    ]
+    stats['names'] = len(orphans)
+    if not dry_run:
+        for name in orphans:
+            storage.delete(name)
+
+    for digest in Blob.objects.filter(ref_count=0, updated_at__lt=cutoff).values_list('pk', flat=True):
+        with transaction.atomic():
+            # Lock and re-check: a save may have just referenced it again.
+            blob = Blob.objects.select_for_update().filter(pk=digest, ref_count=0).first()
+            if blob is None:
+                continue
+            stats['blobs'] += 1
+            stats['bytes'] += blob.stored_size or blob.size
+            if not dry_run:
+                if os.path.exists(storage.blob_path(digest, blob.encoding)):
+                    os.remove(storage.blob_path(digest, blob.encoding))
+                blob.delete()
+
+    # A blob's file under another encoding than its row's is what
+    # `recompress()` left behind.
+    current = {
+        digest + compression.SUFFIXES[encoding]
+        for digest, encoding in Blob.objects.values_list('pk', 'encoding').iterator()
+    }
+    root = FileSystemStorage.path(storage, BLOB_DIR)
+    for directory, _, files in os.walk(root):
+        for filename in files:
+            path = os.path.join(directory, filename)
+            if filename in current or os.path.getmtime(path) >= cutoff.timestamp():
+                continue
+            stats['stray_files'] += 1
+            stats['bytes'] += os.path.getsize(path)
+            if not dry_run:
+                os.remove(path)
+    return stats
+
+
+def dedupe_existing(storage=None, dry_run=False):
+    """
+    Move every document file saved before this storage into the blob
+    store, keeping its name; duplicates collapse into one blob. Returns
+    counts and the bytes saved.
+    """
+    from .models import Blob, StoredFile
+    storage = storage or document_storage()
+    stats = {'files': 0, 'duplicates': 0, 'missing': 0, 'bytes_saved': 0}
+    seen = set()
+    for model, field in document_fields():
+        if field.storage is not storage:
+            continue
+        names = model._base_manager.exclude(**{field.attname: ''}).values_list(field.attname, flat=True)
+        for name in names.iterator():
+            if StoredFile.objects.filter(name=name).exists():
+                continue
+            path = FileSystemStorage.path(storage, name)
+            if not os.path.isfile(path):
+                stats['missing'] += 1
+                continue
+            digest, size = sha256_file(path), os.path.getsize(path)
+            stats['files'] += 1
+            if digest in seen or Blob.objects.filter(pk=digest).exists():
+                stats['duplicates'] += 1
+                stats['bytes_saved'] += size
+            seen.add(digest)
+            if not dry_run:
+                storage._register(name, digest, size, path)
+    return stats
+
+
+def recompress(storage=None, codec=None, batch_size=RECOMPRESS_BATCH_SIZE, dry_run=False):
+    """
+    Convert stored blobs, a batch at a time. With `codec` None, plain
+    blobs that `compression.choose()` finds compressible are compressed
+    with the storage's codec; with 'gzip' or 'zstd', blobs in the other
+    codec are converted too; with '' every blob is decompressed. The new
+    file is written beside the old one and swapped in under the blob's
+    row lock. The old file is left, freshly touched, for
+    `collect_garbage()` to remove after its grace period, so downloads
+    that already resolved it finish. Returns counts and the bytes saved
+    (negative when decompressing).
+    """
+    from .models import Blob
+    storage = storage or document_storage()
+    blobs = Blob.objects.filter(ref_count__gt=0)
+    blobs = blobs.filter(encoding='') if codec is None else blobs.exclude(encoding=codec)
+    stats = {'blobs': 0, 'skipped': 0, 'missing': 0, 'bytes_saved': 0}
+    last = ''
+    while True:
+        rows = list(
+            blobs.filter(pk__gt=last).order_by('pk').values_list('pk', 'encoding', 'size', 'stored_size')[:batch_size]
+        )
+        if not rows:
+            break
+        last = rows[-1][0]
+        for digest, encoding, size, stored_size in rows:
+            current = storage.blob_path(digest, encoding)
+            if not os.path.exists(current):
+                stats['missing'] += 1
+                continue
+            with compression.decoded_path(current, encoding) as plain:
+                new = compression.choose(plain, codec or getattr(storage, 'codec', None)) if codec != '' else ''
+                if new == encoding:
+                    stats['skipped'] += 1
+                    continue
+                stats['blobs'] += 1
+                if dry_run:
+                    continue
+                fd, temp = storage._temp_file()
+                os.close(fd)
+                try:
+                    if new:
+                        new_size = compression.compress_file(plain, temp, new)
+                    else:
+                        shutil.copyfile(plain, temp)
+                        new_size = os.path.getsize(temp)
+                    with transaction.atomic():
+                        if not Blob.objects.select_for_update().filter(pk=digest, encoding=encoding).exists():
+                            stats['blobs'] -= 1
+                            stats['skipped'] += 1
+                            continue
+                        os.replace(temp, storage.blob_path(digest, new))
+                        Blob.objects.filter(pk=digest).update(encoding=new, stored_size=new_size)
+                finally:
+                    if os.path.exists(temp):
+                        os.remove(temp)
+                os.utime(current)
+                stats['bytes_saved'] += (stored_size or size) - new_size
+    return stats
@@ -0,0 +1,168 @@
+"""
+Normalized tags of user documents.
+
+UploadedDocument.tags stays the comma-separated string clients send and
+read, but every save mirrors it into DocumentTag / DocumentTagRelation:
+the string is split on commas, whitespace is collapsed, and tags that
+differ only in case are one tag, keyed by the case-folded name. "Documents
+tagged X" is then an index lookup on the relation instead of a
+`LIKE '%X%'` scan that also matches "XY".
+
+DocumentTag.document_count is kept with F() deltas as relations come and
+go; it orders staff's autocomplete suggestions (everyone else's count
+only the documents they may see), and `backfill()` (`manage.py
+backfill_document_tags`), which parses the strings of every document in
+batches, recomputes it exactly.
+"""
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from . import access
+from .models import DocumentTag, DocumentTagRelation, UploadedDocument
+
+MAX_LENGTH = 50
+BATCH_SIZE = 1000
+
+
+def normalize(name):
+    return ' '.join(name.split())[:MAX_LENGTH]
+
+
+def tag_key(name):
+    return normalize(name).casefold()[:MAX_LENGTH]
+
+
+def parse(value):
+    """[(key, name)] of the distinct tags in a comma-separated string, in order."""
+    tags = {}
+    for part in (value or '').split(','):
+        name = normalize(part)
+        if name:
+            tags.setdefault(tag_key(name), name)
+    return list(tags.items())
+
+
+def ensure(names):
+    """{key: tag id} for {key: name}, creating the tags that do not exist yet."""
+    ids = dict(DocumentTag.objects.filter(key__in=list(names)).values_list('key', 'id'))
+    missing = [DocumentTag(key=key, name=name) for key, name in names.items() if key not in ids]
+    if missing:
+        # Ignore conflicts: another request may create the same tag meanwhile.
+        DocumentTag.objects.bulk_create(missing, ignore_conflicts=True)
+        ids.update(DocumentTag.objects.filter(key__in=[tag.key for tag in missing]).values_list('key', 'id'))
+    return ids
+
+
+def _count(tag_ids, delta):
+    if tag_ids:
+        DocumentTag.objects.filter(pk__in=tag_ids).update(document_count=F('document_count') + delta)
+
+
+def sync(document):
+    """Make the document's tag relations match its tags string."""
+    wanted = set(ensure(dict(parse(document.tags))).values())
+    current = set(DocumentTagRelation.objects.filter(document_id=document.pk).values_list('tag_id', flat=True))
+    added, removed = wanted - current, current - wanted
+    with transaction.atomic():
+        if removed:
+            DocumentTagRelation.objects.filter(document_id=document.pk, tag_id__in=removed).delete()
+            _count(removed, -1)
+        if added:
+            DocumentTagRelation.objects.bulk_create(
+                [DocumentTagRelation(document_id=document.pk, tag_id=tag_id) for tag_id in added],
+                ignore_conflicts=True,
+            )
+            _count(added, 1)
+
+
+def forget(document):
+    """Uncount the tags of a document about to be deleted (its relations go with it)."""
+    _count(list(DocumentTagRelation.objects.filter(document_id=document.pk).values_list('tag_id', flat=True)), -1)
+
+
+def recount():
+    counts = (
+        DocumentTagRelation.objects.filter(tag=OuterRef('pk')).order_by()
+        .values('tag').annotate(count=Count('pk')).values('count')
+    )
+    DocumentTag.objects.update(
+        document_count=Coalesce(Subquery(counts, output_field=IntegerField()), Value(0)),
+    )
+
+
+def backfill(batch_size=BATCH_SIZE, dry_run=False):
+    """
+    Parse the tags string of every user document, a batch of documents at
+    a time, add missing relations and drop stale ones, then recount.
+    Returns counts.
+    """
+    stats = {'documents': 0, 'added': 0, 'removed': 0}
+    last = 0
+    while True:
+        rows = list(
+            UploadedDocument.objects.filter(pk__gt=last).order_by('pk').values_list('pk', 'tags')[:batch_size]
+        )
+        if not rows:
+            break
+        last = rows[-1][0]
+        stats['documents'] += len(rows)
+        parsed = {pk: parse(value) for pk, value in rows}
+        current = {
+            (document_id, tag_id): pk
+            for pk, document_id, tag_id in DocumentTagRelation.objects.filter(
+                document_id__in=list(parsed),
+            ).values_list('pk', 'document_id', 'tag_id')
+        }
+        if dry_run:
+            keys = dict(DocumentTag.objects.filter(pk__in={tag_id for _, tag_id in current}).values_list('pk', 'key'))
+            have = {(document_id, keys[tag_id]) for document_id, tag_id in current}
+            wanted = {(pk, key) for pk, tags in parsed.items() for key, _ in tags}
+            stats['added'] += len(wanted - have)
+            stats['removed'] += len(have - wanted)
+            continue
+
+        names = {}
+        for tags in parsed.values():
+            for key, name in tags:
+                names.setdefault(key, name)
+        ids = ensure(names)
+        wanted = {(pk, ids[key]) for pk, tags in parsed.items() for key, _ in tags}
+        stale = [pk for pair, pk in current.items() if pair not in wanted]
+        missing = wanted - current.keys()
+        with transaction.atomic():
+            DocumentTagRelation.objects.filter(pk__in=stale).delete()
+            DocumentTagRelation.objects.bulk_create(
+                [DocumentTagRelation(document_id=document_id, tag_id=tag_id) for document_id, tag_id in missing],
+                ignore_conflicts=True,
+            )
+        stats['added'] += len(missing)
+        stats['removed'] += len(stale)
+    if not dry_run:
+        recount()
+    return stats
+
+
+def autocomplete(user, prefix, limit=10):
+    """
+    Tags starting with `prefix` on documents `user` may see, most used
+    first, each annotated with `count`: DocumentTag.document_count for
+    staff, and for everyone else only the documents they may see, so the
+    counts say nothing about other users' private documents.
+    """
+    key = tag_key(prefix)
+    if not key:
+        return DocumentTag.objects.none()
+    # A range on the unique index of `key`: SQLite only uses an index for
+    # LIKE 'x%' on NOCASE columns, and keys are case-folded anyway.
+    tags = DocumentTag.objects.filter(key__gte=key, key__lt=key + '\U0010ffff', document_count__gt=0)
+    if user.is_staff:
+        tags = tags.annotate(count=F('document_count'))
+    else:
+        visible = access.visible_uploaded_documents(user).values('pk')
+        counts = (
+            DocumentTagRelation.objects.filter(tag=OuterRef('pk'), document__in=visible).order_by()
+            .values('tag').annotate(count=Count('pk')).values('count')
+        )
+        tags = tags.annotate(count=Subquery(counts, output_field=IntegerField())).filter(count__gt=0)
+    return tags.order_by('-count', 'key')[:limit]
@@ -1,3 +1,835 @@
-from django.test import TestCase
+import concurrent.futures
+import hashlib
+import io
+import os
+import tempfile
+import zipfile
+import zlib
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from apps.cases import timeline
+from apps.cases.models import CaseDocument
+from apps.cases.tests import CaseFixtures, make_customer, make_employee, make_user
+from apps.users.models import User
+from . import (
+    access, bundles, compression, downloads, extraction, previews, quota, rendering, tags, text_index, uploads,
+    work_queue,
+)
+from .models import (
+    Blob, DocumentPreview, DocumentTag, DocumentTagRelation, DocumentText, StoredFile, UploadedDocument, UploadSession,
+)
+from .storage import collect_garbage, dedupe_existing, document_storage, recompress
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+
+def sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+class DocumentFixtures(CaseFixtures):
+    """CaseFixtures with the document storage under a temporary MEDIA_ROOT."""
+
+    def setUp(self):
+        super().setUp()
+        self.media_root = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(MEDIA_ROOT=self.media_root))
+        self.storage = document_storage()
+
+    def make_document(self, user, data, name='note.txt', **fields):
+        document = UploadedDocument(uploaded_by=user, title=fields.pop('title', name), **fields)
+        document.file.save(name, ContentFile(data), save=False)
+        document.save()
+        return document
+
+    def make_case_document(self, case, data, uploaded_by=None, name='order.pdf', **fields):
+        uploaded_by = uploaded_by or self.staff
+        document = CaseDocument(case=case, title=fields.pop('title', name), uploaded_by=uploaded_by, **fields)
+        document.file.save(name, ContentFile(data), save=False)
+        document.save()
+        return document
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def storage_used(self, user):
+        return User.objects.values_list('storage_used', flat=True).get(pk=user.pk)
+
+
+class UploadTests(DocumentFixtures, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = make_user('uploader@example.com')
+
+    def upload(self, data, chunk_size=4, **kwargs):
+        session = uploads.start(self.user, 'uploaded_document', 'brief.txt', len(data), **kwargs)
+        for offset in range(session.offset, len(data), chunk_size):
+            piece = data[offset:offset + chunk_size]
+            uploads.write_chunk(session.pk, self.user, offset, io.BytesIO(piece), len(piece), sha256(piece))
+        return session
+
+    def test_chunks_assemble_into_the_document(self):
+        data = b'resumable upload body'
+        session = self.upload(data, metadata={'title': 'Brief', 'ignored': 'x'})
+        document = uploads.complete(session.pk, self.user)
+
+        self.assertEqual((document.title, document.file_size, document.file_type), ('Brief', len(data), 'txt'))
+        with document.file.open('rb') as fh:
+            self.assertEqual(fh.read(), data)
+        self.assertEqual(self.storage.digest_of(document.file.name), sha256(data))
+        self.assertFalse(os.path.exists(self.storage.staging_path(session.path)))
+        # The reservation became the document's usage; it is not charged twice.
+        self.assertEqual(self.storage_used(self.user), len(data))
+        # Completing again returns the same document.
+        self.assertEqual(uploads.complete(session.pk, self.user).pk, document.pk)
+
+    def test_wrong_offset_reports_where_to_resume(self):
+        session = uploads.start(self.user, 'uploaded_document', 'brief.txt', 8)
+        uploads.write_chunk(session.pk, self.user, 0, io.BytesIO(b'abcd'), 4)
+        with self.assertRaises(uploads.OffsetMismatch) as raised:
+            uploads.write_chunk(session.pk, self.user, 0, io.BytesIO(b'abcd'), 4)
+        self.assertEqual(raised.exception.offset, 4)
+        with self.assertRaises(uploads.OffsetMismatch):
+            uploads.complete(session.pk, self.user)
+
+    def test_short_or_corrupt_chunk_is_cut_off(self):
+        session = uploads.start(self.user, 'uploaded_document', 'brief.txt', 8)
+        uploads.write_chunk(session.pk, self.user, 0, io.BytesIO(b'abcd'), 4)
+        with self.assertRaises(uploads.UploadError):
+            uploads.write_chunk(session.pk, self.user, 4, io.BytesIO(b'ef'), 4)
+        with self.assertRaises(uploads.ChecksumMismatch):
+            uploads.write_chunk(session.pk, self.user, 4, io.BytesIO(b'efgh'), 4, sha256(b'other'))
+
+        session.refresh_from_db()
+        self.assertEqual(session.offset, 4)
+        self.assertEqual(os.path.getsize(self.storage.staging_path(session.path)), 4)
+
+    def test_file_checksum_is_verified_on_completion(self):
+        session = self.upload(b'12345678', checksum=sha256(b'something else'))
+        with self.assertRaises(uploads.ChecksumMismatch):
+            uploads.complete(session.pk, self.user)
+        self.assertFalse(UploadedDocument.objects.exists())
+
+    def test_chunk_is_refused_while_another_is_written(self):
+        if fcntl is None:
+            self.skipTest('flock is not available')
+        session = uploads.start(self.user, 'uploaded_document', 'brief.txt', 8)
+        with open(self.storage.staging_path(session.path), 'r+b') as held:
+            fcntl.flock(held.fileno(), fcntl.LOCK_EX)
+            with self.assertRaises(uploads.UploadBusy):
+                uploads.write_chunk(session.pk, self.user, 0, io.BytesIO(b'abcd'), 4)
+            with self.assertRaises(uploads.UploadBusy):
+                uploads.abort(session.pk, self.user)
+        self.assertEqual(uploads.write_chunk(session.pk, self.user, 0, io.BytesIO(b'abcd'), 4), 4)
+
+    def test_offset_moved_by_another_request_fails_the_chunk(self):
+        session = uploads.start(self.user, 'uploaded_document', 'brief.txt', 8)
+
+        class Racing(io.BytesIO):
+            # Another request (without the flock, e.g. on a second host)
+            # gets its chunk in while this one is being read.
+            def read(self, size=-1):
+                UploadSession.objects.filter(pk=session.pk).update(offset=4)
+                return super().read(size)
+
+        with self.assertRaises(uploads.OffsetMismatch) as raised:
+            uploads.write_chunk(session.pk, self.user, 0, Racing(b'abcd'), 4)
+        self.assertEqual(raised.exception.offset, 4)
+
+    def test_known_checksum_skips_the_transfer_only_for_its_owner(self):
+        data = b'already stored content'
+        owned = self.make_document(self.user, data)
+        stranger = make_user('stranger@example.com')
+
+        session = uploads.start(stranger, 'uploaded_document', 'copy.txt', len(data), checksum=sha256(data))
+        self.assertEqual((session.offset, bool(session.path)), (0, True))
+        with self.assertRaises(uploads.OffsetMismatch):
+            uploads.complete(session.pk, stranger)
+
+        session = uploads.start(self.user, 'uploaded_document', 'copy.txt', len(data), checksum=sha256(data))
+        self.assertEqual((session.offset, session.path), (len(data), ''))
+        document = uploads.complete(session.pk, self.user)
+        self.assertNotEqual(document.file.name, owned.file.name)
+        self.assertEqual(Blob.objects.get(pk=sha256(data)).ref_count, 2)
+        self.assertEqual(StoredFile.objects.filter(blob_id=sha256(data)).count(), 2)
+
+    def test_start_reserves_quota_and_abort_releases_it(self):
+        User.objects.filter(pk=self.user.pk).update(storage_quota=10)
+        session = uploads.start(self.user, 'uploaded_document', 'brief.txt', 8)
+        self.assertEqual(self.storage_used(self.user), 8)
+        with self.assertRaises(quota.QuotaExceeded) as raised:
+            uploads.start(self.user, 'uploaded_document', 'more.txt', 4)
+        self.assertEqual(raised.exception.available, 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            uploads.abort(session.pk, self.user)
+        with self.assertRaises(uploads.UploadError):
+            uploads.abort(session.pk, self.user)
+        self.assertEqual(self.storage_used(self.user), 0)
+        self.assertFalse(os.path.exists(self.storage.staging_path(session.path)))
+
+    def test_purge_releases_abandoned_sessions(self):
+        session = uploads.start(self.user, 'uploaded_document', 'brief.txt', 8)
+        UploadSession.objects.filter(pk=session.pk).update(expires_at=session.created_at)
+
+        self.assertEqual(uploads.purge_expired(), 1)
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertEqual(self.storage_used(self.user), 0)
+
+    def test_chunk_endpoint(self):
+        session = uploads.start(self.user, 'uploaded_document', 'brief.txt', 8)
+        client = APIClient()
+        client.force_authenticate(self.user)
+        url = f'/api/documents/uploads/{session.pk}/chunk/'
+
+        response = client.put(url, b'abcd', content_type='application/octet-stream', HTTP_UPLOAD_OFFSET='0')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Upload-Offset'], '4')
+        response = client.put(url, b'abcd', content_type='application/octet-stream', HTTP_UPLOAD_OFFSET='0')
+        self.assertEqual((response.status_code, response.data['offset']), (409, 4))
+        response = client.put(
+            url, b'efgh', content_type='application/octet-stream', HTTP_UPLOAD_OFFSET='4',
+            HTTP_UPLOAD_CHECKSUM=f'sha256 {sha256(b"efgh")}',
+        )
+        self.assertEqual(response.data['offset'], 8)
+        response = client.post(f'/api/documents/uploads/{session.pk}/complete/')
+        self.assertEqual((response.status_code, response.data['file_size']), (201, 8))
+
+
+    def test_only_employees_start_case_document_uploads(self):
+        case = self.make_case('UP-1')
+        body = {'target': 'case_document', 'case': case.pk, 'filename': 'order.pdf', 'size': 8,
+                'metadata': {'is_confidential': True}}
+        response = self.client_for(self.customer.user).post('/api/documents/uploads/', body, format='json')
+        self.assertEqual((response.status_code, list(response.data)), (400, ['target']))
+        self.assertFalse(UploadSession.objects.exists())
+        response = self.client_for(self.lawyer).post('/api/documents/uploads/', body, format='json')
+        self.assertEqual(response.status_code, 201)
+
+class StorageTests(DocumentFixtures, TestCase):
+    def test_same_content_is_stored_once(self):
+        user = make_user('owner@example.com')
+        first = self.make_document(user, b'same bytes', 'a.txt')
+        second = self.make_document(user, b'same bytes', 'b.txt')
+        digest = sha256(b'same bytes')
+
+        self.assertEqual(self.storage.digest_of(first.file.name), digest)
+        self.assertEqual(self.storage.digest_of(second.file.name), digest)
+        self.assertEqual(Blob.objects.get(pk=digest).ref_count, 2)
+        blob_files = [files for _, _, files in os.walk(os.path.join(self.media_root, 'blobs')) if files]
+        self.assertEqual(blob_files, [[digest]])
+        self.assertEqual(self.storage.size(second.file.name), len(b'same bytes'))
+        with second.file.open('rb') as fh:
+            self.assertEqual(fh.read(), b'same bytes')
+
+    def test_same_name_gets_a_new_name(self):
+        first = self.storage.save('documents/x.txt', ContentFile(b'one'))
+        second = self.storage.save('documents/x.txt', ContentFile(b'two'))
+        self.assertNotEqual(first, second)
+        self.assertTrue(self.storage.exists(first))
+        with self.storage.open(second) as fh:
+            self.assertEqual(fh.read(), b'two')
+
+    def test_garbage_collection_drops_unreferenced_names_and_blobs(self):
+        user = make_user('owner@example.com')
+        kept = self.make_document(user, b'kept')
+        dropped = self.make_document(user, b'dropped')
+        dropped_path = self.storage.path(dropped.file.name)
+        stray = self.storage.save('documents/stray.txt', ContentFile(b'stray'))
+        dropped.delete()
+
+        # Deleting a document leaves its name; the first pass drops the
+        # names, and their blobs go once unreferenced for the grace period.
+        stats = collect_garbage(self.storage, grace=timedelta(0))
+        self.assertEqual((stats['names'], stats['blobs']), (2, 0))
+        stats = collect_garbage(self.storage, grace=timedelta(0))
+        self.assertEqual((stats['names'], stats['blobs']), (0, 2))
+        self.assertFalse(StoredFile.objects.filter(name=stray).exists())
+        self.assertFalse(os.path.exists(dropped_path))
+        self.assertEqual(set(Blob.objects.values_list('pk', flat=True)), {sha256(b'kept')})
+        with kept.file.open('rb') as fh:
+            self.assertEqual(fh.read(), b'kept')
+
+    def test_dedupe_moves_files_saved_before_the_blob_store(self):
+        user = make_user('owner@example.com')
+        names = ['documents/old/a.pdf', 'documents/old/b.pdf']
+        for name in names:
+            path = FileSystemStorage.path(self.storage, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as fh:
+                fh.write(b'legacy pdf')
+            UploadedDocument.objects.create(uploaded_by=user, title=name, file=name)
+
+        stats = dedupe_existing(self.storage)
+        self.assertEqual(stats, {'files': 2, 'duplicates': 1, 'missing': 0, 'bytes_saved': len(b'legacy pdf')})
+        self.assertEqual(Blob.objects.get(pk=sha256(b'legacy pdf')).ref_count, 2)
+        for name in names:
+            self.assertFalse(os.path.exists(FileSystemStorage.path(self.storage, name)))
+            with self.storage.open(name) as fh:
+                self.assertEqual(fh.read(), b'legacy pdf')
+        self.assertEqual(dedupe_existing(self.storage)['files'], 0)
+
+
+class QuotaTests(DocumentFixtures, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = make_user('owner@example.com')
+        User.objects.filter(pk=self.user.pk).update(storage_quota=100)
+
+    def test_reserve_is_one_conditional_update(self):
+        with self.assertNumQueries(1):
+            quota.reserve(self.user.pk, 60)
+        with self.assertRaises(quota.QuotaExceeded) as raised:
+            quota.reserve(self.user.pk, 60)
+        self.assertEqual(raised.exception.available, 40)
+        self.assertEqual(self.storage_used(self.user), 60)
+
+    def test_charge_ignores_the_quota_and_release_stops_at_zero(self):
+        quota.charge(self.user.pk, 150)
+        self.assertEqual(self.storage_used(self.user), 150)
+        quota.release(self.user.pk, 200)
+        self.assertEqual(self.storage_used(self.user), 0)
+
+    def test_documents_are_charged_and_released(self):
+        document = self.make_document(self.user, b'x' * 30)
+        self.assertEqual(self.storage_used(self.user), 30)
+        document.delete()
+        self.assertEqual(self.storage_used(self.user), 0)
+
+    def test_reconcile_corrects_drift(self):
+        self.make_document(self.user, b'x' * 30)
+        uploads.start(self.user, 'uploaded_document', 'big.bin', 50)
+        User.objects.filter(pk=self.user.pk).update(storage_used=7)
+
+        self.assertIn((self.user.pk, 7, 80), quota.reconcile())
+        self.assertEqual(self.storage_used(self.user), 80)
+        self.assertEqual(quota.reconcile(), [])
+
+
+def docx_bytes(text):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        archive.writestr('[Content_Types].xml', '<Types/>')
+        archive.writestr('word/document.xml', (
+            '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"><w:body>'
+            f'<w:p><w:r><w:t>{text}</w:t></w:r></w:p></w:body></w:document>'
+        ))
+    return buffer.getvalue()
+
+
+PDF = (
+    b'%PDF-1.4\n1 0 obj << /Type /Catalog /Pages 2 0 R >> endobj\n'
+    b'2 0 obj << /Type /Pages /Kids [3 0 R] /Count 1 >> endobj\n'
+    b'3 0 obj << /Type /Page /Parent 2 0 R /MediaBox [0 0 200 200] /Contents 4 0 R >> endobj\n'
+    b'4 0 obj << /Length 44 >>\nstream\nBT /F1 12 Tf 10 100 Td (Summons issued) Tj ET\nendstream\nendobj\n'
+    b'trailer << /Root 1 0 R >>\n%%EOF\n'
+)
+
+
+class TextExtractionTests(DocumentFixtures, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = make_user('owner@example.com')
+        self.other = make_user('other@example.com')
+
+    def extract_file(self, data, name):
+        path = os.path.join(self.media_root, name)
+        with open(path, 'wb') as fh:
+            fh.write(data)
+        return extraction.extract(path, os.path.splitext(name)[1].lstrip('.'))
+
+    def test_extract_by_format(self):
+        self.assertEqual(self.extract_file(b'plain \t text\n\n\n\nmore', 'a.txt'), ('done', 'plain text\n\nmore', ''))
+        self.assertEqual(self.extract_file(docx_bytes('Deed of sale'), 'b.docx'), ('done', 'Deed of sale', ''))
+        status, text, _ = self.extract_file(PDF, 'c.pdf')
+        self.assertEqual(status, 'done')
+        self.assertIn('Summons issued', text)
+        self.assertEqual(self.extract_file(b'\x00\x01binary', 'd.bin'), ('unsupported', '', ''))
+        self.assertEqual(self.extract_file(b'PK\x03\x04 not a zip', 'e.docx'), ('unsupported', '', ''))
+
+    def test_inflated_markup_is_bounded(self):
+        bomb = zlib.compress(b'BT (Summons) Tj ET ' + b' ' * 2_000_000)
+        data = PDF.replace(b'<< /Length 44 >>\nstream\n', b'<< /Filter /FlateDecode >>\nstream\n' + bomb + b'\nendstream\n')
+        parsed = []
+        with mock.patch.object(extraction, 'MAX_MARKUP_BYTES', 1000), \
+                mock.patch.object(extraction, '_pdf_content_text', side_effect=lambda content: parsed.append(len(content)) or ''):
+            extraction._pdf_text_fallback(data)
+        self.assertEqual(parsed, [1000])
+
+        with mock.patch.object(extraction, 'MAX_MARKUP_BYTES', 10):
+            self.assertEqual(self.extract_file(docx_bytes('Deed of sale'), 'big.docx'), ('done', '', ''))
+
+    def make_text_document(self, user, data, name, **fields):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.make_document(user, data, name, **fields)
+
+    def test_batch_extracts_and_search_respects_visibility(self):
+        mine = self.make_text_document(self.user, b'the lease was terminated early', 'lease.txt')
+        self.make_text_document(self.other, b'terminated employment contract', 'contract.txt')
+        public = self.make_text_document(self.other, docx_bytes('terminated partnership'), 'deed.docx', is_public=True)
+        self.assertEqual(DocumentText.objects.filter(status='pending').count(), 3)
+
+        with concurrent.futures.ThreadPoolExecutor(2) as pool:
+            self.assertEqual(text_index.run_batch(pool), {'done': 3})
+
+        found = {DocumentText.objects.get(pk=pk).document_id for pk, _, _ in text_index.search(self.user, 'terminat')}
+        self.assertEqual(found, {mine.pk, public.pk})
+        found = {DocumentText.objects.get(pk=pk).document_id for pk, _, _ in text_index.search(self.other, 'lease')}
+        self.assertEqual(found, set())
+        self.assertEqual(len(text_index.search(self.staff, 'terminated')), 3)
+        self.assertEqual(text_index.search(self.user, 'employment'), [])
+
+    def test_same_content_is_not_extracted_twice(self):
+        self.make_text_document(self.user, b'affidavit of service', 'one.txt')
+        with concurrent.futures.ThreadPoolExecutor(1) as pool:
+            text_index.run_batch(pool)
+        copy = self.make_text_document(self.user, b'affidavit of service', 'two.txt')
+
+        pool = mock.Mock()
+        self.assertEqual(text_index.run_batch(pool), {'done': 1})
+        pool.submit.assert_not_called()
+        text = DocumentText.objects.get(kind='uploaded_document', document_id=copy.pk)
+        self.assertEqual(text.text, 'affidavit of service')
+
+    def test_a_dead_worker_requeues_its_rows(self):
+        self.make_text_document(self.user, b'first notice', 'one.txt')
+        self.make_text_document(self.user, b'second notice', 'two.txt')
+        pool = mock.Mock()
+        pool.submit.side_effect = BrokenProcessPool
+        with self.assertRaises(BrokenProcessPool):
+            text_index.run_batch(pool)
+        self.assertEqual(list(DocumentText.objects.values_list('status', 'attempts')), [('pending', 1)] * 2)
+
+        DocumentText.objects.update(status='processing', attempts=work_queue.MAX_ATTEMPTS)
+        work_queue.release(DocumentText, DocumentText.objects.values('pk'), 'Extraction worker died')
+        self.assertEqual(set(DocumentText.objects.values_list('status', 'error')), {('failed', 'Extraction worker died')})
+
+    def test_deleting_a_document_removes_its_text(self):
+        document = self.make_text_document(self.user, b'withdrawn petition', 'petition.txt')
+        with concurrent.futures.ThreadPoolExecutor(1) as pool:
+            text_index.run_batch(pool)
+        document.delete()
+        self.assertFalse(DocumentText.objects.exists())
+        self.assertEqual(text_index.search(self.staff, 'petition'), [])
+
+    def test_search_endpoint(self):
+        document = self.make_text_document(self.user, b'bail application granted', 'bail.txt', title='Bail order')
+        with concurrent.futures.ThreadPoolExecutor(1) as pool:
+            text_index.run_batch(pool)
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        response = client.get('/api/documents/search/', {'q': 'bail'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([(row['kind'], row['id'], row['title']) for row in response.data['results']],
+                         [('uploaded_document', document.pk, 'Bail order')])
+        self.assertEqual(client.get('/api/documents/search/').status_code, 400)
+
+
+class CaseDocumentAccessTests(DocumentFixtures, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.case = self.make_case('DA-1')
+        self.uploader = make_employee('clerk@example.com', court=self.court, designation='clerk')
+        self.teammate = make_employee('junior@example.com')
+        self.outsider = make_employee('paralegal@example.com', court=self.court, designation='paralegal')
+        self.case.team_members.add(self.teammate)
+        self.open = self.make_case_document(self.case, b'open', name='open.pdf')
+        self.hidden = self.make_case_document(self.case, b'hidden', name='hidden.pdf', is_visible_to_customer=False)
+        self.confidential = self.make_case_document(
+            self.case, b'confidential', uploaded_by=self.uploader, name='secret.pdf', is_confidential=True,
+        )
+
+    def test_one_rule_for_downloads_bundles_and_the_timeline(self):
+        everything = {self.open.pk, self.hidden.pk, self.confidential.pk}
+        expected = {
+            self.staff: everything,
+            self.lawyer: everything,
+            self.teammate: everything,
+            self.uploader: everything,
+            self.outsider: {self.open.pk, self.hidden.pk},
+            self.customer.user: {self.open.pk},
+        }
+        for user, ids in expected.items():
+            with self.subTest(user=user.email):
+                self.assertEqual(set(access.visible_case_documents(user).values_list('pk', flat=True)), ids)
+                entries, _ = timeline.page(self.case, user)
+                self.assertEqual({entry['id'] for entry in entries if entry['type'] == 'document'}, ids)
+                response = self.client_for(user).get(f'/api/documents/download/case_document/{self.confidential.pk}/')
+                self.assertEqual(response.status_code, 200 if self.confidential.pk in ids else 404)
+
+
+class DownloadTests(DocumentFixtures, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = make_user('owner@example.com')
+        self.data = bytes(range(256)) * 4
+        self.document = self.make_document(self.user, self.data, 'scan.pdf')
+        self.url = f'/api/documents/download/uploaded_document/{self.document.pk}/'
+        self.client = self.client_for(self.user)
+
+    def test_whole_file_with_its_etag(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.data)
+        self.assertEqual(response['ETag'], f'"{sha256(self.data)}"')
+        self.assertEqual(response['Content-Length'], str(len(self.data)))
+        self.assertIn('attachment', response['Content-Disposition'])
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=f'W/"{sha256(self.data)}"')
+        self.assertEqual(response.status_code, 304)
+
+    def test_ranges(self):
+        for header, start, end in (('bytes=10-19', 10, 19), ('bytes=1000-', 1000, 1023), ('bytes=-4', 1020, 1023)):
+            with self.subTest(header=header):
+                response = self.client.get(self.url, HTTP_RANGE=header)
+                self.assertEqual(response.status_code, 206)
+                self.assertEqual(response['Content-Range'], f'bytes {start}-{end}/1024')
+                self.assertEqual(b''.join(response.streaming_content), self.data[start:end + 1])
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=2000-')
+        self.assertEqual((response.status_code, response['Content-Range']), (416, 'bytes */1024'))
+        # A stale If-Range gets the whole file.
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get(self.url, HTTP_RANGE='bytes=0-1,5-6').status_code, 200)
+
+    def test_parse_range(self):
+        self.assertEqual(downloads.parse_range('bytes=0-', 10), (0, 9))
+        self.assertEqual(downloads.parse_range('bytes=5-100', 10), (5, 9))
+        self.assertEqual(downloads.parse_range('bytes=-20', 10), (0, 9))
+        self.assertEqual(downloads.parse_range('bytes=-0', 10), 'unsatisfiable')
+        self.assertEqual(downloads.parse_range('bytes=7-3', 10), 'unsatisfiable')
+        self.assertIsNone(downloads.parse_range('items=0-1', 10))
+        for header in ('bytes=-5', 'bytes=0-', 'bytes=0-0'):
+            self.assertEqual(downloads.parse_range(header, 0), 'unsatisfiable', header)
+
+    def test_empty_file(self):
+        document = self.make_document(self.user, b'', 'empty.txt')
+        url = f'/api/documents/download/uploaded_document/{document.pk}/'
+        response = self.client.get(url, HTTP_RANGE='bytes=-5')
+        self.assertEqual((response.status_code, response['Content-Range']), (416, 'bytes */0'))
+        response = self.client.get(url)
+        self.assertEqual((response.status_code, b''.join(response.streaming_content)), (200, b''))
+
+    def test_others_cannot_download_private_documents(self):
+        response = self.client_for(make_user('other@example.com')).get(self.url)
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.client_for(self.staff).get(self.url).status_code, 200)
+
+    @override_settings(DOCUMENT_DOWNLOAD_BACKEND='x-accel')
+    def test_x_accel_redirect(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.content, b'')
+        digest = sha256(self.data)
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/blobs/{digest[:2]}/{digest[2:4]}/{digest}')
+
+
+class DocumentTagTests(DocumentFixtures, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = make_user('owner@example.com')
+        self.other = make_user('other@example.com')
+
+    def counts(self):
+        return dict(DocumentTag.objects.values_list('key', 'document_count'))
+
+    def suggest(self, user, prefix):
+        return [(tag.name, tag.count) for tag in tags.autocomplete(user, prefix)]
+
+    def test_tags_are_normalized_and_counted(self):
+        document = self.make_document(self.user, b'a', tags='Lease,  lease , Land  Records')
+        self.assertEqual(tags.parse(document.tags), [('lease', 'Lease'), ('land records', 'Land Records')])
+        self.assertEqual(self.counts(), {'lease': 1, 'land records': 1})
+
+        document.tags = 'Land Records'
+        document.save(update_fields=['tags'])
+        self.assertEqual(self.counts(), {'lease': 0, 'land records': 1})
+        document.delete()
+        self.assertEqual(DocumentTag.objects.get(key='land records').document_count, 0)
+
+    def test_autocomplete_counts_only_visible_documents(self):
+        self.make_document(self.user, b'a', tags='Lease')
+        self.make_document(self.other, b'b', tags='lease, Lawsuit', is_public=True)
+        for _ in range(3):
+            self.make_document(self.other, b'c', tags='Lawsuit, Lapsed')
+
+        self.assertEqual(self.suggest(self.staff, 'la'), [('Lawsuit', 4), ('Lapsed', 3)])
+        self.assertEqual(self.suggest(self.user, 'LA'), [('Lawsuit', 1)])
+        self.assertEqual(self.suggest(self.user, 'le'), [('Lease', 2)])
+        self.assertEqual(self.suggest(self.user, ''), [])
+
+        response = self.client_for(self.user).get('/api/documents/files/tags/', {'prefix': 'la'})
+        self.assertEqual(response.data['results'], [{'name': 'Lawsuit', 'count': 1}])
+
+    def test_tag_filter_and_backfill(self):
+        tagged = self.make_document(self.user, b'a', tags='Lease, Urgent')
+        self.make_document(self.user, b'b', tags='Lease')
+        response = self.client_for(self.user).get('/api/documents/files/', {'tag': ['lease', 'URGENT']})
+        results = response.data['results'] if isinstance(response.data, dict) else response.data
+        self.assertEqual([row['id'] for row in results], [tagged.pk])
+
+        DocumentTagRelation.objects.all().delete()
+        DocumentTag.objects.update(document_count=9)
+        self.assertEqual(tags.backfill(batch_size=1), {'documents': 2, 'added': 3, 'removed': 0})
+        self.assertEqual(self.counts(), {'lease': 2, 'urgent': 1})
+
+
+def png_bytes(size=(640, 480), color=(200, 30, 30)):
+    buffer = io.BytesIO()
+    rendering.Image.new('RGB', size, color).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+class PreviewTests(DocumentFixtures, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = make_user('owner@example.com')
+
+    def make_previewed_document(self, data, name, **fields):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.make_document(self.user, data, name, **fields)
+
+    def row(self, document):
+        return DocumentPreview.objects.get(kind='uploaded_document', document_id=document.pk)
+
+    def test_saving_queues_by_extension(self):
+        self.assertEqual(self.row(self.make_previewed_document(b'%PDF-1.4', 'a.pdf')).status, 'pending')
+        self.assertEqual(self.row(self.make_previewed_document(b'text', 'b.txt')).status, 'unsupported')
+
+    def test_rendered_preview_of_the_same_content_is_reused(self):
+        first = self.make_previewed_document(b'%PDF-1.4 scan', 'first.pdf')
+        name = rendering.preview_name(sha256(b'%PDF-1.4 scan'))
+        os.makedirs(os.path.dirname(os.path.join(self.media_root, name)))
+        with open(os.path.join(self.media_root, name), 'wb') as fh:
+            fh.write(b'jpeg')
+        second = self.make_previewed_document(b'%PDF-1.4 scan', 'second.pdf')
+
+        pool = mock.Mock()
+        self.assertEqual(previews.run_batch(pool), {'cached': 2})
+        pool.submit.assert_not_called()
+        self.assertEqual({self.row(first).preview, self.row(second).preview}, {name})
+
+    def test_a_dead_worker_requeues_its_rows(self):
+        document = self.make_previewed_document(b'%PDF-1.4 scan', 'scan.pdf')
+        future = concurrent.futures.Future()
+        future.set_exception(BrokenProcessPool('worker killed'))
+        pool = mock.Mock()
+        pool.submit.return_value = future
+        with self.assertRaises(BrokenProcessPool):
+            previews.run_batch(pool)
+        self.assertEqual((self.row(document).status, self.row(document).attempts), ('pending', 1))
+
+    @skipUnless(rendering.Image is not None, 'Pillow is not installed')
+    def test_worker_renders_thumbnails(self):
+        document = self.make_previewed_document(png_bytes(), 'photo.png')
+        broken = self.make_previewed_document(b'\x89PNG\r\n\x1a\nbroken', 'broken.png')
+        with concurrent.futures.ThreadPoolExecutor(2) as pool:
+            self.assertEqual(previews.run_batch(pool), {'done': 1, 'failed': 1})
+        self.assertTrue(self.row(broken).error)
+
+        path = previews.preview_path(document)
+        with rendering.Image.open(path) as image:
+            self.assertEqual((image.format, image.size), ('JPEG', (320, 240)))
+
+        client = self.client_for(self.user)
+        url = f'/api/documents/preview/uploaded_document/{document.pk}/'
+        response = client.get(url)
+        self.assertEqual((response.status_code, response['Content-Type']), (200, 'image/jpeg'))
+        response = client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        response = client.get(f'/api/documents/preview/uploaded_document/{broken.pk}/')
+        self.assertEqual((response.status_code, response.data['status']), (404, 'failed'))
+
+    def test_prune_deletes_unreferenced_previews(self):
+        kept = self.make_previewed_document(b'%PDF-1.4 kept', 'kept.pdf')
+        DocumentPreview.objects.filter(pk=self.row(kept).pk).update(status='done', preview='previews/aa/bb/kept.jpg')
+        for name in ('kept.jpg', 'stale.jpg'):
+            os.makedirs(os.path.join(self.media_root, 'previews', 'aa', 'bb'), exist_ok=True)
+            with open(os.path.join(self.media_root, 'previews', 'aa', 'bb', name), 'wb') as fh:
+                fh.write(b'jpeg')
+
+        self.assertEqual(previews.prune(grace=timedelta(0)), {'previews': 1, 'bytes': 4})
+        self.assertEqual(os.listdir(os.path.join(self.media_root, 'previews', 'aa', 'bb')), ['kept.jpg'])
+
+
+class BundleTests(DocumentFixtures, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.case = self.make_case('ZB-1')
+        self.url = f'/api/documents/bundle/case/{self.case.pk}/'
+
+    def download(self, user=None, **params):
+        response = self.client_for(user or self.staff).get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        return zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+
+    def test_archive_of_the_visible_documents(self):
+        self.make_case_document(self.case, b'notes ' * 100, name='notes.txt', title='Hearing notes')
+        self.make_case_document(self.case, b'\xff\xd8\xff photo', name='photo.jpg', title='Hearing notes')
+        self.make_case_document(self.case, b'secret', name='secret.pdf', title='Strategy', is_confidential=True)
+        gone = self.make_case_document(self.case, b'gone', name='gone.pdf', title='Lost/order')
+        os.remove(self.storage.path(gone.file.name))
+
+        archive = self.download()
+        self.assertEqual(archive.namelist(), [
+            'Hearing notes.txt', 'Hearing notes.jpg', 'Strategy.pdf', 'MISSING.txt',
+        ])
+        self.assertEqual(archive.read('Hearing notes.txt'), b'notes ' * 100)
+        self.assertEqual(archive.getinfo('Hearing notes.txt').compress_type, zipfile.ZIP_DEFLATED)
+        self.assertEqual(archive.getinfo('Hearing notes.jpg').compress_type, zipfile.ZIP_STORED)
+        self.assertEqual(archive.read('MISSING.txt').decode(), 'Files missing from storage:\nLost_order.pdf\n')
+        self.assertIsNone(archive.testzip())
+
+        archive = self.download(compression='stored')
+        self.assertEqual({info.compress_type for info in archive.infolist()}, {zipfile.ZIP_STORED})
+        outsider = make_employee('paralegal@example.com', court=self.court)
+        self.assertNotIn('Strategy.pdf', self.download(outsider).namelist())
+
+    def test_bad_requests(self):
+        client = self.client_for(self.staff)
+        self.assertEqual(client.get(self.url).status_code, 404)
+        self.make_case_document(self.case, b'x', name='x.pdf')
+        self.assertEqual(client.get(self.url, {'compression': 'lzma'}).status_code, 400)
+        other = self.make_case('ZB-2', customer=make_customer('other@example.com'), assigned_lawyer=self.staff)
+        response = self.client_for(self.customer.user).get(f'/api/documents/bundle/case/{other.pk}/')
+        self.assertEqual(response.status_code, 404)
+
+    def test_entry_names(self):
+        taken = {'missing.txt'}
+        self.assertEqual(bundles.entry_name('Order', 'case_documents/a.PDF', taken), 'Order.pdf')
+        self.assertEqual(bundles.entry_name('order', 'case_documents/b.pdf', taken), 'order (2).pdf')
+        self.assertEqual(bundles.entry_name('../..', 'case_documents/scan.png', taken), 'scan.png')
+        self.assertEqual(bundles.entry_name('Missing', 'case_documents/m.txt', taken), 'Missing (2).txt')
+
+    def test_stream_is_produced_in_pieces(self):
+        data = os.urandom(5 * bundles.BLOCK_SIZE)
+        document = self.make_case_document(self.case, data, name='big.bin', title='big')
+        entries = bundles.case_entries(CaseDocument.objects.filter(pk=document.pk))
+
+        pieces = list(bundles.stream(entries, 'stored'))
+        self.assertGreater(len(pieces), 5)
+        self.assertLessEqual(max(map(len, pieces)), bundles.BLOCK_SIZE + 1024)
+        self.assertEqual(zipfile.ZipFile(io.BytesIO(b''.join(pieces))).read('big.bin'), data)
+
+    def test_zip64_records_past_the_limit(self):
+        # Lower zipfile's 4 GiB limit rather than stream gigabytes.
+        data = b'0123456789' * 200
+        documents = [self.make_case_document(self.case, data, name=f'part{n}.txt', title=f'part{n}') for n in range(2)]
+        entries = bundles.case_entries(CaseDocument.objects.filter(pk__in=[d.pk for d in documents]))
+        with mock.patch.object(zipfile, 'ZIP64_LIMIT', 1000):
+            body = b''.join(bundles.stream(entries, 'stored'))
+
+        self.assertIn(b'PK\x06\x06', body)  # ZIP64 end of central directory record
+        archive = zipfile.ZipFile(io.BytesIO(body))
+        self.assertEqual([archive.read(name) for name in archive.namelist()], [data, data])
+        # The local headers carry the ZIP64 extra field (id 0x0001).
+        self.assertEqual(body[30 + len('part0.txt'):][:2], b'\x01\x00')
+
+
+class CompressionTests(DocumentFixtures, TestCase):
+    text = b'IN THE CITY CIVIL COURT. Order sheet, hearing adjourned.\n' * 500
+
+    def setUp(self):
+        super().setUp()
+        self.user = make_user('owner@example.com')
+        # The models' storage, compressing as CompressedStorage('gzip') would.
+        self.enterContext(mock.patch.object(self.storage, '_codec', lambda path: compression.choose(path, 'gzip')))
+
+    def test_choose(self):
+        path = os.path.join(self.media_root, 'sample')
+        for data, expected in (
+            (self.text, 'gzip'), (b'short text', ''), (b'\xff\xd8\xff' + self.text, ''), (os.urandom(64 * 1024), ''),
+        ):
+            with open(path, 'wb') as fh:
+                fh.write(data)
+            self.assertEqual(compression.choose(path, 'gzip'), expected)
+
+    def test_compressed_blobs_read_back_as_stored(self):
+        document = self.make_document(self.user, self.text, 'order.txt')
+        blob = Blob.objects.get(pk=sha256(self.text))
+        self.assertEqual((blob.encoding, blob.size), ('gzip', len(self.text)))
+        self.assertLess(blob.stored_size, len(self.text) // 10)
+        self.assertTrue(os.path.exists(self.storage.blob_path(blob.pk, 'gzip')))
+
+        self.assertEqual((document.file_size, self.storage.size(document.file.name)), (len(self.text), len(self.text)))
+        with document.file.open('rb') as fh:
+            self.assertEqual(fh.read(), self.text)
+        with self.assertRaises(NotImplementedError):
+            self.storage.path(document.file.name)
+
+    def test_names_of_compressed_blobs_are_taken(self):
+        first = self.storage.save('documents/order.txt', ContentFile(self.text))
+        self.assertTrue(self.storage.exists(first))
+        self.assertFalse(self.storage.exists('documents/other.txt'))
+        second = self.storage.save('documents/order.txt', ContentFile(self.text))
+        self.assertNotEqual(first, second)
+        self.assertEqual(Blob.objects.get(pk=sha256(self.text)).ref_count, 2)
+
+    def test_uploads_of_the_same_name_complete(self):
+        names = set()
+        for _ in range(2):
+            session = uploads.start(self.user, 'uploaded_document', 'order.txt', len(self.text))
+            uploads.write_chunk(session.pk, self.user, 0, io.BytesIO(self.text), len(self.text))
+            names.add(uploads.complete(session.pk, self.user).file.name)
+        self.assertEqual(len(names), 2)
+        self.assertEqual(Blob.objects.get(pk=sha256(self.text)).encoding, 'gzip')
+
+    def test_ranges_and_bundles_are_decompressed(self):
+        document = self.make_document(self.user, self.text, 'order.txt')
+        client = self.client_for(self.user)
+        url = f'/api/documents/download/uploaded_document/{document.pk}/'
+        response = client.get(url, HTTP_RANGE='bytes=1000-1999')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), self.text[1000:2000])
+        response = client.get(url)
+        self.assertEqual(response['Content-Length'], str(len(self.text)))
+        self.assertEqual(b''.join(response.streaming_content), self.text)
+
+        case_document = self.make_case_document(self.make_case('CZ-1'), self.text, name='order.txt', title='Order')
+        entries = bundles.case_entries(CaseDocument.objects.filter(pk=case_document.pk))
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(bundles.stream(entries))))
+        self.assertEqual(archive.read('Order.txt'), self.text)
+
+    def test_recompress_converts_and_restores(self):
+        with mock.patch.object(self.storage, '_codec', lambda path: ''):
+            document = self.make_document(self.user, self.text, 'order.txt')
+        self.make_document(self.user, os.urandom(8192), 'noise.bin')
+        digest = sha256(self.text)
+        plain_path = self.storage.blob_path(digest)
+
+        stats = recompress(self.storage, codec='gzip')
+        self.assertEqual((stats['blobs'], stats['skipped']), (1, 1))
+        self.assertGreater(stats['bytes_saved'], 0)
+        self.assertEqual(Blob.objects.get(pk=digest).encoding, 'gzip')
+        # The old file stays for downloads in flight, until garbage collection.
+        self.assertTrue(os.path.exists(plain_path))
+        with document.file.open('rb') as fh:
+            self.assertEqual(fh.read(), self.text)
+
+        stats = recompress(self.storage, codec='')
+        self.assertEqual(stats['blobs'], 1)
+        self.assertEqual(Blob.objects.get(pk=digest).encoding, '')
+        with open(self.storage.path(document.file.name), 'rb') as fh:
+            self.assertEqual(fh.read(), self.text)
+
+    @skipUnless(compression.zstandard is not None, 'zstandard is not installed')
+    def test_zstd(self):
+        with mock.patch.object(self.storage, '_codec', lambda path: compression.choose(path, 'zstd')):
+            document = self.make_document(self.user, self.text, 'order.txt')
+        self.assertEqual(Blob.objects.get(pk=sha256(self.text)).encoding, 'zstd')
+        with document.file.open('rb') as fh:
+            fh.seek(500)
+            self.assertEqual(fh.read(100), self.text[500:600])
@@ -0,0 +1,236 @@
+"""
+Extracted document text and its full-text index.
+
+Saving a case or user document only queues it: a `document_texts` row is
+set to pending once the transaction commits, so the upload request never
+parses a file. Workers (`manage.py extract_document_text`) claim pending
+rows in batches the way hearing reminders are claimed, hand the files to
+a process pool running `extraction.extract`, and store the text in
+`document_texts`, away from the document rows that lists and serializers
+read. Content already extracted under the same SHA-256 (the blob store
+knows every file's hash) is copied instead of parsed again. Claims and
+their timeouts are `work_queue`'s.
+
+On SQLite builds with FTS5 the text and the document's title are indexed
+in `document_text_fts` (rowid = document_texts.id); `search()` ranks with
+bm25() and only considers rows of documents the user may see, as
+`access` defines them. Without FTS5 it falls back to substring matching.
+"""
+import concurrent.futures
+import os
+from concurrent.futures.process import BrokenProcessPool
+
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from apps.cases.models import CaseDocument
+from apps.cases.search import fts5_available, tokenize
+from . import access, extraction, work_queue
+from .models import DocumentText, UploadedDocument
+from .storage import local_file
+from .work_queue import BATCH_SIZE
+
+FTS_TABLE = 'document_text_fts'
+
+MODELS = {'case_document': CaseDocument, 'uploaded_document': UploadedDocument}
+KINDS = {model: kind for kind, model in MODELS.items()}
+
+_fts = None
+
+
+def has_fts():
+    global _fts
+    if _fts is None:
+        _fts = fts5_available()
+    return _fts
+
+
+# -- queueing -------------------------------------------------------------
+
+def queue(document):
+    """Queue `document` for extraction once the current transaction commits."""
+    kind, pk, name = KINDS[type(document)], document.pk, document.file.name or ''
+    transaction.on_commit(lambda: _queue(kind, pk, name))
+
+
+def _queue(kind, document_id, name):
+    row = DocumentText.objects.filter(kind=kind, document_id=document_id).first()
+    if row is not None and row.file == name:
+        # Same file: only the title may have changed.
+        if row.status == 'done':
+            _index([row.pk])
+        return
+    values = {
+        'file': name, 'sha256': '', 'status': 'pending' if name else 'unsupported', 'text': '', 'error': '',
+        'attempts': 0, 'queued_at': timezone.now(), 'claimed_at': None, 'extracted_at': None,
+    }
+    row, _ = DocumentText.objects.update_or_create(kind=kind, document_id=document_id, defaults=values)
+    _unindex([row.pk])
+
+
+def remove(document):
+    kind, pk = KINDS[type(document)], document.pk
+    ids = list(DocumentText.objects.filter(kind=kind, document_id=pk).values_list('pk', flat=True))
+    DocumentText.objects.filter(pk__in=ids).delete()
+    _unindex(ids)
+
+
+def queue_missing():
+    """Queue every document that has no text row yet; returns how many."""
+    rows = []
+    for kind, model in MODELS.items():
+        known = DocumentText.objects.filter(kind=kind).values('document_id')
+        for pk, name in model.objects.exclude(pk__in=known).exclude(file='').values_list('pk', 'file').iterator():
+            rows.append(DocumentText(kind=kind, document_id=pk, file=name))
+    DocumentText.objects.bulk_create(rows, batch_size=1000, ignore_conflicts=True)
+    return len(rows)
+
+
+# -- extraction -----------------------------------------------------------
+
+def claim(batch_size=BATCH_SIZE):
+    """Claim up to `batch_size` pending rows; returns their values."""
+    return work_queue.claim(
+        DocumentText, ('kind', 'document_id', 'file'), batch_size, abandoned='Extraction did not finish',
+    )
+
+
+def _store(row_id, status, text, error, digest):
+    updated = DocumentText.objects.filter(pk=row_id, status='processing').update(
+        status=status, text=text, error=error, sha256=digest or '', extracted_at=timezone.now(),
+    )
+    if updated and status == 'done':
+        _index([row_id])
+
+
+def run_batch(pool, batch_size=BATCH_SIZE):
+    """
+    Extract one claimed batch through `pool`; returns {status: count}.
+    Raises BrokenProcessPool, after requeueing the rows it held, if a
+    worker process died.
+    """
+    rows = claim(batch_size)
+    counts = {}
+    futures = {}
+    broken = []
+    for row in rows:
+        storage = MODELS[row['kind']]._meta.get_field('file').storage
+        try:
+            content = local_file(storage, row['file'])
+        except NotImplementedError:
+            _store(row['id'], 'unsupported', '', 'Storage has no local paths', None)
+            counts['unsupported'] = counts.get('unsupported', 0) + 1
+            continue
+        digest = content.sha256
+        done = DocumentText.objects.filter(sha256=digest, status='done').exclude(pk=row['id']).values(
+            'text',
+        ).first() if digest else None
+        if done is not None:
+            _store(row['id'], 'done', done['text'], '', digest)
+            counts['done'] = counts.get('done', 0) + 1
+            continue
+        if not os.path.exists(content.path):
+            _store(row['id'], 'failed', '', 'File is missing', digest)
+            counts['failed'] = counts.get('failed', 0) + 1
+            continue
+        file_type = os.path.splitext(row['file'])[1].lstrip('.')
+        try:
+            futures[pool.submit(extraction.extract, content.path, file_type, content.encoding)] = (row['id'], digest)
+        except BrokenProcessPool:
+            broken.append(row['id'])
+    for future in concurrent.futures.as_completed(futures):
+        row_id, digest = futures[future]
+        try:
+            status, text, error = future.result()
+        except BrokenProcessPool:
+            broken.append(row_id)
+            continue
+        except Exception as exc:
+            status, text, error = 'failed', '', f'{type(exc).__name__}: {exc}'[:500]
+        _store(row_id, status, text, error, digest)
+        counts[status] = counts.get(status, 0) + 1
+    if broken:
+        # A worker process died and took the pool with it.
+        work_queue.release(DocumentText, broken, 'Extraction worker died')
+        raise BrokenProcessPool("An extraction worker died; start a new pool")
+    return counts
+
+
+# -- full-text index ------------------------------------------------------
+
+def _titles(rows):
+    """{(kind, document id): title} for (kind, document id) pairs."""
+    titles = {}
+    for kind, model in MODELS.items():
+        ids = [document_id for row_kind, document_id in rows if row_kind == kind]
+        if ids:
+            for pk, title in model.objects.filter(pk__in=ids).values_list('pk', 'title'):
+                titles[(kind, pk)] = title
+    return titles
+
+
+def _index(row_ids):
+    if not row_ids or not has_fts():
+        return
+    rows = list(DocumentText.objects.filter(pk__in=row_ids, status='done').values_list('id', 'kind', 'document_id', 'text'))
+    titles = _titles([(kind, document_id) for _, kind, document_id, _ in rows])
+    with connection.cursor() as cursor:
+        cursor.executemany(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [(pk,) for pk in row_ids])
+        cursor.executemany(
+            f'INSERT INTO {FTS_TABLE} (rowid, title, content) VALUES (%s, %s, %s)',
+            [(pk, titles.get((kind, document_id), ''), text) for pk, kind, document_id, text in rows],
+        )
+
+
+def _unindex(row_ids):
+    if row_ids and has_fts():
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [(pk,) for pk in row_ids])
+
+
+def rebuild():
+    """Re-index every extracted text."""
+    if not has_fts():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+    ids = DocumentText.objects.filter(status='done').values_list('pk', flat=True)
+    batch = []
+    for pk in ids.iterator(chunk_size=500):
+        batch.append(pk)
+        if len(batch) == 500:
+            _index(batch)
+            batch = []
+    _index(batch)
+
+
+def visible_texts(user):
+    """DocumentText rows of the documents `user` may see."""
+    return DocumentText.objects.filter(
+        Q(kind='case_document', document_id__in=access.visible_case_documents(user).values('id'))
+        | Q(kind='uploaded_document', document_id__in=access.visible_uploaded_documents(user).values('id'))
+    )
+
+
+def search(user, query, limit=20):
+    """[(DocumentText id, score, snippet)] of the user's documents matching `query`, best first."""
+    terms = tokenize(query)
+    if not terms:
+        return []
+    within = visible_texts(user).filter(status='done')
+    if not has_fts():
+        matches = within
+        for term in terms:
+            matches = matches.filter(Q(text__icontains=term))
+        return [(pk, 0.0, text[:200]) for pk, text in matches.order_by('-extracted_at').values_list('id', 'text')[:limit]]
+    match = ' '.join(f'"{term}"*' for term in terms)
+    subquery, sub_params = within.order_by().values('id').query.sql_with_params()
+    sql = (
+        f"SELECT rowid, bm25({FTS_TABLE}, 3.0, 1.0) AS score, "
+        f"snippet({FTS_TABLE}, 1, '[', ']', '…', 16) FROM {FTS_TABLE} "
+        f"WHERE {FTS_TABLE} MATCH %s AND rowid IN ({subquery}) ORDER BY score LIMIT %s"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [match, *sub_params, limit])
+        return [(pk, -score, snippet) for pk, score, snippet in cursor.fetchall()]
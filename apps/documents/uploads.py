@@ -0,0 +1,307 @@
+"""
+Resumable, chunked uploads of case and user documents.
+
+`start()` records an UploadSession and an empty staging file under the
+document storage's `uploads/` directory. Each chunk names the offset it
+starts at and may carry a SHA-256 of its bytes; it is streamed from the
+request into the staging file at that offset in BLOCK_SIZE pieces, so
+neither the chunk nor the file is ever held in memory. A chunk that
+arrives short or fails its checksum is cut off again and the session
+keeps its previous offset, so a client that lost a response simply asks
+for the offset and resends from there. `complete()` hashes the file,
+checks it against the whole-file checksum if one was given, moves it into
+the content-addressed blob store (a rename on the same filesystem) and
+creates the CaseDocument or UploadedDocument with file_size and
+file_type filled in.
+
+A session opened with the checksum of content the user already has in
+one of their documents starts complete: no chunks are needed and
+completing only adds a reference to the existing blob. Content stored
+only for other users is uploaded as usual, so a checksum cannot be used
+to obtain someone else's file.
+
+Row locks are a no-op on SQLite, so requests of one session are kept
+apart without them: a chunk is written holding an exclusive flock on the
+staging file, and every change to a session is a conditional UPDATE on
+the status and offset that were read, which fails (and the request with
+it) if another request moved the session on first.
+
+Sessions are abandoned after SESSION_TTL without a chunk;
+`purge_expired()` (`manage.py purge_upload_sessions`) deletes them along
+with their staging files.
+"""
+import contextlib
+import hashlib
+import os
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from apps.cases.models import CaseDocument
+from . import quota
+from .models import Blob, StoredFile, UploadedDocument, UploadSession
+from .storage import sha256_file
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+BLOCK_SIZE = 1024 * 1024
+MAX_CHUNK_SIZE = 64 * 1024 * 1024
+MAX_UPLOAD_SIZE = 10 * 1024 * 1024 * 1024
+SESSION_TTL = timedelta(hours=24)
+
+# Target -> (document model, fields a session may set on it).
+TARGETS = {
+    'case_document': (CaseDocument, (
+        'title', 'document_type', 'description', 'filing_date', 'is_confidential', 'is_visible_to_customer',
+    )),
+    'uploaded_document': (UploadedDocument, ('title', 'description', 'category', 'tags', 'is_public')),
+}
+
+
+class UploadError(ValueError):
+    pass
+
+
+class OffsetMismatch(UploadError):
+    """The chunk does not start where the upload left off."""
+
+    def __init__(self, offset):
+        super().__init__(f"Upload is at offset {offset}")
+        self.offset = offset
+
+
+class ChecksumMismatch(UploadError):
+    pass
+
+
+class UploadBusy(UploadError):
+    """Another request of the same session is writing to it."""
+
+
+def file_type(filename):
+    """The lower-cased extension, as stored in the documents' file_type."""
+    return os.path.splitext(filename)[1].lstrip('.').lower()[:50]
+
+
+def _storage(target):
+    return TARGETS[target][0]._meta.get_field('file').storage
+
+
+def _holds(user, digest):
+    """Whether one of `user`'s documents already refers to the blob `digest`."""
+    names = StoredFile.objects.filter(blob_id=digest).values('name')
+    return any(model.objects.filter(uploaded_by=user, file__in=names).exists() for model, _ in TARGETS.values())
+
+
+def start(user, target, filename, size, metadata=None, case=None, checksum=''):
+    """
+    Open a session, reserving `size` bytes of the user's quota (raises
+    quota.QuotaExceeded). It starts complete if content with `checksum` is
+    already stored for one of the user's documents.
+    """
+    session = UploadSession(
+        user=user,
+        target=target,
+        case=case,
+        filename=filename,
+        size=size,
+        checksum=checksum.lower(),
+        metadata=metadata or {},
+        expires_at=timezone.now() + SESSION_TTL,
+    )
+    storage = _storage(target)
+    if session.checksum and storage.blob_size(session.checksum) == size and _holds(user, session.checksum):
+        session.offset = size
+    else:
+        session.path = str(session.id)
+    with transaction.atomic():
+        quota.reserve(user.pk, size)
+        session.save(force_insert=True)
+    if session.path:
+        open(storage.staging_path(session.path), 'wb').close()
+    return session
+
+
+def _remove_staging(target, path):
+    staging = _storage(target).staging_path(path)
+    if os.path.exists(staging):
+        os.remove(staging)
+
+
+def _get(session_id, user):
+    return UploadSession.objects.get(pk=session_id, user=user)
+
+
+def _check_active(session):
+    if session.status != 'active':
+        raise UploadError(f"Upload is {session.status}")
+    if session.expires_at <= timezone.now():
+        raise UploadError("Upload has expired")
+
+
+def _update(session, **values):
+    """
+    Save `values` on `session` if its status and offset are still the ones
+    it was read with; raises UploadError, or OffsetMismatch for a moved
+    offset, if another request changed the session first.
+    """
+    current = UploadSession.objects.filter(pk=session.pk, status=session.status, offset=session.offset)
+    if not current.update(**values, updated_at=timezone.now()):
+        session.refresh_from_db(fields=['status', 'offset'])
+        _check_active(session)
+        raise OffsetMismatch(session.offset)
+    for field, value in values.items():
+        setattr(session, field, value)
+
+
+@contextlib.contextmanager
+def _staging(session, exclusive=True):
+    """
+    The session's staging file opened for update, flocked so that one
+    request at a time writes or reads it; raises UploadBusy when another
+    holds it. Yields None for sessions without a file, or whose file is
+    already gone (the session was completed or aborted meanwhile).
+    """
+    try:
+        fh = open(_storage(session.target).staging_path(session.path), 'r+b') if session.path else None
+    except FileNotFoundError:
+        fh = None
+    if fh is None:
+        yield None
+        return
+    with fh:
+        if fcntl is not None:
+            try:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                raise UploadBusy("Another request is writing to this upload")
+        yield fh
+
+
+def write_chunk(session_id, user, offset, stream, length, checksum=None):
+    """
+    Write `length` bytes read from `stream` at `offset`; returns the new
+    offset. `checksum` is the chunk's expected SHA-256 in hex.
+    """
+    if length <= 0 or length > MAX_CHUNK_SIZE:
+        raise UploadError(f"Chunks must be between 1 and {MAX_CHUNK_SIZE} bytes")
+    session = _get(session_id, user)
+    with _staging(session) as fh:
+        # Read again under the flock: an earlier holder may have moved it on.
+        session.refresh_from_db()
+        _check_active(session)
+        if offset != session.offset:
+            raise OffsetMismatch(session.offset)
+        if offset + length > session.size:
+            raise UploadError(f"Chunk ends past the declared size of {session.size} bytes")
+        if fh is None:
+            raise UploadError("The uploaded file is gone; start a new upload")
+        digest = hashlib.sha256()
+        written = 0
+        fh.seek(offset)
+        while written < length:
+            block = stream.read(min(BLOCK_SIZE, length - written))
+            if not block:
+                break
+            digest.update(block)
+            fh.write(block)
+            written += len(block)
+        if written != length or (checksum and digest.hexdigest() != checksum.lower()):
+            fh.truncate(offset)
+            if written != length:
+                raise UploadError(f"Chunk ended after {written} of {length} bytes")
+            raise ChecksumMismatch("Chunk checksum does not match")
+        fh.truncate()
+        fh.flush()
+        os.fsync(fh.fileno())
+        _update(session, offset=offset + written, expires_at=timezone.now() + SESSION_TTL)
+    return session.offset
+
+
+def complete(session_id, user):
+    """Turn a fully received upload into its document; returns the document."""
+    session = _get(session_id, user)
+    model, fields = TARGETS[session.target]
+    with _staging(session), transaction.atomic():
+        session.refresh_from_db()
+        if session.status == 'complete':
+            return model.objects.get(pk=session.document_id)
+        _check_active(session)
+        if session.offset != session.size:
+            raise OffsetMismatch(session.offset)
+        storage = _storage(session.target)
+        name = model._meta.get_field('file').generate_filename(None, os.path.basename(session.filename))
+        if session.path:
+            staging = storage.staging_path(session.path)
+            if not os.path.exists(staging):
+                raise UploadError("The uploaded file is gone; start a new upload")
+            digest = sha256_file(staging)
+            if session.checksum and digest != session.checksum:
+                raise ChecksumMismatch("File checksum does not match")
+            name = storage.adopt(name, staging, digest)
+        else:
+            try:
+                name = storage.link(name, session.checksum)
+            except (Blob.DoesNotExist, FileNotFoundError):
+                raise UploadError("The stored copy of this file is gone; start a new upload")
+        values = {key: value for key, value in session.metadata.items() if key in fields}
+        values.setdefault('title', os.path.splitext(session.filename)[0][:model._meta.get_field('title').max_length])
+        if session.target == 'case_document':
+            values['case_id'] = session.case_id
+        document = model(
+            **values,
+            uploaded_by=user,
+            file=name,
+            file_size=session.size,
+            file_type=file_type(session.filename),
+        )
+        # The session's reservation becomes the document's usage.
+        document._quota_reserved = True
+        document.save()
+        _update(session, status='complete', document_id=document.pk)
+    return document
+
+
+def abort(session_id, user):
+    """Cancel an upload and delete what it wrote."""
+    session = _get(session_id, user)
+    with _staging(session), transaction.atomic():
+        session.refresh_from_db()
+        _check_active(session)
+        _update(session, status='aborted')
+        quota.release(session.user_id, session.size)
+        if session.path:
+            transaction.on_commit(lambda: _remove_staging(session.target, session.path))
+
+
+def purge_expired(now=None):
+    """
+    Delete expired sessions, releasing the reservations and staging files
+    of the abandoned ones; returns how many.
+    """
+    now = now or timezone.now()
+    purged = 0
+    expired = UploadSession.objects.filter(expires_at__lte=now).values_list('pk', flat=True)
+    for session_id in list(expired):
+        with transaction.atomic():
+            session = UploadSession.objects.filter(pk=session_id, expires_at__lte=now).first()
+            if session is None:
+                continue
+            # Deleted only as read, so a session a chunk has just extended or
+            # another purge has handled is left alone.
+            deleted, _ = UploadSession.objects.filter(
+                pk=session.pk, status=session.status, offset=session.offset, expires_at__lte=now,
+            ).delete()
+            if not deleted:
+                continue
+            # Completed and aborted sessions hold no reservation or staging file.
+            if session.status == 'active':
+                quota.release(session.user_id, session.size)
+                if session.path:
+                    transaction.on_commit(lambda s=session: _remove_staging(s.target, s.path))
+            purged += 1
+    return purged
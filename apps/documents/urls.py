@@ -0,0 +1,18 @@
+from django.urls import path, include
+from rest_framework.routers import DefaultRouter
+from .views import (
+    CaseBundleView, DocumentDownloadView, DocumentPreviewView, DocumentSearchView, UploadedDocumentViewSet,
+    UploadSessionViewSet,
+)
+
+router = DefaultRouter()
+router.register(r'uploads', UploadSessionViewSet, basename='upload')
+router.register(r'files', UploadedDocumentViewSet, basename='uploaded-document')
+
+urlpatterns = [
+    path('', include(router.urls)),
+    path('search/', DocumentSearchView.as_view(), name='document-search'),
+    path('download/<str:kind>/<int:pk>/', DocumentDownloadView.as_view(), name='document-download'),
+    path('preview/<str:kind>/<int:pk>/', DocumentPreviewView.as_view(), name='document-preview'),
+    path('bundle/case/<int:case_pk>/', CaseBundleView.as_view(), name='case-document-bundle'),
+]
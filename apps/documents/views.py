@@ -1,3 +1,277 @@
-from django.shortcuts import render
+import os
 
-# Create your views here.
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils.http import content_disposition_header
+from rest_framework import mixins, permissions, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
+from rest_framework.negotiation import BaseContentNegotiation
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from apps.cases.access import visible_cases
+
+from . import access, bundles, downloads, previews, tags, text_index, uploads
+from .models import DocumentPreview, DocumentTag, DocumentText, UploadSession
+from .serializers import UploadedDocumentSerializer, UploadSessionSerializer
+
+
+class UploadSessionViewSet(
+    mixins.CreateModelMixin,
+    mixins.RetrieveModelMixin,
+    mixins.ListModelMixin,
+    mixins.DestroyModelMixin,
+    viewsets.GenericViewSet,
+):
+    """
+    Resumable uploads. POST a session (target, case, filename, size,
+    optional checksum and document metadata), PUT the file to
+    `<id>/chunk/` in pieces, then POST `<id>/complete/`. GET `<id>/`
+    tells where to resume; DELETE aborts. A session whose checksum
+    matches content already in one of the caller's documents starts at
+    offset == size and can be completed right away.
+    """
+    serializer_class = UploadSessionSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return UploadSession.objects.filter(user=self.request.user)
+
+    def destroy(self, request, *args, **kwargs):
+        try:
+            uploads.abort(self.get_object().pk, request.user)
+        except uploads.UploadError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_409_CONFLICT)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @action(detail=False, methods=['get'])
+    def quota(self, request):
+        """The caller's storage quota and usage, open upload reservations included."""
+        row = type(request.user).objects.filter(pk=request.user.pk).values('storage_quota', 'storage_used').get()
+        return Response({**row, 'available': max(row['storage_quota'] - row['storage_used'], 0)})
+
+    @action(detail=True, methods=['put'])
+    def chunk(self, request, pk=None):
+        """
+        The raw bytes of one chunk as the body, starting at the
+        `Upload-Offset` header; an `Upload-Checksum: sha256 <hex>` header
+        is verified before the chunk counts. A wrong offset gets 409 with
+        the offset to resume from.
+        """
+        session = self.get_object()
+        try:
+            offset = int(request.headers['Upload-Offset'])
+            length = int(request.headers.get('Content-Length') or 0)
+        except (KeyError, ValueError):
+            return Response(
+                {"detail": "Upload-Offset and Content-Length headers are required"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        checksum = None
+        if request.headers.get('Upload-Checksum'):
+            algorithm, _, checksum = request.headers['Upload-Checksum'].partition(' ')
+            if algorithm.lower() != 'sha256' or not checksum:
+                return Response({"detail": "Upload-Checksum must be 'sha256 <hex>'"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            # Read the body from the underlying request: DRF's parsers (and
+            # request.body) would load the whole chunk into memory first.
+            new_offset = uploads.write_chunk(session.pk, request.user, offset, request._request, length, checksum)
+        except uploads.OffsetMismatch as exc:
+            return Response({"detail": str(exc), "offset": exc.offset}, status=status.HTTP_409_CONFLICT)
+        except uploads.UploadBusy as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_409_CONFLICT)
+        except uploads.UploadError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'offset': new_offset}, headers={'Upload-Offset': str(new_offset)})
+
+    @action(detail=True, methods=['post'])
+    def complete(self, request, pk=None):
+        session = self.get_object()
+        try:
+            document = uploads.complete(session.pk, request.user)
+        except uploads.OffsetMismatch as exc:
+            return Response({"detail": "Upload is incomplete", "offset": exc.offset}, status=status.HTTP_409_CONFLICT)
+        except uploads.UploadBusy as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_409_CONFLICT)
+        except uploads.UploadError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(
+            {
+                'target': session.target,
+                'document': document.pk,
+                'file': document.file.name,
+                'file_size': document.file_size,
+                'file_type': document.file_type,
+            },
+            status=status.HTTP_201_CREATED,
+        )
+
+
+class UploadedDocumentViewSet(
+    mixins.RetrieveModelMixin,
+    mixins.ListModelMixin,
+    mixins.UpdateModelMixin,
+    mixins.DestroyModelMixin,
+    viewsets.GenericViewSet,
+):
+    """
+    User documents the caller may see. ?category= filters by category and
+    each ?tag= (case-insensitive, repeatable) narrows to documents carrying
+    that tag. Only the uploader or staff may edit or delete. New documents
+    come from resumable uploads.
+    """
+    serializer_class = UploadedDocumentSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        user = self.request.user
+        queryset = access.visible_uploaded_documents(user)
+        if self.action in ('update', 'partial_update', 'destroy') and not user.is_staff:
+            queryset = queryset.filter(uploaded_by=user)
+        params = self.request.query_params
+        if params.get('category'):
+            queryset = queryset.filter(category=params['category'])
+        keys = {tags.tag_key(name) for name in params.getlist('tag')} - {''}
+        if keys:
+            ids = list(DocumentTag.objects.filter(key__in=keys).values_list('pk', flat=True))
+            if len(ids) < len(keys):
+                return queryset.none()
+            for tag_id in ids:
+                queryset = queryset.filter(tag_relations__tag_id=tag_id)
+        return queryset.prefetch_related('tag_relations__tag')
+
+    @action(detail=False, methods=['get'])
+    def tags(self, request):
+        """Tag autocomplete: ?prefix= returns tags starting with it, most used first."""
+        try:
+            limit = min(max(int(request.query_params.get('limit', 10)), 1), 50)
+        except ValueError:
+            return Response({"detail": "limit must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+        suggestions = tags.autocomplete(request.user, request.query_params.get('prefix', ''), limit=limit)
+        return Response({'results': [{'name': tag.name, 'count': tag.count} for tag in suggestions]})
+
+
+class DocumentSearchView(APIView):
+    """Full-text search over the content of the case and user documents the caller may see."""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({"detail": "q is required"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = min(max(int(request.query_params.get('limit', 20)), 1), 100)
+        except ValueError:
+            return Response({"detail": "limit must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+
+        hits = text_index.search(request.user, query, limit=limit)
+        texts = DocumentText.objects.in_bulk([pk for pk, _, _ in hits])
+        documents = {}
+        for kind, model in text_index.MODELS.items():
+            ids = [text.document_id for text in texts.values() if text.kind == kind]
+            for row in model.objects.filter(pk__in=ids).values('id', 'title', 'file_type', 'uploaded_at',
+                                                                *(['case_id'] if kind == 'case_document' else [])):
+                documents[(kind, row['id'])] = row
+        results = []
+        for pk, score, snippet in hits:
+            text = texts.get(pk)
+            document = documents.get((text.kind, text.document_id)) if text else None
+            if document is None:
+                continue
+            results.append({'kind': text.kind, **document, 'score': round(score, 3), 'snippet': snippet})
+        return Response({'results': results})
+
+
+class FirstRendererNegotiation(BaseContentNegotiation):
+    """Downloads answer with the file whatever the client asked for; errors go out as JSON."""
+
+    def select_parser(self, request, parsers):
+        return parsers[0]
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
+
+
+class DocumentDownloadView(APIView):
+    """
+    The file of a case, user or employee document the caller may see, with
+    Range, ETag and If-None-Match support. ?inline=1 serves it for display
+    instead of as an attachment.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    content_negotiation_class = FirstRendererNegotiation
+
+    def get(self, request, kind, pk):
+        if kind not in downloads.KINDS:
+            raise NotFound()
+        _, visible = downloads.KINDS[kind]
+        document = get_object_or_404(visible(request.user), pk=pk)
+        response = downloads.serve(
+            request, document, as_attachment=request.query_params.get('inline') not in ('1', 'true'),
+        )
+        if response is None:
+            return Response({"detail": "File is missing"}, status=status.HTTP_404_NOT_FOUND)
+        return response
+
+
+class CaseBundleView(APIView):
+    """
+    Every document of a case the caller may download, as one ZIP streamed
+    while it is built. ?compression=stored|deflate overrides the per-file
+    default (see `bundles`).
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    content_negotiation_class = FirstRendererNegotiation
+
+    def get(self, request, case_pk):
+        case = get_object_or_404(visible_cases(request.user), pk=case_pk)
+        compression = request.query_params.get('compression', 'auto')
+        if compression not in bundles.COMPRESSIONS:
+            return Response(
+                {"detail": f"compression must be one of {', '.join(bundles.COMPRESSIONS)}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        # Resolve every path now: the response body is produced after the
+        # view returns, and should not need the database.
+        entries = bundles.case_entries(access.visible_case_documents(request.user).filter(case=case))
+        if not entries:
+            return Response({"detail": "No documents to download"}, status=status.HTTP_404_NOT_FOUND)
+        response = StreamingHttpResponse(bundles.stream(entries, compression), content_type='application/zip')
+        response['Content-Disposition'] = content_disposition_header(True, f'{case.case_number}-documents.zip')
+        response['Cache-Control'] = 'private, no-store'
+        # Stop nginx from buffering the archive to a temporary file.
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+
+class DocumentPreviewView(APIView):
+    """
+    The JPEG thumbnail of a case or user document the caller may see. 404
+    with the preview's status until it has been rendered. Previews are
+    named by content hash, so they are cached for a day and revalidated by
+    ETag.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    content_negotiation_class = FirstRendererNegotiation
+
+    def get(self, request, kind, pk):
+        if kind not in previews.MODELS:
+            raise NotFound()
+        _, visible = downloads.KINDS[kind]
+        document = get_object_or_404(visible(request.user), pk=pk)
+        path = previews.preview_path(document)
+        if path is None:
+            row_status = DocumentPreview.objects.filter(kind=kind, document_id=pk).values_list(
+                'status', flat=True,
+            ).first()
+            return Response({"detail": "No preview", "status": row_status}, status=status.HTTP_404_NOT_FOUND)
+        etag = f'"{os.path.splitext(os.path.basename(path))[0]}"'
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match and downloads.etag_matches(if_none_match, etag):
+            response = HttpResponse(status=304)
+        else:
+            response = FileResponse(open(path, 'rb'), content_type='image/jpeg')
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, max-age=86400'
+        return response
@@ -0,0 +1,69 @@
+"""
+Batch claims on the document work queues (DocumentText, DocumentPreview).
+
+A queue row is pending until a worker claims a batch: the rows are picked
+in queue order with SKIP LOCKED where the database has it, and flipped to
+processing by an UPDATE that re-checks status='pending', so two workers
+never hold the same row. A claim that is not finished within
+CLAIM_TIMEOUT, because its worker died, goes back to pending until it has
+been tried MAX_ATTEMPTS times, and then fails. When a process of the pool
+dies instead (killed for running out of memory, say), the pool is broken:
+`release()` hands its rows back the same way at once, and the caller
+starts a new pool.
+"""
+import concurrent.futures
+import multiprocessing
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+BATCH_SIZE = 50
+CLAIM_TIMEOUT = timedelta(minutes=10)
+MAX_ATTEMPTS = 3
+
+
+def claim(model, fields, batch_size=BATCH_SIZE, abandoned="Worker did not finish"):
+    """Claim up to `batch_size` pending rows of `model`; returns their `fields` values."""
+    now = timezone.now()
+    model.objects.filter(
+        status='processing', claimed_at__lt=now - CLAIM_TIMEOUT, attempts__lt=MAX_ATTEMPTS,
+    ).update(status='pending')
+    model.objects.filter(
+        status='processing', claimed_at__lt=now - CLAIM_TIMEOUT, attempts__gte=MAX_ATTEMPTS,
+    ).update(status='failed', error=abandoned)
+    with transaction.atomic():
+        rows = list(
+            model.objects.filter(status='pending').order_by('queued_at', 'id')
+            .select_for_update(skip_locked=True)
+            .values('id', *fields)[:batch_size]
+        )
+        ids = [row['id'] for row in rows]
+        # status='pending' again so a worker without row locks that lost a
+        # race claims nothing rather than rows another worker holds.
+        claimed = model.objects.filter(pk__in=ids, status='pending').update(
+            status='processing', claimed_at=now, attempts=F('attempts') + 1,
+        )
+        if claimed != len(ids):
+            transaction.set_rollback(True)
+            return []
+    return rows
+
+
+def make_pool(workers=None):
+    # Spawned, not forked: workers only import `extraction` or `rendering`,
+    # never Django, and inherit no database connections.
+    return concurrent.futures.ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+    )
+
+
+def release(model, row_ids, error):
+    """
+    Put claimed rows whose worker process died back to pending, failing
+    those already tried MAX_ATTEMPTS times with `error`.
+    """
+    rows = model.objects.filter(pk__in=row_ids, status='processing')
+    rows.filter(attempts__lt=MAX_ATTEMPTS).update(status='pending', claimed_at=None)
+    rows.update(status='failed', error=error)
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-18 06:39
+
+import apps.documents.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('employees', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='employeedocument',
+            name='file',
+            field=models.FileField(storage=apps.documents.storage.document_storage, upload_to='employee_documents/%Y/%m/'),
+        ),
+    ]
@@ -1,6 +1,7 @@
 from django.db import models
 from apps.users.models import User
 from apps.courts.models import Court
+from apps.documents.storage import document_storage
 
 class PermissionSet(models.Model):
     name=models.CharField(max_length=100,unique=True)
@@ -60,7 +61,7 @@ class EmployeeDocument(models.Model):
             ('other', 'Other'),
         ]
     )
-    file = models.FileField(upload_to='employee_documents/%Y/%m/')
+    file = models.FileField(upload_to='employee_documents/%Y/%m/', storage=document_storage)
     uploaded_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
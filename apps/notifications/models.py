@@ -34,6 +34,7 @@ class Notification(models.Model):
         indexes = [
             models.Index(fields=['user', 'is_read']),
             models.Index(fields=['-created_at']),
+            models.Index(fields=['user', '-created_at', '-id']),
         ]
     
     def __str__(self):
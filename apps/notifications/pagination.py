@@ -0,0 +1,5 @@
+from apps.core.pagination import KeysetPagination
+
+
+class NotificationPagination(KeysetPagination):
+    ordering = ('-created_at', '-id')
@@ -0,0 +1,13 @@
+from rest_framework import serializers
+from .models import Notification
+
+
+class NotificationSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Notification
+        fields = [
+            'id', 'notification_type', 'title', 'message',
+            'related_object_type', 'related_object_id',
+            'is_read', 'read_at', 'created_at',
+        ]
+        read_only_fields = fields
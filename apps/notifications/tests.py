@@ -1,3 +1,25 @@
 from django.test import TestCase
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from apps.users.models import User
+from .models import Notification
+
+
+class NotificationListTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('reader@example.com', 'not-a-real-password')
+        cls.other = User.objects.create_user('other@example.com', 'not-a-real-password')
+        for i in range(5):
+            Notification.objects.create(user=cls.user, notification_type='system', title=f'n{i}', message='')
+        Notification.objects.create(user=cls.other, notification_type='system', title='not yours', message='')
+
+    def test_keyset_pages_hold_only_own_notifications_newest_first(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        titles, url = [], '/api/notifications/notifications/?page_size=2'
+        while url:
+            body = client.get(url).json()
+            titles += [row['title'] for row in body['results']]
+            url = body['next']
+        self.assertEqual(titles, ['n4', 'n3', 'n2', 'n1', 'n0'])
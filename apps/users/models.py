@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models.functions import Lower
 from django.contrib.auth.models import AbstractUser,BaseUserManager,PermissionsMixin
 from django.utils import timezone
 from django.core.signing import Signer
@@ -47,6 +48,10 @@ class User(AbstractUser,PermissionsMixin):
     class Meta:
         db_table='users'
         ordering = ['-date_joined']
+        indexes = [
+            # Case-insensitive lookups by email (the case importer).
+            models.Index(Lower('email'), name='users_email_ci_idx'),
+        ]
 
     def __str__(self):
         return self.email
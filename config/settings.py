@@ -108,6 +108,23 @@ DATABASES = {
         'NAME': BASE_DIR / 'db.sqlite3',
     }
 }
+# Shared by every worker: version stamps in it invalidate per-process copies
+# of lookup tables, the tag and search indexes, hearing calendars and access
+# sets (apps.core.cache). Redis when REDIS_URL is set, otherwise the
+# database (its table is created by migrations).
+REDIS_URL = os.getenv("REDIS_URL")
+CACHES = {
+    "default": (
+        {"BACKEND": "django.core.cache.backends.redis.RedisCache", "LOCATION": REDIS_URL}
+        if REDIS_URL
+        else {
+            "BACKEND": "apps.core.cache.DatabaseCache",
+            "LOCATION": "django_cache",
+            "OPTIONS": {"MAX_ENTRIES": 100_000},
+        }
+    ),
+}
+
 from datetime import timedelta
 
 SIMPLE_JWT = {
@@ -154,6 +171,33 @@ USE_TZ = True
 STATIC_URL = 'static/'
 MEDIA_ROOT=BASE_DIR/"media"
 
+# Compress case, employee and user documents at rest: "" (off), "auto"
+# (zstd if the zstandard package is installed, else gzip), "gzip" or
+# "zstd". Files stored before are converted by `manage.py
+# recompress_documents`; compressed files stay readable with it off.
+DOCUMENT_COMPRESSION = os.getenv("DOCUMENT_COMPRESSION", "")
+
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+    # Case, employee and user documents, stored once per distinct content.
+    "documents": (
+        {
+            "BACKEND": "apps.documents.storage.CompressedStorage",
+            "OPTIONS": {"codec": None if DOCUMENT_COMPRESSION == "auto" else DOCUMENT_COMPRESSION},
+        }
+        if DOCUMENT_COMPRESSION
+        else {"BACKEND": "apps.documents.storage.ContentAddressedStorage"}
+    ),
+}
+
+# How document downloads hand the file body to the web server: "python"
+# (FileResponse; os.sendfile under gunicorn), "x-accel" (nginx, through an
+# internal location at DOCUMENT_X_ACCEL_PREFIX aliased to MEDIA_ROOT) or
+# "x-sendfile" (Apache mod_xsendfile, lighttpd).
+DOCUMENT_DOWNLOAD_BACKEND = os.getenv("DOCUMENT_DOWNLOAD_BACKEND", "python")
+DOCUMENT_X_ACCEL_PREFIX = "/protected-media/"
+
 CORS_ALLOW_ALL_ORIGINS = True
 
 # Default primary key field type
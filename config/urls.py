@@ -20,4 +20,7 @@ from django.urls import path, include
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/users/', include('apps.users.urls')),
+    path('api/cases/', include('apps.cases.urls')),
+    path('api/notifications/', include('apps.notifications.urls')),
+    path('api/documents/', include('apps.documents.urls')),
 ]